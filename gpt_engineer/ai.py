@@ -1,14 +1,17 @@
 from __future__ import annotations
 
 import logging
+import threading
 
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import tiktoken
 
 from gpt4all import GPT4All
 
+from gpt_engineer.hardware import pinned
+
 FORMAT_ALPACA = {
     "system": "### Instruction:",
     "prompt": "### Input:",
@@ -31,18 +34,38 @@ class TokenUsage:
     total_tokens: int
 
 
+class ModelLoadError(Exception):
+    pass
+
+
 class AI:
     model: GPT4All = None
-
-    def __init__(self, model, temperature=0.1):
+    # The name of the model loaded into AI.model, which is shared by all instances
+    loaded_model: Optional[str] = None
+    # Held while a model loads, so a warmup and the first completion load once
+    load_lock = threading.Lock()
+
+    def __init__(
+        self,
+        model,
+        temperature=0.1,
+        threads: Optional[int] = None,
+        cpus: Optional[List[int]] = None,
+        fallback: Optional[str] = None,
+    ):
         self.temperature = temperature
         self.model = model
+        # Used instead of model when model fails to load
+        self.fallback = fallback
+        # The inference threads and the cpus they are pinned to
+        self.threads = threads
+        self.cpus = cpus
 
         # initialize token usage log
         self.cumulative_prompt_tokens = 0
         self.cumulative_completion_tokens = 0
         self.cumulative_total_tokens = 0
-        self.token_usage_log = []
+        self.token_usage_log: List[TokenUsage] = []
 
         # initialize token usage log
         self.cumulative_prompt_tokens = 0
@@ -50,21 +73,82 @@ class AI:
         self.cumulative_total_tokens = 0
         self.token_usage_log = []
 
+        # Loaded on first use, so the model can start loading before it
+        self._tokenizer: Optional[tiktoken.Encoding] = None
+        self._tokenizer_model = model
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            model = self._tokenizer_model
+            try:
+                self._tokenizer = tiktoken.encoding_for_model(model)
+            except KeyError:
+                logger.debug(
+                    f"Tiktoken encoder for model {model} not found. Using "
+                    "cl100k_base encoder instead. The results may therefore be "
+                    "inaccurate and should only be used as estimate."
+                )
+                self._tokenizer = tiktoken.get_encoding("cl100k_base")
+        return self._tokenizer
+
+    def ensure_loaded(self):
+        """
+        Load the model on first use, so runs whose steps do not need it never
+        pay for loading it. If it fails to load, the fallback is loaded instead.
+        """
+        with AI.load_lock:
+            if not AI.model or AI.loaded_model not in (None, self.model):
+                try:
+                    AI.load(self.model)
+                except Exception as e:
+                    if not self.fallback or self.fallback == self.model:
+                        raise ModelLoadError(f"Could not load {self.model}: {e}") from e
+                    logger.warning(
+                        f"Could not load {self.model}: {e}. Using {self.fallback}"
+                    )
+                    self.model = self.fallback
+                    try:
+                        AI.load(self.model)
+                    except Exception as e:
+                        raise ModelLoadError(
+                            f"Could not load {self.model} either: {e}"
+                        ) from e
+            if self.threads and AI.model.model.thread_count() != self.threads:
+                AI.model.model.set_thread_count(self.threads)
+
+    def warmup(self) -> threading.Thread:
+        """
+        Load the model in the background while the tokenizer is loaded and the
+        project is prepared, the first completion waits for it to finish
+        """
+        thread = threading.Thread(target=self._warmup, daemon=True)
+        thread.start()
+        return thread
+
+    def _warmup(self):
         try:
-            if not AI.model:
-                AI.model = GPT4All(model)
-        except Exception:
-            print("Unexpected error")
-
-        try:
-            self.tokenizer = tiktoken.encoding_for_model(model)
-        except KeyError:
-            logger.debug(
-                f"Tiktoken encoder for model {model} not found. Using "
-                "cl100k_base encoder instead. The results may therefore be "
-                "inaccurate and should only be used as estimate."
-            )
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")
+            self.ensure_loaded()
+        except ModelLoadError as e:
+            # Raised again by the first completion, which retries the load
+            logger.debug(f"Warmup failed: {e}")
+
+    @staticmethod
+    def load(model: str):
+        # Free the previous model before loading the next one
+        AI.model = None
+        AI.model = GPT4All(model)
+        AI.loaded_model = model
+
+    @staticmethod
+    def reset_context():
+        """
+        Forget the prompt context of the loaded model. gpt4all only creates it
+        for the first prompt, so that prompt's n_predict, temp and n_past would
+        otherwise apply to every later one.
+        """
+        if AI.model is not None and getattr(AI.model.model, "context", None) is not None:
+            AI.model.model.context = None
 
     def start(self, system, user, step_name):
         messages = [
@@ -92,15 +176,17 @@ class AI:
             ]
         logger.debug(f"Creating a new chat completion: {messages}")
 
-        response = AI.model.chat_completion(
-            messages=messages,
-            verbose=True,
-            streaming=True,
-            default_prompt_header=False,
-            n_ctx=32768,
-            n_predict=4096,
-            temp=self.temperature,
-        )
+        self.ensure_loaded()
+        with pinned(self.cpus):
+            response = AI.model.chat_completion(
+                messages=messages,
+                verbose=True,
+                streaming=True,
+                default_prompt_header=False,
+                n_ctx=32768,
+                n_predict=4096,
+                temp=self.temperature,
+            )
 
         logger.debug(f"Chat completion finished: {messages}")
         chat = response["choices"][0]["message"]["content"]
@@ -163,12 +249,3 @@ class AI:
                     n_tokens += -1  # role is always required and always 1 token
         n_tokens += 2  # every reply is primed with <im_start>assistant
         return n_tokens
-
-
-def fallback_model(model: str) -> str:
-    try:
-        AI.model = GPT4All(model)
-        return model
-    except Exception:
-        print(f"Model {model} not available. Reverting " "to ggml-replit-code-v1-3b.bin")
-        return "ggml-replit-code-v1-3b.bin"
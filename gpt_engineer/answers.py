@@ -0,0 +1,166 @@
+import json
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+# What AutoAnswers answers. Code is executed and the clarification ends after
+# the first question, but consent to store learnings is never given.
+DEFAULTS = {
+    "clarification": "c",
+    "execute": "y",
+    "review_ran": "u",
+    "review_perfect": "u",
+    "review_useful": "u",
+    "review_comments": "",
+    "consent": "n",
+    "append_results": "y",
+}
+
+
+class Answers(ABC):
+    """
+    Answers the questions a run asks, each identified by a key from DEFAULTS.
+    With choices, the answer is one of them in lower case. The context is what
+    the question is about when that is not part of the question itself, like
+    the prompt and the conversation so far for clarifying questions.
+    """
+
+    @abstractmethod
+    def ask(
+        self,
+        key: str,
+        question: str,
+        choices: Optional[Sequence[str]] = None,
+        context: str = "",
+    ) -> str:
+        pass
+
+
+class TerminalAnswers(Answers):
+    """Asks the user on the terminal, until the answer is one of the choices"""
+
+    def ask(
+        self,
+        key: str,
+        question: str,
+        choices: Optional[Sequence[str]] = None,
+        context: str = "",
+    ) -> str:
+        answer = input(question)
+        if choices is None:
+            return answer
+        while answer.lower() not in choices:
+            answer = input(f"Invalid input. Please enter {or_list(choices)}: ")
+        return answer.lower()
+
+
+class AutoAnswers(Answers):
+    """Answers with DEFAULTS without asking anyone"""
+
+    def ask(
+        self,
+        key: str,
+        question: str,
+        choices: Optional[Sequence[str]] = None,
+        context: str = "",
+    ) -> str:
+        answer = DEFAULTS.get(key, "")
+        print(question + answer)
+        return answer
+
+
+class FileAnswers(Answers):
+    """
+    Answers from a JSON or YAML file that maps keys to an answer, or to a list
+    of answers used in turn. Other questions are left to the fallback.
+    """
+
+    def __init__(self, path, fallback: Optional[Answers] = None):
+        self.path = Path(path)
+        self.fallback = fallback or AutoAnswers()
+        self.answers: Dict[str, List[str]] = {}
+        for key, value in load_answers(self.path).items():
+            values = value if isinstance(value, list) else [value]
+            self.answers[key] = [str(value) for value in values]
+
+    def ask(
+        self,
+        key: str,
+        question: str,
+        choices: Optional[Sequence[str]] = None,
+        context: str = "",
+    ) -> str:
+        if not self.answers.get(key):
+            return self.fallback.ask(key, question, choices, context)
+        answer = self.answers[key].pop(0)
+        if choices is not None and answer.lower() not in choices:
+            raise ValueError(
+                f"Answer '{answer}' to '{key}' in {self.path} is not {or_list(choices)}"
+            )
+        print(question + answer)
+        return answer.lower() if choices is not None else answer
+
+
+class ModelAnswers(Answers):
+    """
+    Lets the model answer the clarifying questions, assuming what the author
+    of the prompt most likely meant. Everything else is left to the fallback.
+    """
+
+    def __init__(self, ai, fallback: Optional[Answers] = None, max_answers: int = 3):
+        self.ai = ai
+        self.fallback = fallback or AutoAnswers()
+        self.max_answers = max_answers
+        self.answered = 0
+
+    def ask(
+        self,
+        key: str,
+        question: str,
+        choices: Optional[Sequence[str]] = None,
+        context: str = "",
+    ) -> str:
+        if key != "clarification" or self.answered >= self.max_answers:
+            return self.fallback.ask(key, question, choices, context)
+        self.answered += 1
+        messages = self.ai.start(
+            system=(
+                "You answer clarifying questions about a software project on "
+                "behalf of its author. Answer the last question briefly, based on "
+                "the instructions and earlier answers of the author, and make the "
+                "most reasonable assumption when they do not tell."
+            ),
+            user=context or question,
+            step_name="answers",
+        )
+        return messages[-1]["content"]
+
+
+def or_list(choices: Sequence[str]) -> str:
+    return ", ".join(choices[:-1]) + " or " + choices[-1]
+
+
+def load_answers(path: Path) -> dict:
+    text = path.read_text(encoding="utf-8")
+    if path.suffix not in (".yaml", ".yml"):
+        return json.loads(text)
+    try:
+        import yaml
+    except ImportError:
+        raise ImportError("YAML answer files require `pip install pyyaml`")
+    return yaml.safe_load(text) or {}
+
+
+def answer_provider(answers: Union[str, Path, None], ai=None) -> Answers:
+    """
+    The answers for the --answers option: "tty", "auto", "model" or the path
+    of an answer file
+    """
+    if answers in (None, "tty"):
+        return TerminalAnswers()
+    if answers == "auto":
+        return AutoAnswers()
+    if answers == "model":
+        return ModelAnswers(ai)
+    return FileAnswers(answers)
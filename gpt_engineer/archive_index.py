@@ -0,0 +1,155 @@
+import json
+import os
+import shutil
+import sqlite3
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+INDEX_NAME = "index.sqlite"
+
+
+@dataclass
+class Snapshot:
+    timestamp: str
+    model: Optional[str]
+    steps: Optional[str]
+    size: int
+    ran: Optional[bool]
+    works: Optional[bool]
+    perfect: Optional[bool]
+
+    @property
+    def score(self) -> int:
+        return 4 * bool(self.perfect) + 2 * bool(self.works) + bool(self.ran)
+
+
+def dir_size(path: Path) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            size += os.lstat(os.path.join(root, name)).st_size
+    return size
+
+
+class ArchiveIndex:
+    """
+    A SQLite index of the snapshots in an archive folder, so finding and
+    cleaning up previous runs does not require walking the archive.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path / INDEX_NAME)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "timestamp TEXT PRIMARY KEY, model TEXT, steps TEXT, size INTEGER, "
+            "ran INTEGER, works INTEGER, perfect INTEGER)"
+        )
+
+    def add(self, timestamp: str, run_info: Optional[dict], review: Optional[dict]):
+        run_info = run_info or {}
+        review = review or {}
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    timestamp,
+                    run_info.get("model"),
+                    json.dumps(run_info["steps"]) if "steps" in run_info else None,
+                    dir_size(self.path / timestamp),
+                    review.get("ran"),
+                    review.get("works"),
+                    review.get("perfect"),
+                ),
+            )
+
+    def snapshots(self) -> List[Snapshot]:
+        """All snapshots, newest first"""
+        rows = self.connection.execute(
+            "SELECT timestamp, model, steps, size, ran, works, perfect "
+            "FROM snapshots ORDER BY timestamp DESC"
+        )
+        return [
+            Snapshot(
+                timestamp,
+                model,
+                steps,
+                size,
+                *[None if value is None else bool(value) for value in review],
+            )
+            for timestamp, model, steps, size, *review in rows
+        ]
+
+    def remove(self, timestamp: str):
+        shutil.rmtree(self.path / timestamp, ignore_errors=True)
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM snapshots WHERE timestamp = ?", (timestamp,)
+            )
+
+    def sync(self):
+        """Index snapshots archived before the index existed, drop removed ones"""
+        indexed = {snapshot.timestamp for snapshot in self.snapshots()}
+        # Dot folders, like the locks of the archive DB, are not snapshots
+        on_disk = {
+            path.name
+            for path in self.path.iterdir()
+            if path.is_dir() and not path.name.startswith(".")
+        }
+        for timestamp in on_disk - indexed:
+            memory = self.path / timestamp / "memory"
+            self.add(
+                timestamp, read_json(memory / "run_info"), read_json(memory / "review")
+            )
+        for timestamp in indexed - on_disk:
+            with self.connection:
+                self.connection.execute(
+                    "DELETE FROM snapshots WHERE timestamp = ?", (timestamp,)
+                )
+
+    def gc(
+        self,
+        keep_last: Optional[int] = None,
+        keep_best: int = 0,
+        max_size: Optional[int] = None,
+        dry_run: bool = False,
+    ) -> List[Snapshot]:
+        """
+        Remove snapshots and return them. With keep_last, only the newest
+        keep_last and best keep_best reviewed snapshots are kept. With
+        max_size, the oldest of the others are removed until the archive is
+        at most max_size bytes.
+        """
+        snapshots = self.snapshots()
+        protected = {snapshot.timestamp for snapshot in snapshots[: keep_last or 0]}
+        reviewed = [snapshot for snapshot in snapshots if snapshot.score]
+        best = sorted(reviewed, key=lambda snapshot: snapshot.score, reverse=True)
+        protected |= {snapshot.timestamp for snapshot in best[:keep_best]}
+
+        unprotected = [s for s in snapshots if s.timestamp not in protected]
+        removed = unprotected if keep_last is not None else []
+        if max_size is not None:
+            total = sum(
+                snapshot.size for snapshot in snapshots if snapshot not in removed
+            )
+            for snapshot in reversed(unprotected):
+                if total <= max_size:
+                    break
+                if snapshot not in removed:
+                    removed.append(snapshot)
+                    total -= snapshot.size
+
+        if not dry_run:
+            for snapshot in removed:
+                self.remove(snapshot.timestamp)
+        return removed
+
+
+def read_json(path: Path) -> Optional[dict]:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
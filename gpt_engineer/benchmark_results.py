@@ -0,0 +1,155 @@
+import datetime
+import hashlib
+import json
+import platform
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+HEADERS = ["Benchmark", "Ran", "Works", "Perfect", "Notes"]
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """'i/N' to (i, N), where i counts from 1"""
+    try:
+        index, count = (int(part) for part in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got '{shard}'")
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+
+def shard_of(name: str, count: int) -> int:
+    """The shard of a benchmark, the same on every machine"""
+    digest = hashlib.sha256(name.encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % count + 1
+
+
+def shard_folders(folders: Iterable[Path], shard: str) -> List[Path]:
+    index, count = parse_shard(shard)
+    return [folder for folder in folders if shard_of(folder.name, count) == index]
+
+
+def read_text(path: Path) -> Optional[str]:
+    return path.read_text(encoding="utf-8") if path.is_file() else None
+
+
+def benchmark_result(folder: Path) -> dict:
+    """Everything needed to report on a benchmark without its folder"""
+    memory = folder / "memory"
+    review = read_text(memory / "review")
+    run_info = read_text(memory / "run_info")
+    return {
+        "benchmark": folder.name,
+        "review": json.loads(review) if review else None,
+        "run_info": json.loads(run_info) if run_info else None,
+        "token_usage": read_text(memory / "logs" / "token_usage"),
+        "all_output": read_text(folder / "workspace" / "all_output.txt"),
+    }
+
+
+def write_bundle(path: Path, folders: Iterable[Path], shard: Optional[str] = None):
+    bundle = {
+        "shard": shard,
+        "host": platform.node(),
+        "created": datetime.datetime.now().isoformat(),
+        "results": [benchmark_result(folder) for folder in folders],
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(bundle), encoding="utf-8")
+
+
+def merge_bundles(paths: Iterable[Path]) -> dict:
+    """
+    Combine the bundles of the shards of a run. When a benchmark is in more
+    than one bundle, the newest result is used.
+    """
+    bundles = sorted(
+        (json.loads(Path(path).read_text(encoding="utf-8")) for path in paths),
+        key=lambda bundle: bundle["created"],
+    )
+    results: Dict[str, dict] = {}
+    for bundle in bundles:
+        for result in bundle["results"]:
+            results[result["benchmark"]] = result
+
+    shards = sorted({bundle["shard"] for bundle in bundles if bundle["shard"]})
+    missing: List[str] = []
+    if shards:
+        count = parse_shard(shards[0])[1]
+        missing = [
+            f"{index}/{count}"
+            for index in range(1, count + 1)
+            if f"{index}/{count}" not in shards
+        ]
+    return {
+        "shards": shards,
+        "missing_shards": missing,
+        "hosts": sorted({bundle["host"] for bundle in bundles}),
+        "results": [results[name] for name in sorted(results)],
+    }
+
+
+def to_emoji(value: bool) -> str:
+    return "\U00002705" if value else "\U0000274C"
+
+
+def report_rows(results: Iterable[dict]) -> List[list]:
+    rows = []
+    for result in results:
+        review = result["review"] or {}
+        rows.append(
+            [
+                result["benchmark"],
+                to_emoji(review.get("ran", None)),
+                to_emoji(review.get("works", None)),
+                to_emoji(review.get("perfect", None)),
+                review.get("comments", None),
+            ]
+        )
+    return rows
+
+
+def history_record(merged: dict) -> dict:
+    reviews = [result["review"] or {} for result in merged["results"]]
+    return {
+        "date": datetime.datetime.now().strftime("%Y-%m-%d"),
+        "shards": merged["shards"],
+        "hosts": merged["hosts"],
+        "benchmarks": len(reviews),
+        "ran": sum(bool(review.get("ran")) for review in reviews),
+        "works": sum(bool(review.get("works")) for review in reviews),
+        "perfect": sum(bool(review.get("perfect")) for review in reviews),
+        "results": {
+            result["benchmark"]: result["review"] for result in merged["results"]
+        },
+    }
+
+
+def insert_markdown_section(file_path, section_title, section_text, level):
+    with open(file_path, "r") as file:
+        lines = file.readlines()
+
+    header_prefix = "#" * level
+    new_section = f"{header_prefix} {section_title}\n\n{section_text}\n\n"
+
+    # Find the first section with the specified level
+    line_number = -1
+    for i, line in enumerate(lines):
+        if line.startswith(header_prefix):
+            line_number = i
+            break
+
+    if line_number != -1:
+        lines.insert(line_number, new_section)
+    else:
+        print(
+            f"Markdown file was of unexpected format. No section of level {level} found. "
+            "Did not write results."
+        )
+        return
+
+    # Write the file
+    with open(file_path, "w") as file:
+        file.writelines(lines)
@@ -0,0 +1,165 @@
+import hashlib
+import json
+
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from gpt_engineer.db import DB
+
+
+def message_hash(message: dict) -> str:
+    return hashlib.sha256(
+        json.dumps(message, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:32]
+
+
+def read_lines(path: Path) -> Iterator[Tuple[int, bytes]]:
+    """(offset, line) pairs of a file, empty if it does not exist"""
+    if not path.exists():
+        return
+    offset = 0
+    with path.open("rb") as f:
+        for line in f:
+            yield offset, line
+            offset += len(line)
+
+
+class ChatLog:
+    """
+    An append-only log of the conversations of the steps.
+
+    Every distinct message is stored once in messages.jsonl and every
+    conversation in conversations.jsonl, as the list of its message hashes.
+    index.json holds the byte offsets of both for random access, and is
+    rebuilt from the two files when it is missing or out of date.
+
+    A read only log never creates its folder or writes the index, for viewers.
+    """
+
+    def __init__(self, path, read_only: bool = False):
+        self.path = Path(path)
+        self.read_only = read_only
+        if not read_only:
+            self.path.mkdir(parents=True, exist_ok=True)
+        self.messages_path = self.path / "messages.jsonl"
+        self.conversations_path = self.path / "conversations.jsonl"
+        self.index_path = self.path / "index.json"
+        self._index: Optional[dict] = None
+
+    @property
+    def index(self) -> dict:
+        if self._index is None or self._index["sizes"] != self._sizes():
+            self._index = self._load_index()
+        return self._index
+
+    def _sizes(self) -> List[int]:
+        return [
+            path.stat().st_size if path.exists() else 0
+            for path in (self.messages_path, self.conversations_path)
+        ]
+
+    def _load_index(self) -> dict:
+        try:
+            index = json.loads(self.index_path.read_text())
+            if index["sizes"] == self._sizes():
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+        return self.rebuild_index()
+
+    def rebuild_index(self) -> dict:
+        index: Dict[str, dict] = {"messages": {}, "conversations": {}}
+        for offset, line in read_lines(self.messages_path):
+            entry = json.loads(line)
+            index["messages"][entry["hash"]] = [offset, len(line)]
+        for offset, line in read_lines(self.conversations_path):
+            entry = json.loads(line)
+            index["conversations"][entry["step"]] = [offset, len(line)]
+        index["sizes"] = self._sizes()  # type: ignore
+
+        if not self.read_only:
+            self.index_path.write_text(json.dumps(index))
+        return index
+
+    def append(self, step_id: str, messages: List[dict]) -> List[str]:
+        """Store the conversation of a step and return its message hashes"""
+        if self.read_only:
+            raise ValueError(f"The chat log in {self.path} is read only")
+        index = self.index
+        hashes = []
+        with self.messages_path.open("ab") as f:
+            for message in messages:
+                digest = message_hash(message)
+                hashes.append(digest)
+                if digest in index["messages"]:
+                    continue
+                line = (json.dumps({"hash": digest, "message": message}) + "\n").encode(
+                    "utf-8"
+                )
+                index["messages"][digest] = [f.tell(), len(line)]
+                f.write(line)
+
+        with self.conversations_path.open("ab") as f:
+            line = (json.dumps({"step": step_id, "messages": hashes}) + "\n").encode(
+                "utf-8"
+            )
+            index["conversations"][step_id] = [f.tell(), len(line)]
+            f.write(line)
+
+        index["sizes"] = self._sizes()
+        self.index_path.write_text(json.dumps(index))
+        return hashes
+
+    def steps(self) -> List[str]:
+        return list(self.index["conversations"])
+
+    def hashes(self, step_id: str) -> Optional[List[str]]:
+        location = self.index["conversations"].get(step_id)
+        if location is None:
+            return None
+        return json.loads(self._read(self.conversations_path, [location])[0])["messages"]
+
+    def get_messages(self, hashes: List[str]) -> List[dict]:
+        locations = [self.index["messages"][digest] for digest in hashes]
+        return [
+            json.loads(line)["message"]
+            for line in self._read(self.messages_path, locations)
+        ]
+
+    def messages(self, step_id: str) -> Optional[List[dict]]:
+        """The conversation of the step, or None if it is not in the log"""
+        hashes = self.hashes(step_id)
+        return None if hashes is None else self.get_messages(hashes)
+
+    def message(self, step_id: str, turn: int) -> dict:
+        hashes = self.hashes(step_id)
+        if hashes is None:
+            raise KeyError(f"No conversation for step '{step_id}' in '{self.path}'")
+        return self.get_messages([hashes[turn]])[0]
+
+    def to_json(self, step_id: str) -> str:
+        """The conversation in the format of the JSON step logs"""
+        messages = self.messages(step_id)
+        if messages is None:
+            raise KeyError(f"No conversation for step '{step_id}' in '{self.path}'")
+        return json.dumps(messages)
+
+    def _read(self, path: Path, locations) -> List[bytes]:
+        lines = []
+        with path.open("rb") as f:
+            for offset, length in locations:
+                f.seek(offset)
+                lines.append(f.read(length))
+        return lines
+
+
+def load_messages(logs, step_id: str) -> List[dict]:
+    """
+    The messages of a step from the chat log, or from the JSON step log
+    written by older versions.
+    """
+    if isinstance(logs, DB) and (logs.path / "conversations.jsonl").exists():
+        messages = ChatLog(logs.path).messages(step_id)
+        if messages is not None:
+            return messages
+    return json.loads(logs[step_id])
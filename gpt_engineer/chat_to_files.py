@@ -1,24 +1,37 @@
 import re
 
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
 
-def parse_chat(chat):  # -> List[Tuple[str, str]]:
-    # Get all ``` blocks and preceding filenames
-    regex = r"(\S+)\n\s*```[^\n]*\n(.+?)```"
-    matches = re.finditer(regex, chat, re.DOTALL)
+# Get all ``` blocks and preceding filenames
+FILE_BLOCK_REGEX = r"(\S+)\n\s*```[^\n]*\n(.+?)```"
 
-    files = []
-    for match in matches:
-        # Strip the filename of any non-allowed characters and convert / to \
-        path = re.sub(r'[<>"|?*]', "", match.group(1))
+# Like FILE_BLOCK_REGEX, but the filename is optional and the language is kept
+EDIT_BLOCK_REGEX = r"(?:(\S+)\n\s*)?```([^\n]*)\n(.*?)```"
+
+
+def clean_path(path):
+    # Strip the filename of any non-allowed characters and convert / to \
+    path = re.sub(r'[<>"|?*]', "", path)
+
+    # Remove leading and trailing brackets
+    path = re.sub(r"^\[(.*)\]$", r"\1", path)
+
+    # Remove leading and trailing backticks
+    path = re.sub(r"^`(.*)`$", r"\1", path)
 
-        # Remove leading and trailing brackets
-        path = re.sub(r"^\[(.*)\]$", r"\1", path)
+    # Remove trailing ]
+    path = re.sub(r"\]$", "", path)
 
-        # Remove leading and trailing backticks
-        path = re.sub(r"^`(.*)`$", r"\1", path)
+    return path
 
-        # Remove trailing ]
-        path = re.sub(r"\]$", "", path)
+
+def parse_chat(chat):  # -> List[Tuple[str, str]]:
+    matches = re.finditer(FILE_BLOCK_REGEX, chat, re.DOTALL)
+
+    files = []
+    for match in matches:
+        path = clean_path(match.group(1))
 
         # Get the code
         code = match.group(2)
@@ -34,9 +47,227 @@ def parse_chat(chat):  # -> List[Tuple[str, str]]:
     return files
 
 
-def to_files(chat, workspace):
-    workspace["all_output.txt"] = chat
-
-    files = parse_chat(chat)
+def write_files(workspace, files):
+    """Write (path, content) pairs in one batch when the workspace is a DB"""
+    if hasattr(workspace, "set_many"):
+        workspace.set_many(files)
+        return
     for file_name, file_content in files:
         workspace[file_name] = file_content
+
+
+def to_files(chat, workspace):
+    write_files(workspace, [("all_output.txt", chat)] + parse_chat(chat))
+
+
+def files_to_chat(files):
+    """Format (path, code) pairs the same way the model is asked to write them"""
+    return "\n".join(f"{path}\n```\n{code}```\n" for path, code in files)
+
+
+def update_all_output(all_output, files):
+    """
+    Replace the code of the given files in all_output and append the files
+    that were not part of it, keeping the rest of the text untouched.
+    """
+    files = dict(files)
+    chunks = []
+    end = 0
+    for match in re.finditer(FILE_BLOCK_REGEX, all_output, re.DOTALL):
+        path = clean_path(match.group(1))
+        if path not in files:
+            continue
+        chunks.append(all_output[end : match.start(2)])
+        chunks.append(files.pop(path))
+        end = match.end(2)
+    chunks.append(all_output[end:])
+
+    if files:
+        chunks.append("\n" + files_to_chat(files.items()))
+    return "".join(chunks)
+
+
+def overwrite_files(chat, workspace):
+    """
+    Write the files of a partial answer, e.g. a fix for a few files, to the
+    workspace and keep all_output.txt describing the whole codebase.
+    """
+    files = [(path, code) for path, code in parse_chat(chat) if path != "README.md"]
+    all_output = update_all_output(workspace.get("all_output.txt", ""), files)
+    write_files(workspace, files + [("all_output.txt", all_output)])
+    return files
+
+
+@dataclass
+class Hunk:
+    old_start: int
+    # (op, line) pairs, where op is " " for context, "-" for removed
+    # and "+" for added lines
+    lines: List[Tuple[str, str]] = field(default_factory=list)
+
+
+def is_diff(lang, code):
+    return lang.strip() == "diff" or code.lstrip().startswith(
+        ("--- ", "@@", "diff --git")
+    )
+
+
+def diff_path(header):
+    # Drop timestamps and the a/ b/ prefixes of git diffs
+    path = header.split("\t")[0].strip()
+    if path == "/dev/null":
+        return None
+    return clean_path(re.sub(r"^[ab]/", "", path))
+
+
+def parse_diff(diff, default_path=None):  # -> List[Tuple[str, List[Hunk]]]
+    """
+    Parse a unified diff into the hunks for each file. Models are sloppy with
+    line numbers and counts, so only the start line is kept as a hint.
+    """
+    patches = []
+    path = default_path
+    hunks = None
+    lines = diff.splitlines()
+    for i, line in enumerate(lines):
+        if (
+            line.startswith("--- ")
+            and i + 1 < len(lines)
+            and lines[i + 1].startswith("+++ ")
+        ):
+            continue
+        if line.startswith("+++ "):
+            path = diff_path(line[4:]) or diff_path(lines[i - 1][4:])
+            hunks = []
+            patches.append((path, hunks))
+            continue
+        if line.startswith("@@"):
+            if hunks is None:
+                hunks = []
+                patches.append((path, hunks))
+            match = re.match(r"@@ -(\d+)", line)
+            hunks.append(Hunk(int(match.group(1)) if match else 0))
+            continue
+        if not hunks or line.startswith("\\"):
+            # Preamble like "diff --git" or "index" lines, or "\ No newline"
+            continue
+
+        if line[:1] in ("-", "+", " "):
+            hunks[-1].lines.append((line[:1], line[1:]))
+        else:
+            # Editors and models drop the leading space of empty context lines
+            hunks[-1].lines.append((" ", line))
+    return patches
+
+
+def find_hunk(lines, old, hint) -> Optional[int]:
+    """Find where the old lines of a hunk are, preferring the closest to hint"""
+    if not old:
+        return min(max(hint, 0), len(lines))
+
+    normalizations: List[Callable[[str], str]] = [
+        lambda line: line,
+        str.rstrip,
+        str.strip,
+    ]
+    for normalize in normalizations:
+        target = [normalize(line) for line in old]
+        normalized = [normalize(line) for line in lines]
+        starts = [
+            i
+            for i in range(len(lines) - len(old) + 1)
+            if normalized[i : i + len(old)] == target
+        ]
+        if starts:
+            return min(starts, key=lambda i: abs(i - hint))
+    return None
+
+
+def reindent(old, matched):
+    """
+    A function that indents an added line of a hunk like the file, given the
+    old lines of the hunk and the lines of the file they matched.
+    """
+    widths = {}
+    for hunk_line, file_line in zip(old, matched):
+        if hunk_line.strip():
+            hunk_indent = hunk_line[: len(hunk_line) - len(hunk_line.lstrip())]
+            file_indent = file_line[: len(file_line) - len(file_line.lstrip())]
+            widths.setdefault(hunk_indent, file_indent)
+    if all(hunk_indent == file_indent for hunk_indent, file_indent in widths.items()):
+        return lambda line: line
+
+    # Indentation the old lines do not have is scaled, e.g. from two spaces per
+    # level to four, or shifted when the hunk has no indented lines
+    scaled = [(len(h), f) for h, f in widths.items() if h and f]
+    shift = widths.get("", "")
+
+    def indent(line):
+        text = line.lstrip()
+        hunk_indent = line[: len(line) - len(text)]
+        if not text:
+            return line
+        if hunk_indent in widths:
+            return widths[hunk_indent] + text
+        if scaled:
+            width, file_indent = scaled[0]
+            size = round(len(hunk_indent) * len(file_indent) / width)
+            return file_indent[0] * size + text
+        return shift + hunk_indent + text
+
+    return indent
+
+
+def apply_hunks(content, hunks, path=""):
+    lines = content.split("\n")
+    offset = 0
+    for hunk in hunks:
+        old = [line for op, line in hunk.lines if op != "+"]
+        start = find_hunk(lines, old, hunk.old_start - 1 + offset)
+        if start is None:
+            raise ValueError(f"Could not find the lines to change in '{path}'")
+
+        # Context lines are taken from the file and added lines are indented
+        # like it, so whitespace-insensitive matches keep the file's indentation
+        indent = reindent(old, lines[start : start + len(old)])
+        new = []
+        position = start
+        for op, line in hunk.lines:
+            if op == "+":
+                new.append(indent(line))
+                continue
+            if op == " ":
+                new.append(lines[position])
+            position += 1
+
+        lines[start : start + len(old)] = new
+        offset += len(new) - len(old)
+    return "\n".join(lines)
+
+
+def apply_edits(chat, workspace):
+    """
+    Apply an answer made of unified diffs and whole-file blocks to the
+    workspace. Returns the written paths and the paths whose diffs could not
+    be applied.
+    """
+    files = {}
+    failed = []
+    for match in re.finditer(EDIT_BLOCK_REGEX, chat, re.DOTALL):
+        name, lang, code = match.groups()
+        if is_diff(lang, code):
+            default_path = clean_path(name) if name else None
+            for path, hunks in parse_diff(code, default_path):
+                if path is None:
+                    continue
+                try:
+                    original = files.get(path, workspace.get(path, ""))
+                    files[path] = apply_hunks(original, hunks, path)
+                except ValueError:
+                    failed.append(path)
+        elif name:
+            files[clean_path(name)] = code
+
+    all_output = update_all_output(workspace.get("all_output.txt", ""), files.items())
+    write_files(workspace, list(files.items()) + [("all_output.txt", all_output)])
+    return list(files), failed
@@ -1,34 +1,171 @@
-import hashlib
+import base64
+import gzip
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
 
-from typing import List
+from pathlib import Path
+from typing import Iterator, List
 
-from gpt_engineer import steps
-from gpt_engineer.db import DBs
-from gpt_engineer.domain import Step
-from gpt_engineer.learning import Learning, extract_learning
+from gpt_engineer.db import DBs, cache_path
+from gpt_engineer.fingerprint import pipeline_fingerprint
+from gpt_engineer.fork.steps import Step
+from gpt_engineer.learning import get_session, write_learning
 
+RUDDER_WRITE_KEY = "2Re4kqwL61GDp7S8ewe6K5dbogG"
+RUDDER_DATA_PLANE_URL = "https://gptengineerezm.dataplane.rudderstack.com"
 
-def send_learning(learning: Learning):
-    import rudderstack.analytics as rudder_analytics
+BATCH_SIZE = 20
 
-    rudder_analytics.write_key = "2Re4kqwL61GDp7S8ewe6K5dbogG"
-    rudder_analytics.dataPlaneUrl = "https://gptengineerezm.dataplane.rudderstack.com"
+logger = logging.getLogger(__name__)
 
-    rudder_analytics.track(
-        user_id=learning.session,
-        event="learning",
-        properties=learning.to_dict(),  # type: ignore
+
+def spool_path() -> Path:
+    return cache_path("learnings", "spool.jsonl")
+
+
+def spool_learning(
+    model: str, temperature: float, steps: List[Step], dbs: DBs, path=None
+):
+    """Append the learning to the local spool, it is sent by `flush` later"""
+    path = Path(path or spool_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written to the spool whole, so a failure never leaves a partial line
+    # that the next learning would be appended to
+    event = io.StringIO()
+    event.write('{"type": "track", "event": "learning", ')
+    event.write(f'"userId": {json.dumps(get_session())}, "properties": ')
+    write_learning(
+        event, model, temperature, steps, dbs, steps_file_hash=steps_file_hash()
     )
+    event.write("}\n")
+    with path.open("a", encoding="utf-8") as f:
+        f.write(event.getvalue())
 
 
-def collect_learnings(model: str, temperature: float, steps: List[Step], dbs: DBs):
-    learnings = extract_learning(
-        model, temperature, steps, dbs, steps_file_hash=steps_file_hash()
+def post_batch(lines: List[str], endpoint: str, write_key: str):
+    # The spooled lines already are JSON events, so they are not parsed again
+    body = ('{"batch": [' + ",".join(lines) + "]}").encode("utf-8")
+    auth = base64.b64encode(f"{write_key}:".encode("utf-8")).decode("ascii")
+    request = urllib.request.Request(
+        endpoint.rstrip("/") + "/v1/batch",
+        data=gzip.compress(body),
+        headers={
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+            "Authorization": f"Basic {auth}",
+        },
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        response.read()
+
+
+def read_batches(path: Path, batch_size: int) -> Iterator[List[str]]:
+    batch = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            try:
+                json.loads(line)
+            except ValueError:
+                # Empty, or cut short by a crash while it was written
+                continue
+            batch.append(line)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def rejected(error: urllib.error.HTTPError) -> bool:
+    """Whether the endpoint would reject the batch again, unlike on a rate limit"""
+    return 400 <= error.code < 500 and error.code not in (408, 429)
+
+
+def flush(
+    endpoint: str = RUDDER_DATA_PLANE_URL,
+    write_key: str = RUDDER_WRITE_KEY,
+    path=None,
+    batch_size: int = BATCH_SIZE,
+) -> int:
+    """
+    Send the spooled learnings in compressed batches and return how many were
+    sent. Batches that could not be sent, e.g. when offline or on server errors,
+    stay in the spool directory for the next flush. Batches the endpoint rejects
+    are dropped, so they do not hold back the later ones.
+    """
+    path = Path(path or spool_path())
+    if path.exists():
+        # Claim the spool so new learnings go to a fresh file
+        path.rename(path.with_name(f"{time.time_ns()}.batch"))
+
+    sent = 0
+    for batch_file in sorted(path.parent.glob("*.batch")):
+        # Another flusher may have claimed the file in the meantime
+        claimed = batch_file.with_name(f"{batch_file.name}.{os.getpid()}")
+        try:
+            batch_file.rename(claimed)
+        except OSError:
+            continue
+
+        # Lines of the file that were sent or dropped
+        handled = 0
+        done = False
+        try:
+            for batch in read_batches(claimed, batch_size):
+                try:
+                    post_batch(batch, endpoint, write_key)
+                    sent += len(batch)
+                except urllib.error.HTTPError as e:
+                    if not rejected(e):
+                        raise
+                    logger.warning(f"Dropping {len(batch)} learnings rejected: {e}")
+                handled += len(batch)
+            done = True
+        except OSError as e:
+            logger.debug(f"Could not send learnings, keeping them for later: {e}")
+        finally:
+            # Also on other errors, so claimed files are never left behind
+            if done:
+                claimed.unlink()
+            else:
+                remaining = list(read_batches(claimed, 1))[handled:]
+                claimed.write_text(
+                    "".join(line + "\n" for [line] in remaining), encoding="utf-8"
+                )
+                claimed.rename(batch_file)
+        if not done:
+            return sent
+    return sent
+
+
+def start_flusher(endpoint: str = RUDDER_DATA_PLANE_URL):
+    """Flush the spool in a detached process, so exiting does not wait for it"""
+    subprocess.Popen(
+        [sys.executable, "-m", "gpt_engineer.collect", endpoint],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
     )
-    send_learning(learnings)
+
+
+def collect_learnings(model: str, temperature: float, steps: List[Step], dbs: DBs):
+    spool_learning(model, temperature, steps, dbs)
+    start_flusher(os.environ.get("GPTE_LEARNINGS_ENDPOINT", RUDDER_DATA_PLANE_URL))
 
 
 def steps_file_hash():
-    with open(steps.__file__, "r") as f:
-        content = f.read()
-        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return pipeline_fingerprint()
+
+
+if __name__ == "__main__":
+    # Started by start_flusher as: python -m gpt_engineer.collect ENDPOINT
+    flush(endpoint=sys.argv[1])
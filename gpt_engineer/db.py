@@ -1,18 +1,59 @@
 import datetime
+import hashlib
+import json
+import mmap
+import os
 import shutil
+import threading
 
+from collections import OrderedDict
+from contextlib import ExitStack
 from dataclasses import dataclass
 from pathlib import Path
+from stat import S_ISREG
+from typing import (
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from gpt_engineer.archive_index import ArchiveIndex
+from gpt_engineer.file_lock import FileLock
+from gpt_engineer.prompt_registry import PromptRegistry
+
+# Prefix of the temporary files that writes are renamed from
+TEMP_PREFIX = ".db-tmp-"
+# Folder that older versions kept the lock files of a DB in, never listed as keys
+LOCK_DIR = ".db-locks"
+# Keys are locked through this many lock files, shared by keys with the same hash
+KEY_LOCK_STRIPES = 64
 
 
 # This class represents a simple database that stores its data as files in a directory.
 class DB:
     """A simple key-value store, where keys are filenames and values are file contents."""
 
+    # Decoded contents are kept in an LRU of this many bytes, so reading the
+    # same large file again returns the same string instead of a new one
+    cache_bytes = 32 * 2**20
+    # Files of at least this size are decoded straight from a memory map
+    mmap_threshold = 2**20
+    # Seconds to wait for a lock before raising DBLockedError, None waits forever
+    lock_timeout: Optional[float] = None
+
     def __init__(self, path):
         self.path = Path(path).absolute()
 
         self.path.mkdir(parents=True, exist_ok=True)
+        self._cache: "OrderedDict[str, Tuple[tuple, str]]" = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
 
     def __contains__(self, key):
         return (self.path / key).is_file()
@@ -20,10 +61,56 @@ class DB:
     def __getitem__(self, key):
         full_path = self.path / key
 
-        if not full_path.is_file():
+        try:
+            stat = full_path.stat()
+        except OSError:
+            stat = None
+        if stat is None or not S_ISREG(stat.st_mode):
             raise KeyError(f"File '{key}' could not be found in '{self.path}'")
-        with full_path.open("r", encoding="utf-8") as f:
-            return f.read()
+
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self._lock:
+            cached = self._cache.get(str(key))
+            if cached is not None and cached[0] == stamp:
+                self._cache.move_to_end(str(key))
+                return cached[1]
+
+        content = self._read(full_path, stat.st_size)
+        self._remember(str(key), stamp, content)
+        return content
+
+    def _read(self, full_path: Path, size: int) -> str:
+        if size < self.mmap_threshold or size == 0:
+            with full_path.open("r", encoding="utf-8") as f:
+                return f.read()
+        with full_path.open("rb") as binary, mmap.mmap(
+            binary.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped, memoryview(mapped) as view:
+            # Decodes from the mapped pages without copying them into bytes first
+            content = str(view, "utf-8")
+        if "\r" in content:
+            # Match the newline translation of text mode reads
+            content = content.replace("\r\n", "\n").replace("\r", "\n")
+        return content
+
+    def _remember(self, key: str, stamp: tuple, content: str):
+        with self._lock:
+            previous = self._cache.pop(key, None)
+            if previous is not None:
+                self._cached_bytes -= len(previous[1])
+            if len(content) > self.cache_bytes:
+                return
+            self._cache[key] = (stamp, content)
+            self._cached_bytes += len(content)
+            while self._cached_bytes > self.cache_bytes:
+                _, (_, evicted) = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+    def _forget(self, key: str):
+        with self._lock:
+            previous = self._cache.pop(key, None)
+            if previous is not None:
+                self._cached_bytes -= len(previous[1])
 
     def get(self, key, default=None):
         try:
@@ -31,35 +118,174 @@ class DB:
         except KeyError:
             return default
 
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        return {key: self[key] for key in keys}
+
+    def _walk(
+        self, prefix: str, exclude: Collection[str]
+    ) -> Iterator[Tuple[str, os.stat_result]]:
+        """(key, stat) of the files whose key starts with prefix"""
+        base = prefix.rsplit("/", 1)[0] + "/" if "/" in prefix else ""
+        stack = [base]
+        while stack:
+            folder = stack.pop()
+            try:
+                entries = list(os.scandir(self.path / folder))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            for entry in entries:
+                key = folder + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if (
+                        entry.name not in exclude
+                        and entry.name != LOCK_DIR
+                        and (key.startswith(prefix) or prefix.startswith(key + "/"))
+                    ):
+                        stack.append(key + "/")
+                elif entry.is_file() and key.startswith(prefix):
+                    if not entry.name.startswith(TEMP_PREFIX):
+                        yield key, entry.stat()
+
+    def keys(self, prefix: str = "", exclude: Collection[str] = ()) -> List[str]:
+        """
+        The keys of all files, or of those starting with prefix, without
+        those in directories named in exclude
+        """
+        return sorted(key for key, _ in self._walk(prefix, exclude))
+
+    def items(
+        self, prefix: str = "", exclude: Collection[str] = ()
+    ) -> List[Tuple[str, str]]:
+        return list(self.get_many(self.keys(prefix, exclude)).items())
+
+    def stamps(
+        self, prefix: str = "", exclude: Collection[str] = ()
+    ) -> Dict[str, Tuple[int, int]]:
+        """(mtime_ns, size) of the files, to notice changes without reading them"""
+        return {
+            key: (stat.st_mtime_ns, stat.st_size)
+            for key, stat in self._walk(prefix, exclude)
+        }
+
+    def lock(self, key: Optional[str] = None) -> ExitStack:
+        """
+        Lock the whole DB, or only key. Key locks share the DB lock, so writes
+        of different keys run in parallel but wait for a DB lock holder.
+        """
+        locks = lock_dir(self.path)
+        stack = ExitStack()
+        try:
+            stack.enter_context(
+                FileLock(
+                    locks / "db.lock", shared=key is not None, timeout=self.lock_timeout
+                )
+            )
+            if key is not None:
+                stripe = int(hashlib.sha256(key.encode("utf-8")).hexdigest()[:8], 16)
+                stack.enter_context(
+                    FileLock(
+                        locks / f"key{stripe % KEY_LOCK_STRIPES}.lock",
+                        timeout=self.lock_timeout,
+                    )
+                )
+        except BaseException:
+            # Only handed over once all locks are held, so a failure releases them
+            stack.close()
+            raise
+        return stack
+
+    def _write_temp(self, key: str, val: str) -> Path:
+        full_path = self.path / key
+        temp_path = full_path.with_name(
+            f"{TEMP_PREFIX}{os.getpid()}-{threading.get_ident()}-{full_path.name}"
+        )
+        temp_path.write_text(val, encoding="utf-8")
+        return temp_path
+
+    def _replace(self, key: str, temp_path: Path, val: str):
+        # Readers see either the old or the new file, never a partial write
+        self._forget(key)
+        stat = temp_path.stat()
+        os.replace(temp_path, self.path / key)
+        if "\r" not in val:
+            self._remember(key, (stat.st_mtime_ns, stat.st_size, stat.st_ino), val)
+
+    def set_many(self, items: Union[Mapping[str, str], Iterable[Tuple[str, str]]]):
+        """
+        Write several files at once, holding the DB lock. Every value is
+        written to a temporary file first and the files are only replaced
+        once all writes succeeded.
+        """
+        items = dict(items)
+        if not all(isinstance(val, str) for val in items.values()):
+            raise TypeError("val must be either a str or bytes")
+
+        with self.lock():
+            for parent in {(self.path / key).parent for key in items}:
+                parent.mkdir(parents=True, exist_ok=True)
+
+            written: List[Tuple[str, Path]] = []
+            try:
+                for key, val in items.items():
+                    written.append((key, self._write_temp(key, val)))
+            except BaseException:
+                for _, temp_path in written:
+                    temp_path.unlink()
+                raise
+
+            for key, temp_path in written:
+                self._replace(key, temp_path, items[key])
+
     def __setitem__(self, key, val):
         full_path = self.path / key
         full_path.parent.mkdir(parents=True, exist_ok=True)
 
         if isinstance(val, str):
-            full_path.write_text(val, encoding="utf-8")
+            with self.lock(str(key)):
+                self._replace(str(key), self._write_temp(str(key), val), val)
         else:
             # If val is neither a string nor bytes, raise an error.
             raise TypeError("val must be either a str or bytes")
 
 
+def cache_path(*parts) -> Path:
+    """A path in the user cache dir, shared by all projects"""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base).joinpath("gpt_engineer", *parts)
+
+
+def lock_dir(path) -> Path:
+    """
+    The folder of the lock files of path. It is kept in the user cache dir, so
+    lock files never end up in generated code or archives.
+    """
+    digest = hashlib.sha256(str(Path(path).resolve()).encode("utf-8")).hexdigest()
+    return cache_path("locks", digest[:24])
+
+
 # dataclass for all dbs:
 @dataclass
 class DBs:
     memory: DB
     logs: DB
-    preprompts: DB
+    preprompts: Union[DB, PromptRegistry]
     input: DB
     workspace: DB
     archive: DB
 
 
 def archive(dbs: DBs):
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    shutil.move(
-        str(dbs.memory.path), str(dbs.archive.path / timestamp / dbs.memory.path.name)
-    )
-    shutil.move(
-        str(dbs.workspace.path),
-        str(dbs.archive.path / timestamp / dbs.workspace.path.name),
-    )
+    with dbs.archive.lock():
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        run_info = json.loads(dbs.memory.get("run_info", "null"))
+        review = json.loads(dbs.memory.get("review", "null"))
+        shutil.move(
+            str(dbs.memory.path),
+            str(dbs.archive.path / timestamp / dbs.memory.path.name),
+        )
+        shutil.move(
+            str(dbs.workspace.path),
+            str(dbs.archive.path / timestamp / dbs.workspace.path.name),
+        )
+        ArchiveIndex(dbs.archive.path).add(timestamp, run_info, review)
     return []
@@ -0,0 +1,230 @@
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from gpt_engineer.db import cache_path
+
+logger = logging.getLogger(__name__)
+
+# The first file of each entry is required for the layer to be built, the
+# rest only contribute to the cache key when they are present.
+MANIFESTS = {
+    "python": ["requirements.txt"],
+    "node": ["package.json", "package-lock.json"],
+}
+
+# Name of the layer in the workspace
+LINK_NAMES = {
+    "python": "venv",
+    "node": "node_modules",
+}
+
+COMPLETE_MARKER = ".complete"
+
+# Written into the workspace copy of a layer, holding the path of the layer
+LAYER_MARKER = ".dep-cache"
+
+# Makes the packages of the layer importable in the workspace venv
+LAYER_PTH = "_dep_cache_layer.pth"
+
+
+def venv_bin(venv: Path) -> Path:
+    return venv / ("Scripts" if os.name == "nt" else "bin")
+
+
+def site_packages(venv: Path) -> Path:
+    if os.name == "nt":
+        return venv / "Lib" / "site-packages"
+    version = f"python{sys.version_info[0]}.{sys.version_info[1]}"
+    return venv / "lib" / version / "site-packages"
+
+
+class DepCache:
+    """A keyed cache of prebuilt virtualenvs and node_modules trees.
+
+    Layers are keyed on the content of the dependency manifests found in a
+    workspace, so repeated runs with the same requirements share one install.
+    `mirror` can be a package index URL or a local directory of packages.
+    Workspaces never modify a layer: python packages are installed into a
+    venv of the workspace that sees the layer's packages, and node_modules is
+    copied.
+    """
+
+    def __init__(self, path=None, mirror: Optional[str] = None, offline=False):
+        if offline and not (mirror and Path(mirror).is_dir()):
+            raise ValueError("Offline installs need a local package directory as mirror")
+        self.path = Path(path or cache_path("deps")).absolute()
+        self.mirror = mirror
+        self.offline = offline
+
+    def manifests(self, workspace: Path) -> Dict[str, List[Path]]:
+        found = {}
+        for kind, names in MANIFESTS.items():
+            if not (workspace / names[0]).is_file():
+                continue
+            found[kind] = [
+                workspace / name for name in names if (workspace / name).is_file()
+            ]
+        return found
+
+    def key(self, kind: str, manifests: List[Path]) -> str:
+        digest = hashlib.sha256(kind.encode("utf-8"))
+        if kind == "python":
+            digest.update(f"{sys.version_info[0]}.{sys.version_info[1]}".encode("utf-8"))
+        for manifest in manifests:
+            digest.update(manifest.name.encode("utf-8"))
+            digest.update(manifest.read_bytes())
+        return digest.hexdigest()[:24]
+
+    def layer(self, kind: str, manifests: List[Path]) -> Path:
+        """Return the cached layer for the manifests, building it if needed."""
+        layer_path = self.path / kind / self.key(kind, manifests)
+        if (layer_path / COMPLETE_MARKER).is_file():
+            logger.debug(f"Reusing cached {kind} dependencies from {layer_path}")
+            return layer_path
+
+        # Built next to the layer and moved into place once complete, so
+        # concurrent builds of the same layer do not remove each other's files
+        layer_path.parent.mkdir(parents=True, exist_ok=True)
+        build_path = Path(
+            tempfile.mkdtemp(prefix=f".{layer_path.name}-", dir=layer_path.parent)
+        )
+
+        print(f"Building cached {kind} dependencies in {layer_path}")
+        try:
+            self._build(kind, manifests, build_path)
+            (build_path / COMPLETE_MARKER).write_text("")
+            if layer_path.exists() and not (layer_path / COMPLETE_MARKER).is_file():
+                # Leftovers of a build from before layers were moved into place
+                shutil.rmtree(layer_path, ignore_errors=True)
+            os.replace(build_path, layer_path)
+        except OSError:
+            if not (layer_path / COMPLETE_MARKER).is_file():
+                raise
+            logger.debug(f"{layer_path} was built concurrently")
+        finally:
+            shutil.rmtree(build_path, ignore_errors=True)
+        return layer_path
+
+    def _build(self, kind: str, manifests: List[Path], layer_path: Path):
+        # Only the packages of the venv are used once it is moved, so it does
+        # not matter that its scripts refer to the build path
+        if kind == "python":
+            venv = layer_path / LINK_NAMES[kind]
+            subprocess.run([sys.executable, "-m", "venv", str(venv)], check=True)
+            subprocess.run(
+                [str(venv_bin(venv) / "python"), "-m", "pip", "install"]
+                + ["-r", str(manifests[0])]
+                + self._pip_args(),
+                check=True,
+            )
+        elif kind == "node":
+            for manifest in manifests:
+                shutil.copy(manifest, layer_path / manifest.name)
+            command = "ci" if len(manifests) > 1 else "install"
+            subprocess.run(
+                ["npm", command] + self._npm_args(), cwd=layer_path, check=True
+            )
+        else:
+            raise ValueError(f"Unknown dependency kind: {kind}")
+
+    def _pip_args(self) -> List[str]:
+        if self.mirror and Path(self.mirror).is_dir():
+            return ["--no-index", "--find-links", self.mirror]
+        return ["--index-url", self.mirror] if self.mirror else []
+
+    def _npm_args(self) -> List[str]:
+        args = []
+        if self.mirror and not Path(self.mirror).is_dir():
+            args += ["--registry", self.mirror]
+        if self.offline:
+            args.append("--offline")
+        return args
+
+    def link(self, workspace: Path, kind: str, layer_path: Path) -> Optional[Path]:
+        link_path = workspace / LINK_NAMES[kind]
+        marker = (
+            site_packages(link_path) / LAYER_PTH
+            if kind == "python"
+            else link_path / LAYER_MARKER
+        )
+        if link_path.is_symlink():
+            link_path.unlink()
+        elif marker.is_file():
+            if kind == "node" and marker.read_text() == str(layer_path):
+                return link_path
+            shutil.rmtree(link_path)
+        elif link_path.exists():
+            logger.info(f"Not linking cached {kind} dependencies over {link_path}")
+            return None
+
+        if kind == "python":
+            self._overlay_venv(link_path, layer_path / LINK_NAMES[kind])
+        else:
+            shutil.copytree(layer_path / LINK_NAMES[kind], link_path, symlinks=True)
+            marker.write_text(str(layer_path))
+        return link_path
+
+    def _overlay_venv(self, venv: Path, layer_venv: Path):
+        """
+        Create a venv that imports the packages of the layer, and installs
+        packages into itself instead of the layer
+        """
+        subprocess.run(
+            [sys.executable, "-m", "venv", "--without-pip", str(venv)], check=True
+        )
+        layer_packages = site_packages(layer_venv)
+        (site_packages(venv) / LAYER_PTH).write_text(str(layer_packages) + "\n")
+        # The scripts of the layer, pip included, run with the python of the
+        # workspace venv so they install into it
+        python = venv_bin(venv) / "python"
+        for script in venv_bin(layer_venv).iterdir():
+            target = venv_bin(venv) / script.name
+            if target.exists() or not script.is_file():
+                continue
+            with script.open("rb") as f:
+                first_line = f.readline()
+                if not first_line.startswith(b"#!") or b"python" not in first_line:
+                    continue
+                rest = f.read()
+            target.write_bytes(b"#!" + str(python).encode("utf-8") + b"\n" + rest)
+            target.chmod(0o755)
+
+    def prepare(self, workspace) -> Dict[str, str]:
+        """
+        Set up cached dependency layers in the workspace and return the
+        environment run.sh should be executed with.
+        """
+        workspace = Path(workspace)
+        env = dict(os.environ)
+        env["PIP_DISABLE_PIP_VERSION_CHECK"] = "1"
+        if self.offline:
+            env["npm_config_offline"] = "true"
+            env["PIP_NO_INDEX"] = "1"
+            env["PIP_FIND_LINKS"] = str(self.mirror)
+
+        for kind, manifests in self.manifests(workspace).items():
+            try:
+                layer_path = self.layer(kind, manifests)
+                link_path = self.link(workspace, kind, layer_path)
+            except (OSError, subprocess.CalledProcessError) as e:
+                logger.warning(f"Could not use cached {kind} dependencies: {e}")
+                continue
+            if link_path is None:
+                continue
+
+            if kind == "python":
+                env["VIRTUAL_ENV"] = str(link_path)
+                env["PATH"] = str(venv_bin(link_path)) + os.pathsep + env.get("PATH", "")
+            elif kind == "node":
+                env["npm_config_prefer_offline"] = "true"
+                env["PATH"] = str(link_path / ".bin") + os.pathsep + env.get("PATH", "")
+
+        return env
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore
+    import msvcrt
+
+
+class DBLockedError(Exception):
+    pass
+
+
+# [count, fd, shared] of the lock paths held by each thread, so a thread can
+# take a lock it already holds
+_held = threading.local()
+
+
+def held() -> Dict[str, List[int]]:
+    if not hasattr(_held, "paths"):
+        _held.paths = {}
+    return _held.paths
+
+
+def try_lock(fd: int, shared: bool, wait: bool = False) -> bool:
+    try:
+        if fcntl is not None:
+            mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            fcntl.flock(fd, mode if wait else mode | fcntl.LOCK_NB)
+        else:
+            # msvcrt has no shared locks, readers and writers are both exclusive
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def unlock(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """
+    An advisory lock on a file, shared between processes and threads.
+
+    With a timeout of None, acquiring waits until the lock is free. Otherwise
+    DBLockedError is raised after timeout seconds, so 0 fails immediately.
+    """
+
+    poll_interval = 0.01
+
+    def __init__(self, path, shared: bool = False, timeout: Optional[float] = None):
+        self.path = Path(path)
+        self.shared = shared
+        self.timeout = timeout
+
+    def acquire(self):
+        key = str(self.path)
+        if key in held():
+            if held()[key][2] and not self.shared:
+                # Upgrading could deadlock with another thread doing the same
+                raise DBLockedError(
+                    f"'{self.path}' is held shared by this thread, "
+                    "it cannot be locked exclusively"
+                )
+            held()[key][0] += 1
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while not try_lock(fd, self.shared, wait=self.timeout is None):
+            if deadline is not None and time.monotonic() >= deadline:
+                os.close(fd)
+                raise DBLockedError(f"'{self.path}' is locked by another process")
+            time.sleep(self.poll_interval)
+        held()[key] = [1, fd, self.shared]
+
+    def release(self):
+        key = str(self.path)
+        held()[key][0] -= 1
+        if held()[key][0] > 0:
+            return
+        _, fd, _ = held().pop(key)
+        unlock(fd)
+        os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,81 @@
+import hashlib
+import json
+
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from gpt_engineer.db import cache_path
+
+PACKAGE_PATH = Path(__file__).parent
+
+_memo: Optional[Tuple[list, str]] = None
+
+
+def pipeline_files() -> List[Path]:
+    """The source files that define what the steps do"""
+    return [
+        PACKAGE_PATH / "steps.py",
+        PACKAGE_PATH / "fork" / "steps.py",
+    ] + sorted(path for path in (PACKAGE_PATH / "preprompts").iterdir() if path.is_file())
+
+
+def steps_config() -> str:
+    from gpt_engineer.steps import STEPS
+
+    return json.dumps(
+        {
+            config.value: [
+                [type(step).__name__, step.step_id] for step in STEPS[config].steps
+            ]
+            for config in STEPS
+        },
+        sort_keys=True,
+    )
+
+
+def stamps() -> list:
+    stamps = []
+    for path in pipeline_files():
+        stat = path.stat()
+        stamps.append([str(path), stat.st_mtime_ns, stat.st_size])
+    return stamps
+
+
+def compute_fingerprint() -> str:
+    digest = hashlib.sha256()
+    for path in pipeline_files():
+        digest.update(path.relative_to(PACKAGE_PATH).as_posix().encode("utf-8"))
+        digest.update(path.read_bytes())
+    digest.update(steps_config().encode("utf-8"))
+    return digest.hexdigest()
+
+
+def pipeline_fingerprint() -> str:
+    """
+    A hash of the step classes, preprompts and STEPS configs. It is cached in
+    memory and in the user cache dir, and only recomputed when the mtime or
+    size of one of the files changed.
+    """
+    global _memo
+
+    current = stamps()
+    if _memo is not None and _memo[0] == current:
+        return _memo[1]
+
+    path = cache_path("pipeline_fingerprint.json")
+    try:
+        cached = json.loads(path.read_text())
+        if cached["stamps"] == current:
+            _memo = (current, cached["fingerprint"])
+            return cached["fingerprint"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    fingerprint = compute_fingerprint()
+    _memo = (current, fingerprint)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"stamps": current, "fingerprint": fingerprint}))
+    except OSError:
+        pass
+    return fingerprint
@@ -1,53 +1,383 @@
+import codecs
+import difflib
+import fnmatch
+import hashlib
 import json
+import os
 import re
+import shutil
+import signal
 import subprocess
+import sys
+import threading
 
-from typing import List
+from pathlib import Path
+from typing import List, Optional, Tuple
 
 from gpt_engineer.ai import AI
-from gpt_engineer.chat_to_files import to_files
-from gpt_engineer.db import DBs
+from gpt_engineer.answers import Answers, TerminalAnswers
+from gpt_engineer.archive_index import ArchiveIndex
+from gpt_engineer.chat_log import ChatLog, load_messages
+from gpt_engineer.chat_to_files import (
+    apply_edits,
+    files_to_chat,
+    overwrite_files,
+    parse_chat,
+    to_files,
+)
+from gpt_engineer.db import DB, DBs
+from gpt_engineer.dep_cache import LINK_NAMES, DepCache
+from gpt_engineer.fingerprint import pipeline_fingerprint
 from gpt_engineer.learning import human_input
+from gpt_engineer.prompt_registry import PromptRegistry, render
+from gpt_engineer.retrieval import FileIndex
+
+# Installed dependencies and caches of the generated code. They can be large and
+# are not what the steps generate, so they are not checked for changed outputs.
+DEPENDENCY_DIRS = (*LINK_NAMES.values(), ".venv", "__pycache__")
 
 
 class Step:
     step_id: str = "undefined"
+    # Whether the step waits for answers from the user
+    interactive: bool = False
+    # What the step reads: "<db>/<key>" for a file of the input, memory,
+    # workspace or preprompts DB, "logs/<step_id>" for the conversation of an
+    # earlier step and "prev" for the messages of the previous step. None
+    # means undeclared, so the step depends on everything that ran before it.
+    inputs: Optional[Tuple[str, ...]] = None
+    # The "<db>/<key>" files the step writes, keys may be glob patterns
+    outputs: Tuple[str, ...] = ()
+    # Whether the step calls the model, otherwise model and temperature do
+    # not change what it does
+    requires_model: bool = True
+    # Whether --resume may skip the step. Steps with side effects outside the
+    # DBs, like executing the code or asking for a review, always run.
+    resumable: bool = True
 
     def __init__(self, name):
         self.name = name
         self.prev = None
+        self.runner = None
+        # Workspace files changed through diffs, which the answer does not
+        # name in full like whole-file code blocks
+        self.edited: List[str] = []
 
     def __call__(self, runner: "StepRunner"):
         self.prev = runner.prev_step
+        self.runner = runner
+        self.edited = []
         self.messages = self.run(runner.ai, runner.dbs)
         return self.messages
 
     def run(self, ai: AI, dbs: DBs):
         pass
 
+    def answers(self) -> Answers:
+        if self.runner is None:
+            return TerminalAnswers()
+        return self.runner.answers
+
+    def apply_changes(self, ai: AI, messages, dbs: DBs):
+        """
+        Apply the diffs of the last answer to the workspace and ask for the full
+        content of the files whose diffs did not apply.
+        """
+        written, failed = apply_edits(messages[-1]["content"], dbs.workspace)
+        self.edited += [path for path in written if path not in failed]
+        if failed:
+            messages = ai.next(
+                messages,
+                "The changes to "
+                + ", ".join(failed)
+                + " could not be applied. Output the full new content of these files.",
+            )
+            overwrite_files(messages[-1]["content"], dbs.workspace)
+        return messages
+
+    def workspace_context(self, ai: AI, dbs: DBs, query: str) -> str:
+        """
+        The generated codebase, or only the files most relevant to query when
+        it does not fit in the context budget of the runner.
+        """
+        all_output = dbs.workspace["all_output.txt"]
+        if self.runner is None or self.runner.context_budget is None:
+            return all_output
+        budget = self.runner.context_budget
+        if isinstance(dbs.preprompts, PromptRegistry):
+            # The system prompt is sent along with the files
+            budget -= dbs.preprompts.tokens("system")
+        if ai.num_tokens(all_output) <= budget:
+            return all_output
+
+        files = self.runner.index.select(query, budget, ai.num_tokens)
+        selected = {path for path, _ in files}
+        others = [
+            path
+            for path, _ in parse_chat(all_output)
+            if path not in selected and path != "README.md"
+        ]
+        return (
+            files_to_chat(files) + "\nOther files in the codebase: " + ", ".join(others)
+        )
+
+
+def sha256(content) -> str:
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
 
 class StepRunner:
-    def __init__(self, ai: AI, dbs: DBs, steps: List[Step]):
+    def __init__(
+        self,
+        ai: AI,
+        dbs: DBs,
+        steps: List[Step],
+        dep_cache: Optional[DepCache] = None,
+        context_budget: Optional[int] = None,
+        resume: bool = False,
+        answers: Optional[Answers] = None,
+    ):
         self.ai = ai
         self.dbs = dbs
         self.steps = steps
+        self.dep_cache = dep_cache
+        self.context_budget = context_budget
+        self.resume = resume
+        self.answers = answers or TerminalAnswers()
+        self.index = FileIndex(dbs.workspace)
+        self.chat_log = ChatLog(dbs.logs.path)
         self.prev_step = None
 
     def run(self):
+        prev_key = ""
         for step in self.steps:
-            messages = step(self)
-            self.dbs.logs[step.step_id] = json.dumps(messages)
+            fingerprint = self.fingerprint(step, prev_key)
+
+            checkpoint = None
+            if self.resume and step.resumable:
+                checkpoint = self.load_checkpoint(step, fingerprint)
+            if checkpoint is not None:
+                print(f"Skipping {step.name}, it already ran with the same inputs.")
+                step.prev = self.prev_step
+                step.runner = self
+                step.messages = self.chat_log.get_messages(checkpoint["conversation"])
+            else:
+                # Steps that always run are never resumed from their outputs
+                before = self.output_stamps() if step.resumable else {}
+                messages = step(self)
+                conversation = self.chat_log.append(step.step_id, messages)
+                checkpoint = self.save_checkpoint(step, fingerprint, before, conversation)
+                self.record_provenance(step, messages)
+
+            prev_key = sha256(json.dumps(checkpoint, sort_keys=True))
             self.prev_step = step
 
+    def fingerprint(self, step: Step, prev_key: str) -> str:
+        """
+        A hash of everything the step depends on. Steps that declare their
+        inputs only depend on those, others on all files of the project folder
+        and on the steps that ran before them.
+        """
+        inputs: List[Optional[str]]
+        if step.inputs is None:
+            inputs = [prev_key, self.inputs_hash()]
+        else:
+            inputs = [self.input_hash(name, prev_key) for name in step.inputs]
+        model = [
+            str(getattr(self.ai, "model", "")),
+            getattr(self.ai, "temperature", None),
+        ]
+        return sha256(
+            json.dumps(
+                [
+                    step.step_id,
+                    type(step).__name__,
+                    model if step.requires_model else None,
+                    inputs,
+                    pipeline_fingerprint(),
+                ]
+            )
+        )
+
+    def input_hash(self, name: str, prev_key: str) -> Optional[str]:
+        """The hash of a declared input, None if it does not exist yet"""
+        if name == "prev":
+            return prev_key
+        db_name, key = name.split("/", 1)
+        if db_name == "logs":
+            try:
+                return sha256(json.dumps(load_messages(self.dbs.logs, key)))
+            except KeyError:
+                return None
+        db = getattr(self.dbs, db_name)
+        if key not in db:
+            return None
+        return sha256(db[key])
+
+    def plan(self) -> List[Tuple[Step, bool, str]]:
+        """
+        Which steps a resumed run would execute and why. A step reruns when its
+        checkpoint is stale or when an earlier step that reruns may write one
+        of its declared inputs.
+        """
+        plan: List[Tuple[Step, bool, str]] = []
+        prev_key = ""
+        rerun: List[str] = []
+        outputs: List[str] = []
+        for step in self.steps:
+            reason = next(
+                (
+                    f"{name} may change"
+                    for name in step.inputs or ()
+                    if (name == "prev" and plan and plan[-1][1])
+                    or (name.startswith("logs/") and name[len("logs/") :] in rerun)
+                    or any(fnmatch.fnmatch(name, output) for output in outputs)
+                ),
+                "",
+            )
+            checkpoint = None
+            if not reason and not step.resumable:
+                reason = "always runs"
+            elif not reason:
+                checkpoint = self.load_checkpoint(step, self.fingerprint(step, prev_key))
+                if checkpoint is not None:
+                    reason = "unchanged"
+                elif f"checkpoints/{step.step_id}.json" in self.dbs.logs:
+                    reason = "inputs or outputs changed"
+                else:
+                    reason = "has not run yet"
+
+            plan.append((step, checkpoint is None, reason))
+            if checkpoint is None:
+                rerun.append(step.step_id)
+                outputs += step.outputs
+                # Unknown until the step ran, so the fingerprints of later
+                # undeclared steps do not match
+                prev_key = step.step_id
+            else:
+                prev_key = sha256(json.dumps(checkpoint, sort_keys=True))
+        return plan
+
+    def record_provenance(self, step: Step, messages):
+        """
+        Record which step wrote each file of the workspace and the main prompt
+        it was written for, so later runs can tell what a prompt change affects.
+        """
+        if not messages or messages[-1].get("role") != "assistant":
+            return
+        named = [path for path, _ in parse_chat(messages[-1]["content"])]
+        paths = [
+            path
+            for path in dict.fromkeys(named + step.edited)
+            if path != "README.md" and path in self.dbs.workspace
+        ]
+        if not paths:
+            return
+
+        provenance = json.loads(self.dbs.memory.get("provenance", "{}"))
+        main_prompt = self.dbs.input.get("main_prompt", "")
+        provenance["main_prompt"] = main_prompt
+        files = provenance.setdefault("files", {})
+        for path in paths:
+            files[path] = {"step": step.step_id, "prompt": sha256(main_prompt)}
+        self.dbs.memory["provenance"] = json.dumps(provenance)
+
+    def inputs_hash(self) -> str:
+        # Only the files of the project folder itself, not memory or workspace
+        digest = hashlib.sha256()
+        for path in sorted(self.dbs.input.path.iterdir()):
+            if path.is_file():
+                digest.update(path.name.encode("utf-8"))
+                digest.update(path.read_bytes())
+        return digest.hexdigest()
+
+    def output_dbs(self):
+        return {"memory": self.dbs.memory, "workspace": self.dbs.workspace}
+
+    def output_stamps(self):
+        stamps = {}
+        for name, db in self.output_dbs().items():
+            # The logs are written by the runner itself
+            exclude = list(DEPENDENCY_DIRS) + (
+                [self.dbs.logs.path.name] if self.dbs.logs.path.parent == db.path else []
+            )
+            for key, stamp in db.stamps(exclude=exclude).items():
+                # Also updated by the runner after every step
+                if name == "memory" and key == "provenance":
+                    continue
+                stamps[f"{name}/{key}"] = stamp
+        return stamps
+
+    def save_checkpoint(self, step: Step, fingerprint: str, before, conversation):
+        """Record the conversation of the step and the DB files it wrote"""
+        outputs = {}
+        for output, stamp in (self.output_stamps() if step.resumable else {}).items():
+            if before.get(output) == stamp:
+                continue
+            name, key = output.split("/", 1)
+            outputs[output] = sha256((self.output_dbs()[name].path / key).read_bytes())
+
+        checkpoint = {
+            "fingerprint": fingerprint,
+            "conversation": conversation,
+            "outputs": outputs,
+        }
+        self.dbs.logs[f"checkpoints/{step.step_id}.json"] = json.dumps(checkpoint)
+        return checkpoint
+
+    def load_checkpoint(self, step: Step, fingerprint: str):
+        """
+        Return the checkpoint of the step if it ran with the same inputs and
+        the files it wrote are unchanged, otherwise None.
+        """
+        data = self.dbs.logs.get(f"checkpoints/{step.step_id}.json")
+        if data is None:
+            return None
+        checkpoint = json.loads(data)
+        if checkpoint["fingerprint"] != fingerprint:
+            return None
+        if any(
+            digest not in self.chat_log.index["messages"]
+            for digest in checkpoint["conversation"]
+        ):
+            return None
+        for output, digest in checkpoint["outputs"].items():
+            name, key = output.split("/", 1)
+            path = self.output_dbs()[name].path / key
+            if not path.is_file() or sha256(path.read_bytes()) != digest:
+                return None
+        return checkpoint
+
 
 def setup_sys_prompt(dbs):
-    return (
-        dbs.preprompts["generate"] + "\nUseful to know:\n" + dbs.preprompts["philosophy"]
-    )
+    return render(dbs.preprompts, "system")
+
+
+def instructions(dbs):
+    return render(dbs.preprompts, "instructions", main_prompt=dbs.input["main_prompt"])
+
+
+def edit_prompt(dbs, name):
+    """A preprompt followed by the instructions for answering with diffs"""
+    return render(dbs.preprompts, "edit_" + name)
+
+
+def clarification_context(
+    main_prompt: str, answered: List[Tuple[str, str]], question: str
+) -> str:
+    """The prompt and the questions answered so far, for answers by the model"""
+    context = f"The instructions of the author:\n\n{main_prompt}\n\n"
+    for previous, answer in answered:
+        context += f"Question: {previous}\nAnswer of the author: {answer}\n\n"
+    return context + f"Question: {question}\nAnswer of the author:"
 
 
 class ClarificationStep(Step):
     step_id: str = "clarification"
+    interactive: bool = True
+    inputs = ("input/main_prompt",)
 
     def __init__(self):
         Step.__init__(self, "Clarification")
@@ -59,18 +389,27 @@ class ClarificationStep(Step):
         """
         messages = [ai.fsystem(dbs.preprompts["qa"])]
         user = dbs.input["main_prompt"]
+        answered: List[Tuple[str, str]] = []
         while True:
-            messages = ai.next(messages, user)
+            messages = ai.next(messages, user, step_name=self.step_id)
 
             if messages[-1]["content"].strip().lower().startswith("no"):
                 break
 
             print()
-            user = input('(answer in text, or "c" to move on)\n')
+            question = messages[-1]["content"]
+            user = self.answers().ask(
+                "clarification",
+                '(answer in text, or "c" to move on)\n',
+                context=clarification_context(
+                    dbs.input["main_prompt"], answered, question
+                ),
+            )
             print()
 
             if not user or user == "c":
                 break
+            answered.append((question, user))
 
             user += (
                 "\n\n"
@@ -86,6 +425,8 @@ class ClarificationStep(Step):
 
 class GenClarifiedCode(Step):
     step_id: str = "run_latest"
+    inputs = ("prev",)
+    outputs = ("workspace/*",)
 
     def __init__(self):
         Step.__init__(self, "Run Latest")
@@ -97,13 +438,14 @@ class GenClarifiedCode(Step):
         messages = [
             ai.fsystem(setup_sys_prompt(dbs)),
         ] + messages[1:]
-        messages = ai.next(messages, dbs.preprompts["use_qa"])
+        messages = ai.next(messages, dbs.preprompts["use_qa"], step_name=self.step_id)
         to_files(messages[-1]["content"], dbs.workspace)
         return messages
 
 
 class Planning(Step):
     step_id: str = "planning"
+    inputs = ("prev",)
 
     def __init__(self):
         Step.__init__(self, "Planning")
@@ -121,6 +463,8 @@ class Planning(Step):
 
 class SimpleGen(Step):
     step_id: str = "run_main"
+    inputs = ("input/main_prompt",)
+    outputs = ("workspace/*",)
 
     def __init__(self):
         Step.__init__(self, "Run Main")
@@ -134,6 +478,8 @@ class SimpleGen(Step):
 
 class GenerateSpec(Step):
     step_id: str = "gen_spec"
+    inputs = ("input/main_prompt",)
+    outputs = ("memory/specification",)
 
     def __init__(self):
         Step.__init__(self, "Generate Specification")
@@ -145,7 +491,7 @@ class GenerateSpec(Step):
         """
         messages = [
             ai.fsystem(setup_sys_prompt(dbs)),
-            ai.fsystem(f"Instructions: {dbs.input['main_prompt']}"),
+            ai.fsystem(instructions(dbs)),
         ]
 
         messages = ai.next(messages, dbs.preprompts["spec"])
@@ -157,12 +503,14 @@ class GenerateSpec(Step):
 
 class ReSpec(Step):
     step_id: str = "respec"
+    inputs = ("logs/gen_spec",)
+    outputs = ("memory/specification",)
 
     def __init__(self):
         Step.__init__(self, "Regenerate Specification")
 
     def run(self, ai: AI, dbs: DBs):
-        messages = dbs.logs[GenerateSpec.step_id]
+        messages = load_messages(dbs.logs, GenerateSpec.step_id)
         messages += [ai.fsystem(dbs.preprompts["respec"])]
 
         messages = ai.next(messages)
@@ -184,6 +532,8 @@ class ReSpec(Step):
 
 class GenerateUnitTests(Step):
     step_id: str = "gen_unit_tests"
+    inputs = ("input/main_prompt", "memory/specification")
+    outputs = ("memory/unit_tests", "workspace/*")
 
     def __init__(self):
         Step.__init__(self, "Generate Unit Tests")
@@ -194,8 +544,14 @@ class GenerateUnitTests(Step):
         """
         messages = [
             ai.fsystem(setup_sys_prompt(dbs)),
-            ai.fuser(f"Instructions: {dbs.input['main_prompt']}"),
-            ai.fuser(f"Specification:\n\n{dbs.memory['specification']}"),
+            ai.fuser(instructions(dbs)),
+            ai.fuser(
+                render(
+                    dbs.preprompts,
+                    "specification",
+                    specification=dbs.memory["specification"],
+                )
+            ),
         ]
 
         messages = ai.next(messages, dbs.preprompts["unit_tests"])
@@ -208,6 +564,12 @@ class GenerateUnitTests(Step):
 
 class GenerateCode(Step):
     step_id: str = "gen_code"
+    inputs = (
+        "input/main_prompt",
+        "memory/specification",
+        "memory/unit_tests",
+    )
+    outputs = ("workspace/*",)
 
     def __init__(self):
         Step.__init__(self, "Generate Code")
@@ -217,9 +579,21 @@ class GenerateCode(Step):
 
         messages = [
             ai.fsystem(setup_sys_prompt(dbs)),
-            ai.fuser(f"Instructions: {dbs.input['main_prompt']}"),
-            ai.fuser(f"Specification:\n\n{dbs.memory['specification']}"),
-            ai.fuser(f"Unit tests:\n\n{dbs.memory['unit_tests']}"),
+            ai.fuser(instructions(dbs)),
+            ai.fuser(
+                render(
+                    dbs.preprompts,
+                    "specification",
+                    specification=dbs.memory["specification"],
+                )
+            ),
+            ai.fuser(
+                render(
+                    dbs.preprompts,
+                    "given_unit_tests",
+                    unit_tests=dbs.memory["unit_tests"],
+                )
+            ),
         ]
         messages = ai.next(messages, dbs.preprompts["use_qa"])
         to_files(messages[-1]["content"], dbs.workspace)
@@ -240,11 +614,24 @@ class ExecuteWorkspace(Step):
 
 class ExecuteEntrypoint(Step):
     step_id: str = "exec_entrypoint"
+    interactive: bool = True
+    inputs: Optional[Tuple[str, ...]] = ("workspace/run.sh", "workspace/all_output.txt")
+    requires_model = False
+    resumable = False
 
     def __init__(self):
         Step.__init__(self, "Execute Entrypoint")
 
     def run(self, ai: AI, dbs: DBs):
+        if not self.confirm(dbs):
+            return []
+
+        subprocess.run(
+            "bash run.sh", shell=True, cwd=dbs.workspace.path, env=self.env(dbs)
+        )
+        return []
+
+    def confirm(self, dbs: DBs) -> bool:
         command = dbs.workspace["run.sh"]
 
         print("Do you want to execute this code?")
@@ -253,9 +640,9 @@ class ExecuteEntrypoint(Step):
         print()
         print('If yes, press enter. Otherwise, type "no"')
         print()
-        if input() not in ["", "y", "yes"]:
+        if self.answers().ask("execute", "") not in ["", "y", "yes"]:
             print("Ok, not executing the code.")
-            return []
+            return False
         print("Executing the code...")
         print(
             "\033[92m"  # green color
@@ -264,12 +651,153 @@ class ExecuteEntrypoint(Step):
             + "\033[0m"
         )
         print()
-        subprocess.run("bash run.sh", shell=True, cwd=dbs.workspace.path)
-        return []
+        return True
+
+    def env(self, dbs: DBs):
+        if self.runner is not None and self.runner.dep_cache is not None:
+            return self.runner.dep_cache.prepare(dbs.workspace.path)
+        return None
+
+
+def trim_output(output: str, max_lines=60, max_chars=4000) -> str:
+    """Keep the tail of the output, which is where tracebacks end up"""
+    lines = output.strip().splitlines()
+    trimmed = "\n".join(lines[-max_lines:])[-max_chars:]
+    if len(trimmed) < len(output.strip()):
+        trimmed = "[...]\n" + trimmed
+    return trimmed
+
+
+def failing_files(error: str, dbs: DBs):
+    """
+    Return the workspace files mentioned in the error, or every generated
+    file if the error does not point at any of them.
+    """
+    names = [
+        path
+        for path, _ in parse_chat(dbs.workspace["all_output.txt"])
+        if path != "README.md"
+    ]
+    names.append("run.sh")
+
+    def mentions(path):
+        # As a whole path component, so "a.py" is not found in "data.py"
+        return re.search(rf"(^|[/\\\"'\s]){re.escape(path)}(?!\w)", error, re.MULTILINE)
+
+    mentioned = [
+        name for name in names if mentions(name) or mentions(name.split("/")[-1])
+    ]
+
+    files = []
+    for name in mentioned or names:
+        if name in dbs.workspace:
+            files.append((name, dbs.workspace[name]))
+    return files
+
+
+class ExecuteEntrypointAndFix(ExecuteEntrypoint):
+    step_id: str = "exec_entrypoint_and_fix"
+    inputs = (
+        "input/main_prompt",
+        "workspace/run.sh",
+        "workspace/all_output.txt",
+    )
+    outputs = ("workspace/*",)
+    requires_model = True
+
+    def __init__(self, max_attempts=3, timeout=600):
+        Step.__init__(self, "Execute Entrypoint And Fix")
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+    def run(self, ai: AI, dbs: DBs):
+        """
+        Execute run.sh and, while it fails, send the files in the traceback
+        to the AI and apply the fixes it answers with.
+        """
+        if not self.confirm(dbs):
+            return []
+
+        env = self.env(dbs)
+        messages = []
+        for attempt in range(self.max_attempts + 1):
+            returncode, output = self.execute(dbs, env)
+            if returncode is None:
+                print(
+                    f"run.sh was stopped after running for {self.timeout} seconds, "
+                    "so it is not known whether it works."
+                )
+                break
+            if returncode == 0:
+                break
+            if attempt == self.max_attempts:
+                print(f"run.sh still fails after {self.max_attempts} fix attempts.")
+                break
+
+            error = trim_output(output)
+            print()
+            print(f"run.sh failed, asking for a fix ({attempt + 1}/{self.max_attempts})")
+            messages = [
+                ai.fsystem(setup_sys_prompt(dbs)),
+                ai.fuser(instructions(dbs)),
+                ai.fuser(files_to_chat(failing_files(error, dbs))),
+                ai.fsystem(edit_prompt(dbs, "fix_runtime_error")),
+            ]
+            messages = ai.next(
+                messages,
+                f"Running run.sh failed with:\n\n{error}",
+                step_name=self.step_id,
+            )
+            messages = self.apply_changes(ai, messages, dbs)
+        return messages
+
+    def execute(self, dbs: DBs, env) -> Tuple[Optional[int], str]:
+        """
+        Run run.sh while showing its output, and return its exit code and output.
+        The exit code is None if it still ran after the timeout, like servers do,
+        as it is then not verified to work.
+        """
+        process = subprocess.Popen(
+            ["bash", "run.sh"],
+            cwd=dbs.workspace.path,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+        assert process.stdout is not None
+        fd = process.stdout.fileno()
+        chunks: List[str] = []
+
+        def tee():
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            # Chunks rather than lines, so prompts without a newline show up too
+            for chunk in iter(lambda: os.read(fd, 4096), b""):
+                text = decoder.decode(chunk)
+                sys.stdout.write(text)
+                sys.stdout.flush()
+                chunks.append(text)
+
+        reader = threading.Thread(target=tee, daemon=True)
+        reader.start()
+        returncode: Optional[int]
+        try:
+            returncode = process.wait(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait()
+            returncode = None
+        # Processes that left the group could keep the pipe open
+        reader.join(timeout=5)
+        if not reader.is_alive():
+            process.stdout.close()
+        return returncode, "".join(chunks)
 
 
 class GenerateEntrypoint(Step):
     step_id: str = "gen_entry_point"
+    inputs = ("input/main_prompt", "workspace/all_output.txt")
+    outputs = ("workspace/run.sh",)
 
     def __init__(self):
         Step.__init__(self, "Generate Entrypoint")
@@ -288,7 +816,13 @@ class GenerateEntrypoint(Step):
                 "Do not use placeholders, use example values "
                 "(like . for a folder argument) if necessary.\n"
             ),
-            user="Information about the codebase:\n\n" + dbs.workspace["all_output.txt"],
+            user="Information about the codebase:\n\n"
+            + self.workspace_context(
+                ai,
+                dbs,
+                "install dependencies requirements package run main entrypoint "
+                + dbs.input["main_prompt"],
+            ),
             step_name=self.step_id,
         )
         print()
@@ -301,6 +835,12 @@ class GenerateEntrypoint(Step):
 
 class UseFeedback(Step):
     step_id: str = "use_feedback"
+    inputs = (
+        "input/main_prompt",
+        "input/feedback",
+        "workspace/all_output.txt",
+    )
+    outputs = ("workspace/*",)
 
     def __init__(self):
         Step.__init__(self, "Use Feedback")
@@ -308,41 +848,179 @@ class UseFeedback(Step):
     def run(self, ai: AI, dbs: DBs):
         messages = [
             ai.fsystem(setup_sys_prompt(dbs)),
-            ai.fuser(f"Instructions: {dbs.input['main_prompt']}"),
-            ai.fassistant(dbs.workspace["all_output.txt"]),
-            ai.fsystem(dbs.preprompts["use_feedback"]),
+            ai.fuser(instructions(dbs)),
+            ai.fassistant(self.workspace_context(ai, dbs, dbs.input["feedback"])),
+            ai.fsystem(edit_prompt(dbs, "use_feedback")),
         ]
         messages = ai.next(messages, dbs.input["feedback"])
-        to_files(messages[-1]["content"], dbs.workspace)
-        return messages
+        return self.apply_changes(ai, messages, dbs)
 
 
 class FixCode(Step):
     step_id: str = "fix_code"
+    inputs = ("input/main_prompt", "logs/gen_code")
+    outputs = ("workspace/*",)
 
     def __init__(self):
         Step.__init__(self, "Fix Code")
 
     def run(self, ai: AI, dbs: DBs):
-        code_ouput = json.loads(dbs.logs[GenerateCode.step_id])[-1]["content"]
+        code_ouput = load_messages(dbs.logs, GenerateCode.step_id)[-1]["content"]
         messages = [
             ai.fsystem(setup_sys_prompt(dbs)),
-            ai.fuser(f"Instructions: {dbs.input['main_prompt']}"),
+            ai.fuser(instructions(dbs)),
             ai.fuser(code_ouput),
-            ai.fsystem(dbs.preprompts["fix_code"]),
+            ai.fsystem(edit_prompt(dbs, "fix_code")),
         ]
         messages = ai.next(messages, "Please fix any errors in the code above.")
-        to_files(messages[-1]["content"], dbs.workspace)
-        return messages
+        return self.apply_changes(ai, messages, dbs)
+
+
+def prompt_diff(old: str, new: str) -> str:
+    return "".join(
+        difflib.unified_diff(
+            old.splitlines(keepends=True),
+            new.splitlines(keepends=True),
+            "previous instructions",
+            "instructions",
+        )
+    )
+
+
+class IncrementalGen(Step):
+    step_id: str = "incremental_gen"
+    # The provenance and clarifications in memory are read too, but they are
+    # written by this step itself, so they are outputs
+    inputs = ("input/main_prompt", "logs/clarification")
+    outputs = ("workspace/*", "memory/provenance", "memory/clarifications")
+
+    def __init__(self, max_files=8):
+        Step.__init__(self, "Incremental Generation")
+        self.max_files = max_files
+
+    def run(self, ai: AI, dbs: DBs):
+        """
+        Restore the code of the last archived run and only change the files
+        affected by how the main prompt changed since then.
+        """
+        if "provenance" in dbs.memory:
+            # Resumed without archiving, the memory and workspace already are
+            # those of the last run and the archive holds the run before it
+            logs: Optional[DB] = dbs.logs
+        else:
+            previous = self.restore(dbs)
+            logs = DB(previous / "memory" / "logs") if previous is not None else None
+        provenance = json.loads(dbs.memory.get("provenance", "{}"))
+        if logs is None or "main_prompt" not in provenance:
+            print("No previous run to update, generating all files.")
+            messages = ai.start(
+                setup_sys_prompt(dbs), dbs.input["main_prompt"], self.step_id
+            )
+            to_files(messages[-1]["content"], dbs.workspace)
+            return messages
+
+        diff = prompt_diff(provenance["main_prompt"], dbs.input["main_prompt"])
+        # Later runs diff against this prompt, also when the answer only has diffs
+        provenance["main_prompt"] = dbs.input["main_prompt"]
+        dbs.memory["provenance"] = json.dumps(provenance)
+        # Kept in memory, so later incremental runs, which have no clarification
+        # log of their own, still get them
+        clarifications = self.clarifications(dbs, logs)
+        if clarifications:
+            dbs.memory["clarifications"] = clarifications
+        if not diff:
+            print("The main prompt did not change, keeping all files.")
+            return []
+
+        files = self.affected_files(dbs, diff, provenance["files"])
+        others = [path for path in provenance["files"] if path not in dict(files)]
+        print(f"Updating {len(files)} files, keeping {len(others)}.")
+
+        messages = [
+            ai.fsystem(setup_sys_prompt(dbs)),
+            ai.fuser(instructions(dbs)),
+        ]
+        if clarifications:
+            messages.append(ai.fuser(f"Clarifications:\n\n{clarifications}"))
+        messages += [
+            ai.fuser(f"How the instructions changed:\n\n```diff\n{diff}```"),
+            ai.fassistant(
+                files_to_chat(files)
+                + "\nOther files in the codebase: "
+                + ", ".join(others)
+            ),
+            ai.fsystem(edit_prompt(dbs, "incremental")),
+        ]
+        messages = ai.next(
+            messages,
+            "Update the code for the changed instructions.",
+            step_name=self.step_id,
+        )
+        return self.apply_changes(ai, messages, dbs)
+
+    def restore(self, dbs: DBs) -> Optional[Path]:
+        """Copy the memory and workspace of the last archived run, return its path"""
+        for snapshot in ArchiveIndex(dbs.archive.path).snapshots():
+            path = dbs.archive.path / snapshot.timestamp
+            if not (path / "workspace").is_dir():
+                continue
+            shutil.copytree(
+                path / "workspace", dbs.workspace.path, symlinks=True, dirs_exist_ok=True
+            )
+            memory = DB(path / "memory")
+            # The review and logs belong to the previous run
+            dbs.memory.set_many(
+                (key, memory[key])
+                for key in memory.keys(exclude=[dbs.logs.path.name])
+                if key != "review"
+            )
+            return path
+        return None
+
+    def clarifications(self, dbs: DBs, logs: DB) -> str:
+        """The clarifications of the run the code was first generated in"""
+        if "clarifications" in dbs.memory:
+            return dbs.memory["clarifications"]
+        try:
+            messages = load_messages(logs, ClarificationStep.step_id)
+        except KeyError:
+            return ""
+        return "\n\n".join(message["content"] for message in messages[1:])
+
+    def affected_files(self, dbs: DBs, diff: str, generated) -> List[Tuple[str, str]]:
+        """The generated files that match the changed lines of the prompt best"""
+        changed = "\n".join(
+            line[1:]
+            for line in diff.splitlines()
+            if line[:1] in "+-" and not line.startswith(("+++", "---"))
+        )
+        index = self.runner.index if self.runner is not None else FileIndex(dbs.workspace)
+        index.refresh()
+        hits = [
+            (path, score) for path, score in index.search(changed) if path in generated
+        ]
+        if not hits:
+            return []
+        best = hits[0][1]
+        return [
+            (path, dbs.workspace[path])
+            for path, score in hits[: self.max_files]
+            if score >= best / 2
+        ]
 
 
 class HumanReview(Step):
     step_id: str = "human_review"
+    interactive: bool = True
+    inputs = ("workspace/run.sh", "workspace/all_output.txt")
+    outputs = ("memory/review",)
+    requires_model = False
+    resumable = False
 
     def __init__(self):
         Step.__init__(self, "Human Review")
 
     def run(self, ai: AI, dbs: DBs):
-        review = human_input()
+        review = human_input(self.answers())
         dbs.memory["review"] = review.to_json()  # type: ignore
         return []
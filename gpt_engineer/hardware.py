@@ -0,0 +1,350 @@
+import logging
+import os
+import platform
+import re
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Sequence
+
+from gpt4all import GPT4All
+from gpt4all.gpt4all import DEFAULT_MODEL_DIRECTORY
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_MODEL = "ggml-replit-code-v1-3b.bin"
+
+# Quantizations from fastest to slowest on a CPU, where inference is bound by
+# memory bandwidth and fewer bits per weight are faster
+QUANTIZATIONS = [
+    "q2_k",
+    "q3_k_s",
+    "q3_k_m",
+    "q3_k_l",
+    "q4_0",
+    "q4_1",
+    "q4_k_s",
+    "q4_k_m",
+    "q5_0",
+    "q5_1",
+    "q5_k_s",
+    "q5_k_m",
+    "q6_k",
+    "q8_0",
+    "f16",
+    "f32",
+]
+
+# Memory a loaded model needs on top of its file, for the context and buffers
+MEMORY_OVERHEAD = 1.2
+
+
+@dataclass
+class Hardware:
+    memory: Optional[int]  # available bytes, None if unknown
+    cores: int  # physical cores this process may run on
+    flags: FrozenSet[str] = field(default_factory=frozenset)
+    machine: str = ""
+
+    def fits(self, model: "ModelFile") -> bool:
+        return self.memory is None or model.memory <= self.memory
+
+
+@dataclass
+class ModelFile:
+    name: str
+    size: int
+
+    @property
+    def quantization(self) -> Optional[str]:
+        match = re.search(r"(q\d_k_[sml]|q\d_[01k]|q\d|f16|f32)", self.name.lower())
+        return match.group(1) if match else None
+
+    @property
+    def base(self) -> str:
+        """The name without quantization, the same for all variants of a model"""
+        quantization = self.quantization
+        name = Path(self.name).stem.lower()
+        return name.replace(quantization, "").strip("-_.") if quantization else name
+
+    @property
+    def memory(self) -> int:
+        return int(self.size * MEMORY_OVERHEAD)
+
+    @property
+    def speed_rank(self) -> int:
+        """Lower is faster, unknown quantizations rank last"""
+        try:
+            return QUANTIZATIONS.index(self.quantization or "")
+        except ValueError:
+            return len(QUANTIZATIONS)
+
+
+def available_memory() -> Optional[int]:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def cpuinfo() -> List[dict]:
+    """The processors of /proc/cpuinfo, empty where it does not exist"""
+    try:
+        text = Path("/proc/cpuinfo").read_text()
+    except OSError:
+        return []
+    processors = []
+    for block in text.strip().split("\n\n"):
+        processor = {}
+        for line in block.splitlines():
+            key, _, value = line.partition(":")
+            processor[key.strip()] = value.strip()
+        processors.append(processor)
+    return processors
+
+
+def usable_cpus() -> List[int]:
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        return list(range(os.cpu_count() or 1))
+
+
+def physical_cores(processors: List[dict], cpus: List[int]) -> int:
+    """
+    The physical cores among cpus. Hyperthreads share the compute units of a
+    core, so using them for inference does not make it faster.
+    """
+    cores = {
+        (processor.get("physical id"), processor.get("core id"))
+        for processor in processors
+        if "core id" in processor and int(processor.get("processor", -1)) in cpus
+    }
+    return len(cores) or len(cpus)
+
+
+def parse_cpus(text: str) -> List[int]:
+    """The cpus of a list like "0-3,8,10-11", as used by taskset and sysfs"""
+    cpus: List[int] = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus += range(int(first), int(last or first) + 1)
+    return sorted(set(cpus))
+
+
+def format_cpus(cpus: Sequence[int]) -> str:
+    ranges: List[List[int]] = []
+    for cpu in sorted(cpus):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(
+        str(first) if first == last else f"{first}-{last}" for first, last in ranges
+    )
+
+
+def numa_nodes(path="/sys/devices/system/node") -> List[List[int]]:
+    """The cpus of each NUMA node, a single node where the topology is unknown"""
+    cpus = usable_cpus()
+    nodes = []
+    for node in sorted(Path(path).glob("node[0-9]*")):
+        try:
+            node_cpus = parse_cpus((node / "cpulist").read_text())
+        except (OSError, ValueError):
+            continue
+        node_cpus = [cpu for cpu in node_cpus if cpu in cpus]
+        if node_cpus:
+            nodes.append(node_cpus)
+    return nodes or [cpus]
+
+
+def cores_of(cpus: List[int], processors: List[dict]) -> List[List[int]]:
+    """
+    The cpus grouped by physical core, so hyperthread siblings stay together.
+    Cpus without a core id in processors are cores of their own.
+    """
+    core_ids = {
+        int(processor["processor"]): (processor.get("physical id"), processor["core id"])
+        for processor in processors
+        if "processor" in processor and "core id" in processor
+    }
+    cores: Dict[object, List[int]] = {}
+    for cpu in cpus:
+        cores.setdefault(core_ids.get(cpu, cpu), []).append(cpu)
+    return list(cores.values())
+
+
+def core_sets(
+    workers: int,
+    nodes: Optional[List[List[int]]] = None,
+    processors: Optional[List[dict]] = None,
+) -> List[List[int]]:
+    """
+    Split the cpus into disjoint sets of whole physical cores for concurrent
+    workers. Workers are spread over the NUMA nodes, so a set only crosses
+    nodes when there are more nodes than workers. With more workers than
+    cores, sets are shared.
+    """
+    nodes = nodes if nodes is not None else numa_nodes()
+    processors = processors if processors is not None else cpuinfo()
+    if workers < len(nodes):
+        # Merge nodes so every worker gets a whole number of them
+        merged: List[List[int]] = [[] for _ in range(workers)]
+        for i, node in enumerate(nodes):
+            merged[i % workers] += node
+        return [sorted(cpus) for cpus in merged]
+
+    sets = []
+    for i, node in enumerate(nodes):
+        cores = cores_of(node, processors)
+        count = workers // len(nodes) + (i < workers % len(nodes))
+        for j in range(count):
+            chunk = cores[j * len(cores) // count : (j + 1) * len(cores) // count]
+            chunk = chunk or [cores[j % len(cores)]]
+            sets.append(sorted(cpu for core in chunk for cpu in core))
+    return sets
+
+
+@contextmanager
+def pinned(cpus: Optional[Sequence[int]]):
+    """
+    Run the calling thread, and the threads it starts, on the given cpus.
+    Without cpus or where affinity is not supported, nothing changes.
+    """
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        yield
+        return
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cpus)
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, previous)
+
+
+def probe(cpus: Optional[List[int]] = None) -> Hardware:
+    """The hardware available to this process, or to the given cpus"""
+    processors = cpuinfo()
+    flags: FrozenSet[str] = frozenset()
+    if processors:
+        # "flags" on x86, "Features" on ARM
+        flags = frozenset(
+            (processors[0].get("flags") or processors[0].get("Features") or "").split()
+        )
+    return Hardware(
+        memory=available_memory(),
+        cores=physical_cores(processors, cpus or usable_cpus()),
+        flags=flags,
+        machine=platform.machine().lower(),
+    )
+
+
+def local_models(path=DEFAULT_MODEL_DIRECTORY) -> List[ModelFile]:
+    path = Path(path)
+    if not path.is_dir():
+        return []
+    return [
+        ModelFile(file.name, file.stat().st_size)
+        for file in sorted(path.iterdir())
+        if file.suffix == ".bin" and file.is_file()
+    ]
+
+
+def isa_warnings(hardware: Hardware) -> List[str]:
+    if not hardware.flags or hardware.machine not in ("x86_64", "amd64"):
+        return []
+    if "avx" not in hardware.flags:
+        return ["The CPU has no AVX, the gpt4all backend will likely fail to load"]
+    if "avx2" not in hardware.flags:
+        return ["The CPU has no AVX2, inference will be slow"]
+    return []
+
+
+def listed_size(model: str) -> Optional[int]:
+    """The download size of a model in the gpt4all model list, None if unknown"""
+    try:
+        listed = GPT4All.list_models()
+    except Exception as e:
+        logger.debug(f"Could not fetch the model list: {e}")
+        return None
+    for entry in listed:
+        if entry.get("filename") == model and entry.get("filesize"):
+            return int(entry["filesize"])
+    return None
+
+
+def select_model(
+    model: str, hardware: Hardware, model_dir=DEFAULT_MODEL_DIRECTORY
+) -> str:
+    """
+    The requested model if it fits in the available memory. Otherwise the
+    largest variant of it that fits, or the largest local model that fits.
+    """
+    for warning in isa_warnings(hardware):
+        logger.warning(warning)
+
+    models = local_models(model_dir)
+    requested = next((file for file in models if file.name == model), None)
+    downloaded = requested is not None
+    if requested is None:
+        size = listed_size(model)
+        if size is not None:
+            requested = ModelFile(model, size)
+
+    if requested is None or hardware.fits(requested):
+        # Only downloaded once it is known to fit, or when its size is unknown
+        if not downloaded:
+            try:
+                Path(model_dir).mkdir(parents=True, exist_ok=True)
+                path = Path(GPT4All.retrieve_model(model, model_path=str(model_dir)))
+                requested = ModelFile(model, path.stat().st_size)
+                downloaded = True
+            except Exception as e:
+                logger.warning(f"Model {model} is not available: {e}")
+
+    if requested is not None and not hardware.fits(requested):
+        logger.warning(
+            f"{model} needs about {requested.memory >> 20} MiB but only "
+            f"{(hardware.memory or 0) >> 20} MiB are available"
+        )
+    elif requested is not None and downloaded:
+        faster = sorted(
+            (
+                file
+                for file in models
+                if file.base == requested.base and file.speed_rank < requested.speed_rank
+            ),
+            key=lambda file: file.speed_rank,
+        )
+        if faster:
+            logger.info(f"{faster[0].name} is a faster quantization of {model}")
+        return model
+
+    fitting = sorted(
+        (file for file in models if hardware.fits(file)),
+        key=lambda file: (
+            requested is not None and file.base == requested.base,
+            file.size,
+        ),
+        reverse=True,
+    )
+    if fitting:
+        logger.warning(f"Using {fitting[0].name} instead of {model}")
+        return fitting[0].name
+    logger.warning(f"No local model fits, reverting to {FALLBACK_MODEL}")
+    return FALLBACK_MODEL
+
+
+def select_threads(hardware: Hardware) -> int:
+    return max(1, hardware.cores)
@@ -6,13 +6,18 @@ import tempfile
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import IO, TYPE_CHECKING, Iterable, Iterator, List, Optional
 
 from dataclasses_json import dataclass_json
 from termcolor import colored
 
+from gpt_engineer.answers import Answers, TerminalAnswers
+from gpt_engineer.chat_log import load_messages
 from gpt_engineer.db import DB, DBs
-from gpt_engineer.domain import Step
+
+if TYPE_CHECKING:
+    # The steps import this module for human_input
+    from gpt_engineer.fork.steps import Step
 
 
 @dataclass_json
@@ -42,6 +47,10 @@ class Learning:
     version: str = "0.3"
 
 
+# Cap on the prompt, logs, workspace and feedback fields of a sent learning
+MAX_FIELD_CHARS = 2**20
+TRUNCATION_MARKER = "\n[truncated]"
+
 TERM_CHOICES = (
     colored("y", "green")
     + "/"
@@ -50,42 +59,47 @@ TERM_CHOICES = (
     + colored("u", "yellow")
     + "(ncertain): "
 )
+CHOICES = ("y", "n", "u")
 
 
-def human_input() -> Review:
+def human_input(answers: Optional[Answers] = None) -> Review:
+    answers = answers or TerminalAnswers()
     print()
     print(
         colored("To help gpt-engineer learn, please answer 3 questions:", "light_green")
     )
     print()
 
-    ran = input("Did the generated code run at all? " + TERM_CHOICES)
-    while ran not in ("y", "n", "u"):
-        ran = input("Invalid input. Please enter y, n, or u: ")
+    ran = answers.ask(
+        "review_ran", "Did the generated code run at all? " + TERM_CHOICES, CHOICES
+    )
 
     perfect = ""
     useful = ""
 
     if ran == "y":
-        perfect = input(
-            "Did the generated code do everything you wanted? " + TERM_CHOICES
+        perfect = answers.ask(
+            "review_perfect",
+            "Did the generated code do everything you wanted? " + TERM_CHOICES,
+            CHOICES,
         )
-        while perfect not in ("y", "n", "u"):
-            perfect = input("Invalid input. Please enter y, n, or u: ")
 
         if perfect != "y":
-            useful = input("Did the generated code do anything useful? " + TERM_CHOICES)
-            while useful not in ("y", "n", "u"):
-                useful = input("Invalid input. Please enter y, n, or u: ")
+            useful = answers.ask(
+                "review_useful",
+                "Did the generated code do anything useful? " + TERM_CHOICES,
+                CHOICES,
+            )
 
     comments = ""
     if perfect != "y":
-        comments = input(
+        comments = answers.ask(
+            "review_comments",
             "If you have time, please explain what was not working "
-            + colored("(ok to leave blank)\n", "light_green")
+            + colored("(ok to leave blank)\n", "light_green"),
         )
 
-    check_consent()
+    check_consent(answers)
 
     return Review(
         raw=", ".join([ran, perfect, useful]),
@@ -96,15 +110,16 @@ def human_input() -> Review:
     )
 
 
-def check_consent():
+def check_consent(answers: Optional[Answers] = None):
+    answers = answers or TerminalAnswers()
     path = Path(".gpte_consent")
     if path.exists() and path.read_text() == "true":
         return
-    ans = input("Is it ok if we store your prompts to learn? (y/n)")
-    while ans.lower() not in ("y", "n"):
-        ans = input("Invalid input. Please enter y or n: ")
+    ans = answers.ask(
+        "consent", "Is it ok if we store your prompts to learn? (y/n)", ("y", "n")
+    )
 
-    if ans.lower() == "y":
+    if ans == "y":
         path.write_text("true")
         print(colored("Thank you️", "light_green"))
         print()
@@ -113,20 +128,20 @@ def check_consent():
         print(colored("We understand ❤️", "light_green"))
 
 
-def collect_consent() -> bool:
+def collect_consent(answers: Optional[Answers] = None) -> bool:
     opt_out = os.environ.get("COLLECT_LEARNINGS_OPT_OUT") == "true"
     consent_flag = Path(".gpte_consent")
     has_given_consent = consent_flag.exists() and consent_flag.read_text() == "true"
 
     if opt_out:
         if has_given_consent:
-            return ask_if_can_store()
+            return ask_if_can_store(answers)
         return False
 
     if has_given_consent:
         return True
 
-    if ask_if_can_store():
+    if ask_if_can_store(answers):
         consent_flag.write_text("true")
         print()
         print("(If you change your mind, delete the file .gpte_consent)")
@@ -134,18 +149,19 @@ def collect_consent() -> bool:
     return False
 
 
-def ask_if_can_store() -> bool:
+def ask_if_can_store(answers: Optional[Answers] = None) -> bool:
+    answers = answers or TerminalAnswers()
     print()
-    can_store = input(
+    can_store = answers.ask(
+        "consent",
         "Have you understood and agree to that "
         + colored("OpenAI ", "light_green")
         + "and "
         + colored("gpt-engineer ", "light_green")
         + "store anonymous learnings about how gpt-engineer is used "
-        + "(with the sole purpose of improving it)?\n(y/n)"
-    ).lower()
-    while can_store not in ("y", "n"):
-        can_store = input("Invalid input. Please enter y or n: ").lower()
+        + "(with the sole purpose of improving it)?\n(y/n)",
+        ("y", "n"),
+    )
 
     if can_store == "n":
         print(colored("Ok we understand", "light_green"))
@@ -153,11 +169,11 @@ def ask_if_can_store() -> bool:
     return can_store == "y"
 
 
-def logs_to_string(steps: List[Step], logs: DB):
+def logs_to_string(steps: List["Step"], logs: DB):
     chunks = []
     for step in steps:
-        chunks.append(f"--- {step.__name__} ---\n")
-        messages = json.loads(logs[step.__name__])
+        chunks.append(f"--- {step.step_id} ---\n")
+        messages = load_messages(logs, step.step_id)
         chunks.append(format_messages(messages))
     return "\n".join(chunks)
 
@@ -168,8 +184,98 @@ def format_messages(messages: List[dict]) -> str:
     )
 
 
+def log_chunks(steps: List["Step"], logs: DB) -> Iterator[str]:
+    """The text of logs_to_string, loading one step log at a time"""
+    for i, step in enumerate(steps):
+        if i:
+            yield "\n"
+        yield f"--- {step.step_id} ---\n"
+        yield "\n"
+        messages = load_messages(logs, step.step_id)
+        for j, message in enumerate(messages):
+            if j:
+                yield "\n"
+            yield f"{message['role']}:\n\n"
+            yield message["content"]
+
+
+def db_chunks(db, key, chunk_size=2**16) -> Iterator[str]:
+    if not isinstance(db, DB):
+        yield db[key]
+        return
+    with (db.path / key).open("r", encoding="utf-8") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def write_json_string(f: IO[str], chunks: Iterable[str], max_chars: int):
+    """
+    Write the chunks as one JSON string, cut at max_chars. Chunks after the
+    cut are never produced.
+    """
+    f.write('"')
+    written = 0
+    for chunk in chunks:
+        if written + len(chunk) > max_chars:
+            f.write(json.dumps(chunk[: max_chars - written])[1:-1])
+            f.write(json.dumps(TRUNCATION_MARKER)[1:-1])
+            break
+        f.write(json.dumps(chunk)[1:-1])
+        written += len(chunk)
+    f.write('"')
+
+
+def write_learning(
+    f: IO[str],
+    model: str,
+    temperature: float,
+    steps: List["Step"],
+    dbs: DBs,
+    steps_file_hash,
+    max_field_chars: int = MAX_FIELD_CHARS,
+):
+    """
+    Write the JSON of the Learning extract_learning would return, field by
+    field, without holding the logs or the workspace in memory.
+    """
+    review = None
+    if "review" in dbs.memory:
+        review = Review.from_json(dbs.memory["review"]).to_dict()  # type: ignore
+    small_fields = {
+        "model": model,
+        "temperature": temperature,
+        "steps": json.dumps([step.step_id for step in steps]),
+        "steps_file_hash": steps_file_hash,
+        "session": get_session(),
+        "review": review,
+        "timestamp": datetime.utcnow().isoformat(),
+        "version": Learning.version,
+    }
+    large_fields = {
+        "prompt": db_chunks(dbs.input, "prompt"),
+        "feedback": db_chunks(dbs.input, "feedback") if "feedback" in dbs.input else None,
+        "logs": log_chunks(steps, dbs.logs),
+        "workspace": db_chunks(dbs.workspace, "all_output.txt"),
+    }
+
+    f.write("{")
+    for name, value in small_fields.items():
+        f.write(f"{json.dumps(name)}: {json.dumps(value)}, ")
+    for i, (name, chunks) in enumerate(large_fields.items()):
+        f.write(", " if i else "")
+        f.write(f"{json.dumps(name)}: ")
+        if chunks is None:
+            f.write("null")
+        else:
+            write_json_string(f, chunks, max_field_chars)
+    f.write("}")
+
+
 def extract_learning(
-    model: str, temperature: float, steps: List[Step], dbs: DBs, steps_file_hash
+    model: str, temperature: float, steps: List["Step"], dbs: DBs, steps_file_hash
 ) -> Learning:
     review = None
     if "review" in dbs.memory:
@@ -178,7 +284,7 @@ def extract_learning(
         prompt=dbs.input["prompt"],
         model=model,
         temperature=temperature,
-        steps=json.dumps([step.__name__ for step in steps]),
+        steps=json.dumps([step.step_id for step in steps]),
         steps_file_hash=steps_file_hash,
         feedback=dbs.input.get("feedback"),
         session=get_session(),
@@ -1,14 +1,29 @@
+import json
 import logging
 
+from contextlib import ExitStack
 from pathlib import Path
 
 import typer
 
-from gpt_engineer.ai import AI, fallback_model
+from gpt_engineer.ai import AI, ModelLoadError
+from gpt_engineer.answers import answer_provider
+from gpt_engineer.archive_index import ArchiveIndex
 from gpt_engineer.collect import collect_learnings
-from gpt_engineer.db import DB, DBs, archive
+from gpt_engineer.db import DB, DBs, archive, lock_dir
+from gpt_engineer.dep_cache import DepCache
+from gpt_engineer.file_lock import DBLockedError, FileLock
+from gpt_engineer.hardware import (
+    FALLBACK_MODEL,
+    parse_cpus,
+    probe,
+    select_model,
+    select_threads,
+)
 from gpt_engineer.learning import collect_consent
+from gpt_engineer.prompt_registry import PromptRegistry
 from gpt_engineer.steps import STEPS, Config as StepsConfig
+from gpt_engineer.thread_tuning import cached_threads, tune
 
 app = typer.Typer()
 
@@ -23,51 +38,163 @@ def main(
         StepsConfig.DEFAULT, "--steps", "-s", help="decide which steps to run"
     ),
     verbose: bool = typer.Option(False, "--verbose", "-v"),
+    dep_cache: bool = typer.Option(
+        False, "--dep-cache", help="reuse cached dependency installs for run.sh"
+    ),
+    package_mirror: str = typer.Option(
+        None, "--package-mirror", help="package index url or local package directory"
+    ),
+    offline: bool = typer.Option(False, "--offline", help="never reach package indexes"),
+    context_tokens: int = typer.Option(
+        None,
+        "--context-tokens",
+        help="only send the most relevant files when the codebase is larger than this",
+    ),
+    resume: bool = typer.Option(
+        False, "--resume", help="skip steps that already ran with the same inputs"
+    ),
+    keep_archives: int = typer.Option(
+        None, "--keep-archives", help="only keep this many archived runs and the best one"
+    ),
+    lock_timeout: float = typer.Option(
+        0, "--lock-timeout", help="seconds to wait for another run on the project"
+    ),
+    plan: bool = typer.Option(
+        False, "--plan", help="show which steps --resume would run, then exit"
+    ),
+    threads: int = typer.Option(
+        None, "--threads", help="inference threads, by default tuned or physical cores"
+    ),
+    cpus: str = typer.Option(
+        None, "--cpus", help='pin inference to these cpus, e.g. "0-15,32-47"'
+    ),
+    tune_threads: bool = typer.Option(
+        False, "--tune-threads", help="measure the fastest thread count and store it"
+    ),
+    answers: str = typer.Option(
+        "tty",
+        "--answers",
+        help='answer questions on the terminal ("tty"), with defaults ("auto"), '
+        'by the model ("model") or from a JSON or YAML answer file',
+    ),
 ):
     logging.basicConfig(level=logging.DEBUG if verbose else logging.INFO)
 
-    model = fallback_model(model)
-    ai = AI(
-        model=model,
-        temperature=temperature,
-    )
+    deps = None
+    if dep_cache:
+        try:
+            deps = DepCache(mirror=package_mirror, offline=offline)
+        except ValueError as e:
+            raise typer.BadParameter(str(e))
 
     input_path = Path(project_path).absolute()
-    memory_path = input_path / "memory"
-    workspace_path = input_path / "workspace"
-    archive_path = input_path / "archive"
-
-    dbs = DBs(
-        memory=DB(memory_path),
-        logs=DB(memory_path / "logs"),
-        input=DB(input_path),
-        workspace=DB(workspace_path),
-        preprompts=DB(Path(__file__).parent / "preprompts"),
-        archive=DB(archive_path),
-    )
-
-    if steps_config not in [
-        StepsConfig.EXECUTE_ONLY,
-        StepsConfig.USE_FEEDBACK,
-        StepsConfig.EVALUATE,
-    ]:
-        archive(dbs)
-
-    steps = STEPS[steps_config]
-    STEPS[steps_config](ai, dbs).run()
-    # for step in steps:
-    #    messages = step(ai, dbs)
-    #    dbs.logs[step.__name__] = json.dumps(messages)
-
-    if collect_consent():
-        collect_learnings(model, temperature, steps, dbs)
-
-    dbs.logs["token_usage"] = ai.format_token_usage_log()
-
-    if collect_consent():
-        collect_learnings(model, temperature, steps, dbs)
-
-    dbs.logs["token_usage"] = ai.format_token_usage_log()
+    # Held for the whole run, before the model is loaded, so a second run on the
+    # project fails fast instead of after loading a model of its own
+    with ExitStack() as stack:
+        try:
+            stack.enter_context(
+                FileLock(lock_dir(input_path) / "project.lock", timeout=lock_timeout)
+            )
+        except DBLockedError:
+            print(
+                f"Another run is using {input_path}. Use --lock-timeout to wait for it."
+            )
+            raise typer.Exit(1)
+
+        steps = STEPS[steps_config].steps
+        # Executing or reviewing the code alone does not need the model
+        needs_model = not plan and any(step.requires_model for step in steps)
+        pinned_cpus = parse_cpus(cpus) if cpus else None
+        if needs_model:
+            hardware = probe(pinned_cpus)
+            model = select_model(model, hardware)
+            threads = (
+                threads
+                or cached_threads(model, hardware.cores)
+                or select_threads(hardware)
+            )
+            logging.info(
+                f"Using {model} with {threads} threads, {hardware.cores} cores and "
+                + (
+                    f"{hardware.memory >> 20} MiB of memory available"
+                    if hardware.memory is not None
+                    else "unknown memory available"
+                )
+            )
+        ai = AI(
+            model=model,
+            temperature=temperature,
+            threads=threads,
+            cpus=pinned_cpus,
+            fallback=FALLBACK_MODEL,
+        )
+        if needs_model and tune_threads:
+            try:
+                ai.threads = tune(ai, hardware.cores)
+            except ModelLoadError as e:
+                print(e)
+                raise typer.Exit(1)
+            logging.info(f"Using {ai.threads} threads from now on for {ai.model}")
+        elif needs_model:
+            ai.warmup()
+
+        memory_path = input_path / "memory"
+        workspace_path = input_path / "workspace"
+        archive_path = input_path / "archive"
+
+        dbs = DBs(
+            memory=DB(memory_path),
+            logs=DB(memory_path / "logs"),
+            input=DB(input_path),
+            workspace=DB(workspace_path),
+            preprompts=PromptRegistry(
+                Path(__file__).parent / "preprompts", ai.num_tokens
+            ),
+            archive=DB(archive_path),
+        )
+
+        if plan:
+            for step, runs, reason in STEPS[steps_config](ai, dbs, resume=True).plan():
+                print(f"{'run ' if runs else 'skip'}  {step.name}: {reason}")
+            return
+
+        if not resume and steps_config not in [
+            StepsConfig.EXECUTE_ONLY,
+            StepsConfig.EXECUTE_AND_FIX,
+            StepsConfig.USE_FEEDBACK,
+            StepsConfig.EVALUATE,
+        ]:
+            archive(dbs)
+            if keep_archives is not None:
+                ArchiveIndex(archive_path).gc(keep_last=keep_archives, keep_best=1)
+
+        provider = answer_provider(answers, ai)
+        runner = STEPS[steps_config](
+            ai,
+            dbs,
+            dep_cache=deps,
+            context_budget=context_tokens,
+            resume=resume,
+            answers=provider,
+        )
+        try:
+            runner.run()
+        except ModelLoadError as e:
+            print(e)
+            raise typer.Exit(1)
+        # The fallback replaces a model that failed to load
+        model = ai.model
+
+        # Recorded in the archive index when the run is archived
+        run_info = json.loads(dbs.memory.get("run_info", "{}"))
+        run_info["model"] = model
+        run_info["steps"] = run_info.get("steps", []) + [steps_config.value]
+        dbs.memory["run_info"] = json.dumps(run_info)
+
+        if collect_consent(provider):
+            collect_learnings(model, temperature, runner.steps, dbs)
+
+        dbs.logs["token_usage"] = ai.format_token_usage_log()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,115 @@
+import string
+
+from pathlib import Path
+from types import MappingProxyType
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+# Placeholders filled when a template is rendered, all others name preprompts
+RUNTIME_FIELDS = {"main_prompt", "specification", "unit_tests"}
+
+TEMPLATES = {
+    "system": "{generate}\nUseful to know:\n{philosophy}",
+    "instructions": "Instructions: {main_prompt}",
+    "specification": "Specification:\n\n{specification}",
+    "given_unit_tests": "Unit tests:\n\n{unit_tests}",
+    "edit_fix_code": "{fix_code}\n{diff_format}",
+    "edit_fix_runtime_error": "{fix_runtime_error}\n{diff_format}",
+    "edit_use_feedback": "{use_feedback}\n{diff_format}",
+    "edit_incremental": "{incremental}\n{diff_format}",
+}
+
+
+class PromptTemplate:
+    """
+    A template with the preprompts it refers to already filled in, split
+    into literal text and the runtime fields between them.
+    """
+
+    def __init__(self, text: str, preprompts):
+        self.parts: List[Tuple[str, Optional[str]]] = []
+        literal = ""
+        for prefix, field, _, _ in string.Formatter().parse(text):
+            literal += prefix
+            if field is None:
+                continue
+            if field in RUNTIME_FIELDS:
+                self.parts.append((literal, field))
+                literal = ""
+            else:
+                literal += preprompts[field]
+        self.parts.append((literal, None))
+        self.fields = tuple(field for _, field in self.parts if field)
+        self.tokens = 0
+
+    @property
+    def literal(self) -> str:
+        """The template without its runtime fields"""
+        return "".join(literal for literal, _ in self.parts)
+
+    def render(self, **values: str) -> str:
+        return "".join(
+            literal + (values[field] if field else "") for literal, field in self.parts
+        )
+
+
+class PromptRegistry(Mapping):
+    """
+    The preprompts of a folder, read once and kept in memory, and the
+    TEMPLATES compiled from them. When num_tokens is given, the token count
+    of every preprompt and template is computed up front.
+    """
+
+    def __init__(self, path, num_tokens: Optional[Callable[[str], int]] = None):
+        self.path = Path(path).absolute()
+        self._preprompts = MappingProxyType(
+            {
+                file.name: file.read_text(encoding="utf-8")
+                for file in sorted(self.path.iterdir())
+                if file.is_file()
+            }
+        )
+        templates = {}
+        for name, text in TEMPLATES.items():
+            try:
+                templates[name] = PromptTemplate(text, self._preprompts)
+            except KeyError:
+                continue
+        self._templates = MappingProxyType(templates)
+
+        self._tokens: Dict[str, int] = {}
+        if num_tokens is not None:
+            for name, text in self._preprompts.items():
+                self._tokens[name] = num_tokens(text)
+            for name, template in self._templates.items():
+                template.tokens = num_tokens(template.literal)
+
+    def __getitem__(self, key: str) -> str:
+        try:
+            return self._preprompts[key]
+        except KeyError:
+            raise KeyError(f"File '{key}' could not be found in '{self.path}'")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._preprompts)
+
+    def __len__(self) -> int:
+        return len(self._preprompts)
+
+    def template(self, name: str) -> PromptTemplate:
+        return self._templates[name]
+
+    def render(self, name: str, **values: str) -> str:
+        return self._templates[name].render(**values)
+
+    def tokens(self, name: str) -> int:
+        """The token count of a preprompt or of the literal text of a template"""
+        if name in self._templates:
+            return self._templates[name].tokens
+        return self._tokens[name]
+
+
+def render(preprompts, name: str, **values: str) -> str:
+    """Render a template with a registry, or with preprompts stored in a DB"""
+    if isinstance(preprompts, PromptRegistry):
+        return preprompts.render(name, **values)
+    return PromptTemplate(TEMPLATES[name], preprompts).render(**values)
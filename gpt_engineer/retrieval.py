@@ -0,0 +1,109 @@
+import math
+import re
+
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+
+from gpt_engineer.db import DB
+
+# Directories that hold installed dependencies or tool state, not code
+EXCLUDED_DIRS = {".git", "__pycache__", "node_modules", "venv", ".venv"}
+EXCLUDED_FILES = {"all_output.txt"}
+MAX_FILE_SIZE = 1_000_000
+
+K1 = 1.5
+B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lower case words, breaking up snake_case and camelCase"""
+    words = re.findall(r"[A-Za-z0-9]+", text)
+    tokens = []
+    for word in words:
+        tokens += re.findall(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+", word)
+    return [token.lower() for token in tokens]
+
+
+class FileIndex:
+    """
+    A BM25 index over the files of a DB.
+
+    Files are only re-read when their size or modification time changed since
+    the last refresh, so keeping the index up to date after a step wrote a
+    few files is cheap.
+    """
+
+    def __init__(self, db: DB):
+        self.db = db
+        # path -> ((mtime_ns, size), term counts, number of terms)
+        self.docs: Dict[str, Tuple[Tuple[int, int], Counter, int]] = {}
+
+    def refresh(self):
+        seen = set()
+        for key, stamp in self.db.stamps(exclude=EXCLUDED_DIRS).items():
+            if key.split("/")[-1] in EXCLUDED_FILES:
+                continue
+
+            seen.add(key)
+            if key in self.docs and self.docs[key][0] == stamp:
+                continue
+            if stamp[1] > MAX_FILE_SIZE:
+                self.docs.pop(key, None)
+                continue
+
+            try:
+                content = self.db[key]
+            except UnicodeDecodeError:
+                continue
+            self.update(key, content, stamp)
+
+        for key in set(self.docs) - seen:
+            del self.docs[key]
+
+    def update(self, key: str, content: str, stamp=(0, 0)):
+        terms = Counter(tokenize(key) + tokenize(content))
+        self.docs[key] = (stamp, terms, sum(terms.values()))
+
+    def search(self, query: str) -> List[Tuple[str, float]]:
+        """Return (path, score) pairs of the files matching query, best first"""
+        if not self.docs:
+            return []
+
+        n_docs = len(self.docs)
+        avg_length = sum(length for _, _, length in self.docs.values()) / n_docs
+        query_terms = set(tokenize(query))
+        doc_freq = {
+            term: sum(1 for _, terms, _ in self.docs.values() if term in terms)
+            for term in query_terms
+        }
+
+        scores = []
+        for key, (_, terms, length) in self.docs.items():
+            score = 0.0
+            for term in query_terms:
+                freq = terms.get(term, 0)
+                if not freq:
+                    continue
+                idf = math.log(
+                    1 + (n_docs - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5)
+                )
+                norm = K1 * (1 - B + B * length / max(avg_length, 1))
+                score += idf * freq * (K1 + 1) / (freq + norm)
+            if score > 0:
+                scores.append((key, score))
+        return sorted(scores, key=lambda item: item[1], reverse=True)
+
+    def select(
+        self, query: str, budget: int, num_tokens: Callable[[str], int]
+    ) -> List[Tuple[str, str]]:
+        """Return the most relevant (path, content) pairs that fit in budget tokens"""
+        self.refresh()
+        files = []
+        for key, _ in self.search(query):
+            content = self.db[key]
+            tokens = num_tokens(content)
+            if tokens > budget:
+                continue
+            files.append((key, content))
+            budget -= tokens
+        return files
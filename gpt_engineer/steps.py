@@ -6,6 +6,7 @@ from gpt_engineer.db import DBs
 from gpt_engineer.fork.steps import (
     ClarificationStep,
     ExecuteEntrypoint,
+    ExecuteEntrypointAndFix,
     FixCode,
     GenClarifiedCode,
     GenerateCode,
@@ -13,6 +14,7 @@ from gpt_engineer.fork.steps import (
     GenerateSpec,
     GenerateUnitTests,
     HumanReview,
+    IncrementalGen,
     ReSpec,
     SimpleGen,
     Step,
@@ -22,15 +24,14 @@ from gpt_engineer.fork.steps import (
 from gpt_engineer.learning import human_input
 
 
-def setup_sys_prompt(dbs):
-    return dbs.identity["generate"] + "\nUseful to know:\n" + dbs.identity["philosophy"]
+class Runner:
+    """Creates a StepRunner for the steps of a config"""
 
+    def __init__(self, steps: List[Step]):
+        self.steps = steps
 
-def runner(steps: List[Step]):
-    def construct(ai: AI, dbs: DBs):
-        return StepRunner(ai, dbs, steps)
-
-    return construct
+    def __call__(self, ai: AI, dbs: DBs, **options) -> StepRunner:
+        return StepRunner(ai, dbs, self.steps, **options)
 
 
 def human_review(ai: AI, dbs: DBs):
@@ -48,13 +49,15 @@ class Config(str, Enum):
     CLARIFY = "clarify"
     RESPEC = "respec"
     EXECUTE_ONLY = "execute_only"
+    EXECUTE_AND_FIX = "execute_and_fix"
     EVALUATE = "evaluate"
     USE_FEEDBACK = "use_feedback"
+    INCREMENTAL = "incremental"
 
 
 # Different configs of what steps to run
 STEPS = {
-    Config.DEFAULT: runner(
+    Config.DEFAULT: Runner(
         [
             ClarificationStep(),
             GenClarifiedCode(),
@@ -62,9 +65,9 @@ STEPS = {
             ExecuteEntrypoint(),
         ]
     ),
-    Config.BENCHMARK: runner([SimpleGen(), GenerateEntrypoint()]),
-    Config.SIMPLE: runner([SimpleGen(), GenerateEntrypoint(), ExecuteEntrypoint()]),
-    Config.TDD: runner(
+    Config.BENCHMARK: Runner([SimpleGen(), GenerateEntrypoint()]),
+    Config.SIMPLE: Runner([SimpleGen(), GenerateEntrypoint(), ExecuteEntrypoint()]),
+    Config.TDD: Runner(
         [
             GenerateSpec(),
             GenerateUnitTests(),
@@ -73,7 +76,7 @@ STEPS = {
             ExecuteEntrypoint(),
         ]
     ),
-    Config.TDD_PLUS: runner(
+    Config.TDD_PLUS: Runner(
         [
             GenerateSpec(),
             GenerateUnitTests(),
@@ -83,7 +86,7 @@ STEPS = {
             ExecuteEntrypoint(),
         ]
     ),
-    Config.CLARIFY: runner(
+    Config.CLARIFY: Runner(
         [
             ClarificationStep(),
             GenClarifiedCode(),
@@ -91,7 +94,7 @@ STEPS = {
             ExecuteEntrypoint(),
         ]
     ),
-    Config.RESPEC: runner(
+    Config.RESPEC: Runner(
         [
             GenerateSpec(),
             ReSpec(),
@@ -102,14 +105,17 @@ STEPS = {
             ExecuteEntrypoint(),
         ]
     ),
-    Config.USE_FEEDBACK: runner(
+    Config.USE_FEEDBACK: Runner(
         [UseFeedback(), GenerateEntrypoint(), ExecuteEntrypoint()]
     ),
-    Config.EXECUTE_ONLY: runner([GenerateEntrypoint(), ExecuteEntrypoint()]),
-    Config.EVALUATE: runner([ExecuteEntrypoint(), HumanReview()]),
+    Config.INCREMENTAL: Runner(
+        [IncrementalGen(), GenerateEntrypoint(), ExecuteEntrypoint()]
+    ),
+    Config.EXECUTE_ONLY: Runner([GenerateEntrypoint(), ExecuteEntrypoint()]),
+    Config.EXECUTE_AND_FIX: Runner([GenerateEntrypoint(), ExecuteEntrypointAndFix()]),
+    Config.EVALUATE: Runner([ExecuteEntrypoint(), HumanReview()]),
 }
 
 
 # Future steps that can be added:
 # run_tests_and_fix_files
-# execute_entrypoint_and_fix_files_if_it_results_in_error
@@ -0,0 +1,166 @@
+import itertools
+import shutil
+import time
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from gpt_engineer.ai import AI
+from gpt_engineer.answers import answer_provider
+from gpt_engineer.db import DB, DBs
+from gpt_engineer.fork.steps import (
+    ClarificationStep,
+    ExecuteEntrypointAndFix,
+    Step,
+    StepRunner,
+)
+from gpt_engineer.prompt_registry import PromptRegistry
+from gpt_engineer.steps import STEPS, Config
+
+PREPROMPTS_PATH = Path(__file__).parent / "preprompts"
+
+_registries: Dict[str, PromptRegistry] = {}
+
+MATRIX_HEADERS = ["Model", "Temperature", "Steps", "Passed", "Tokens", "Seconds"]
+
+
+@dataclass
+class Job:
+    model: str
+    temperature: float
+    config: Config
+    benchmark: Path
+
+    def path(self, out_path: Path) -> Path:
+        return (
+            out_path
+            / self.model
+            / f"t{self.temperature}"
+            / self.config.value
+            / self.benchmark.name
+        )
+
+
+def sweep_steps(config: Config) -> List[Step]:
+    """
+    The steps of a config without executing and reviewing the code, clarifying
+    questions are answered by the answer provider of the job
+    """
+    steps = STEPS[config].steps
+    return [
+        step
+        for step in steps
+        if not step.interactive or isinstance(step, ClarificationStep)
+    ]
+
+
+def sweep_jobs(
+    models: List[str],
+    temperatures: List[float],
+    configs: List[Config],
+    benchmarks: List[Path],
+) -> List[Job]:
+    """
+    All combinations, grouped by model so every model is only loaded once
+    """
+    return [
+        Job(model, temperature, config, benchmark)
+        for model, config, temperature, benchmark in itertools.product(
+            models, configs, temperatures, benchmarks
+        )
+    ]
+
+
+def preprompts(ai: AI) -> PromptRegistry:
+    """The preprompts with token counts for the model, read once per sweep"""
+    if ai.model not in _registries:
+        _registries[ai.model] = PromptRegistry(PREPROMPTS_PATH, ai.num_tokens)
+    return _registries[ai.model]
+
+
+def job_dbs(job: Job, out_path: Path, preprompts: PromptRegistry) -> DBs:
+    path = job.path(out_path)
+    if path.exists():
+        shutil.rmtree(path)
+    path.mkdir(parents=True)
+    for file in job.benchmark.iterdir():
+        if file.is_file():
+            shutil.copy(file, path / file.name)
+
+    return DBs(
+        memory=DB(path / "memory"),
+        logs=DB(path / "memory" / "logs"),
+        input=DB(path),
+        workspace=DB(path / "workspace"),
+        preprompts=preprompts,
+        archive=DB(path / "archive"),
+    )
+
+
+def run_job(
+    job: Job,
+    out_path: Path,
+    execute: bool = False,
+    timeout: int = 60,
+    answers: str = "auto",
+) -> dict:
+    """
+    Run the steps of a job on a copy of its benchmark. It passes if all steps
+    ran and produced run.sh and, with execute, if run.sh exits with 0.
+    """
+    # Reuses AI.model while the model stays the same, but not the prompt context
+    # of the previous job, which would keep its temperature and n_past
+    ai = AI(model=job.model, temperature=job.temperature)
+    AI.reset_context()
+    dbs = job_dbs(job, out_path, preprompts(ai))
+
+    error: Optional[str] = None
+    start = time.time()
+    try:
+        StepRunner(
+            ai, dbs, sweep_steps(job.config), answers=answer_provider(answers, ai)
+        ).run()
+    except Exception as e:
+        error = repr(e)
+    seconds = time.time() - start
+
+    passed = error is None and "run.sh" in dbs.workspace
+    if passed and execute:
+        returncode, _ = ExecuteEntrypointAndFix(timeout=timeout).execute(dbs, None)
+        passed = returncode == 0
+    dbs.logs["token_usage"] = ai.format_token_usage_log()
+
+    return {
+        "model": job.model,
+        "temperature": job.temperature,
+        "config": job.config.value,
+        "benchmark": job.benchmark.name,
+        "passed": passed,
+        "error": error,
+        "tokens": ai.cumulative_total_tokens,
+        "seconds": seconds,
+    }
+
+
+def comparison_matrix(results: List[dict]) -> List[list]:
+    """Pass rate, mean tokens and mean seconds per model, temperature and config"""
+    groups: Dict[Tuple[str, float, str], List[dict]] = {}
+    for result in results:
+        key = (result["model"], result["temperature"], result["config"])
+        groups.setdefault(key, []).append(result)
+
+    rows = []
+    for (model, temperature, config), group in groups.items():
+        passed = sum(result["passed"] for result in group)
+        rows.append(
+            [
+                model,
+                temperature,
+                config,
+                f"{passed}/{len(group)}",
+                round(sum(result["tokens"] for result in group) / len(group)),
+                round(sum(result["seconds"] for result in group) / len(group), 1),
+            ]
+        )
+    return rows
@@ -0,0 +1,82 @@
+import json
+import logging
+import time
+
+from typing import Dict, List, Optional
+
+from gpt_engineer.ai import AI
+from gpt_engineer.db import cache_path
+from gpt_engineer.hardware import pinned
+
+logger = logging.getLogger(__name__)
+
+TUNE_PROMPT = (
+    "### Instruction:\nWrite a Python function that checks if a string is a "
+    "palindrome.\n### Response:\n"
+)
+
+
+def cache_file():
+    return cache_path("threads.json")
+
+
+def cache_key(model: str, cores: int) -> str:
+    # The best thread count depends on how many cores the run may use
+    return f"{model}@{cores}"
+
+
+def cached_threads(model: str, cores: int) -> Optional[int]:
+    try:
+        cached = json.loads(cache_file().read_text())
+        return cached[cache_key(model, cores)]["threads"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def thread_counts(cores: int) -> List[int]:
+    """Powers of two up to the number of cores, and the number of cores"""
+    counts = []
+    count = 1
+    while count < cores:
+        counts.append(count)
+        count *= 2
+    return counts + [cores]
+
+
+def tokens_per_second(ai: AI, threads: int, n_predict: int = 32) -> float:
+    ai.ensure_loaded()
+    AI.model.model.set_thread_count(threads)
+    tokens = 0
+    start = time.perf_counter()
+    try:
+        with pinned(ai.cpus):
+            for _ in AI.model.generator(TUNE_PROMPT, n_predict=n_predict, temp=0.1):
+                tokens += 1
+    finally:
+        # The completions of the run must not keep the short n_predict of tuning
+        AI.reset_context()
+    return tokens / (time.perf_counter() - start)
+
+
+def tune(ai: AI, cores: int, n_predict: int = 32) -> int:
+    """
+    Measure the tokens per second of the model with each thread count and
+    store the fastest in the user cache dir
+    """
+    speeds: Dict[int, float] = {}
+    for threads in thread_counts(cores):
+        speeds[threads] = tokens_per_second(ai, threads, n_predict)
+        logger.info(f"{threads} threads: {speeds[threads]:.2f} tokens/s")
+    best = max(speeds, key=lambda threads: speeds[threads])
+
+    try:
+        cached = json.loads(cache_file().read_text())
+    except (OSError, ValueError):
+        cached = {}
+    cached[cache_key(ai.model, cores)] = {
+        "threads": best,
+        "tokens_per_second": speeds[best],
+    }
+    cache_file().parent.mkdir(parents=True, exist_ok=True)
+    cache_file().write_text(json.dumps(cached, indent=2))
+    return best
@@ -1,7 +1,6 @@
 # list all folders in benchmark folder
 # for each folder, run the benchmark
 import contextlib
-import json
 import os
 import subprocess
 
@@ -10,46 +9,89 @@ from itertools import islice
 from pathlib import Path
 from typing import Iterable, Union
 
+import typer
+
 from tabulate import tabulate
 from typer import run
 
+from gpt_engineer.answers import Answers, answer_provider
+from gpt_engineer.benchmark_results import (
+    HEADERS,
+    benchmark_result,
+    insert_markdown_section,
+    report_rows,
+    shard_folders,
+    write_bundle,
+)
+from gpt_engineer.hardware import core_sets, format_cpus
+
 
 def main(
     n_benchmarks: Union[int, None] = None,
+    shard: Union[str, None] = typer.Option(
+        None, help="only run the benchmarks of shard i/N, e.g. 2/4"
+    ),
+    bundle: Union[str, None] = typer.Option(
+        None, help="write the results to this file, to merge with merge_benchmarks.py"
+    ),
+    answers: str = typer.Option(
+        "tty", help='"tty", "auto" or a JSON or YAML answer file for all questions'
+    ),
+    pin: bool = typer.Option(
+        True, help="run each benchmark on its own cpus, split by NUMA node"
+    ),
 ):
     path = Path("benchmark")
 
-    folders: Iterable[Path] = path.iterdir()
+    # Dot folders like the trash of clean_benchmarks.py are not benchmarks
+    folders: Iterable[Path] = sorted(
+        folder for folder in path.iterdir() if not folder.name.startswith(".")
+    )
+
+    if shard:
+        try:
+            folders = shard_folders(folders, shard)
+        except ValueError as e:
+            raise typer.BadParameter(str(e))
+        if not bundle:
+            bundle = str(path / f"results_{shard.replace('/', '_of_')}.json")
 
     if n_benchmarks:
         folders = islice(folders, n_benchmarks)
 
-    benchmarks = []
-    for bench_folder in folders:
-        if os.path.isdir(bench_folder):
-            print(f"Running benchmark for {bench_folder}")
+    folders = [folder for folder in folders if os.path.isdir(folder)]
+    # The benchmarks run concurrently, so they should not compete for cores
+    cpu_sets = core_sets(len(folders)) if pin and folders else []
 
-            log_path = bench_folder / "log.txt"
-            log_file = open(log_path, "w")
-            process = subprocess.Popen(
-                [
-                    "python",
-                    "-u",  # Unbuffered output
-                    "-m",
-                    "gpt_engineer.main",
-                    bench_folder,
-                    "--steps",
-                    "benchmark",
-                ],
-                stdout=log_file,
-                stderr=log_file,
-                bufsize=0,
-            )
-            benchmarks.append((bench_folder, process, log_file))
+    benchmarks = []
+    for i, bench_folder in enumerate(folders):
+        print(f"Running benchmark for {bench_folder}")
+        pin_args = ["--cpus", format_cpus(cpu_sets[i])] if cpu_sets else []
+
+        log_path = bench_folder / "log.txt"
+        log_file = open(log_path, "w")
+        process = subprocess.Popen(
+            [
+                "python",
+                "-u",  # Unbuffered output
+                "-m",
+                "gpt_engineer.main",
+                str(bench_folder),
+                "--steps",
+                "benchmark",
+                "--answers",
+                answers,
+            ]
+            + pin_args,
+            stdout=log_file,
+            stderr=log_file,
+            bufsize=0,
+        )
+        benchmarks.append((bench_folder, process, log_file))
 
-            print("You can stream the log file by running:")
-            print(f"tail -f {log_path}")
-            print()
+        print("You can stream the log file by running:")
+        print(f"tail -f {log_path}")
+        print()
 
     for bench_folder, process, file in benchmarks:
         process.wait()
@@ -71,81 +113,35 @@ def main(
                     bench_folder,
                     "--steps",
                     "evaluate",
+                    "--answers",
+                    answers,
                 ],
             )
 
-    generate_report(benchmarks, path)
+    if bundle:
+        write_bundle(Path(bundle), [folder for folder, _, _ in benchmarks], shard)
+        print(f"Results written to {bundle}")
+        return
 
+    generate_report(benchmarks, path, answer_provider(answers))
 
-def generate_report(benchmarks, benchmark_path):
-    headers = ["Benchmark", "Ran", "Works", "Perfect", "Notes"]
-    rows = []
-    for bench_folder, _, _ in benchmarks:
-        memory = bench_folder / "memory"
-        with open(memory / "review") as f:
-            review = json.loads(f.read())
-            rows.append(
-                [
-                    bench_folder.name,
-                    to_emoji(review.get("ran", None)),
-                    to_emoji(review.get("works", None)),
-                    to_emoji(review.get("perfect", None)),
-                    review.get("comments", None),
-                ]
-            )
-    table: str = tabulate(rows, headers, tablefmt="pipe")
+
+def generate_report(benchmarks, benchmark_path, answers: Answers):
+    rows = report_rows(
+        benchmark_result(bench_folder) for bench_folder, _, _ in benchmarks
+    )
+    table: str = tabulate(rows, HEADERS, tablefmt="pipe")
     print("\nBenchmark report:\n")
     print(table)
     print()
-    append_to_results = ask_yes_no("Append report to the results file?")
-    if append_to_results:
+    append_to_results = answers.ask(
+        "append_results", "Append report to the results file? (y/n): ", ("y", "n")
+    )
+    if append_to_results == "y":
         results_path = benchmark_path / "RESULTS.md"
         current_date = datetime.now().strftime("%Y-%m-%d")
         insert_markdown_section(results_path, current_date, table, 2)
 
 
-def to_emoji(value: bool) -> str:
-    return "\U00002705" if value else "\U0000274C"
-
-
-def insert_markdown_section(file_path, section_title, section_text, level):
-    with open(file_path, "r") as file:
-        lines = file.readlines()
-
-    header_prefix = "#" * level
-    new_section = f"{header_prefix} {section_title}\n\n{section_text}\n\n"
-
-    # Find the first section with the specified level
-    line_number = -1
-    for i, line in enumerate(lines):
-        if line.startswith(header_prefix):
-            line_number = i
-            break
-
-    if line_number != -1:
-        lines.insert(line_number, new_section)
-    else:
-        print(
-            f"Markdown file was of unexpected format. No section of level {level} found. "
-            "Did not write results."
-        )
-        return
-
-    # Write the file
-    with open(file_path, "w") as file:
-        file.writelines(lines)
-
-
-def ask_yes_no(question: str) -> bool:
-    while True:
-        response = input(question + " (y/n): ").lower().strip()
-        if response == "y":
-            return True
-        elif response == "n":
-            return False
-        else:
-            print("Please enter either 'y' or 'n'.")
-
-
 if __name__ == "__main__":
     run(main)
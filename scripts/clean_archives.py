@@ -0,0 +1,59 @@
+from pathlib import Path
+from typing import Union
+
+import typer
+
+from tabulate import tabulate
+
+from gpt_engineer.archive_index import ArchiveIndex
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    project_path: str = typer.Argument("example", help="path"),
+    keep_last: Union[int, None] = typer.Option(None, help="keep the newest N runs"),
+    keep_best: int = typer.Option(0, help="also keep the N best reviewed runs"),
+    max_size_mb: Union[float, None] = typer.Option(
+        None, help="remove the oldest runs until the archive is at most this size"
+    ),
+    dry_run: bool = typer.Option(False, help="only list what would be removed"),
+    sync: bool = typer.Option(False, help="index runs archived by older versions"),
+):
+    """
+    List the archived runs of a project, and remove old ones.
+    """
+    index = ArchiveIndex(Path(project_path) / "archive")
+    if sync:
+        index.sync()
+
+    removed = []
+    if keep_last is not None or max_size_mb is not None:
+        max_size = None if max_size_mb is None else int(max_size_mb * 2**20)
+        removed = index.gc(keep_last, keep_best, max_size, dry_run)
+
+    snapshots = sorted(
+        index.snapshots() + ([] if dry_run else removed),
+        key=lambda snapshot: snapshot.timestamp,
+        reverse=True,
+    )
+    rows = [
+        [
+            snapshot.timestamp,
+            snapshot.model,
+            snapshot.steps,
+            round(snapshot.size / 2**20, 2),
+            snapshot.ran,
+            snapshot.works,
+            snapshot.perfect,
+            "removed" if snapshot in removed else "",
+        ]
+        for snapshot in snapshots
+    ]
+    headers = ["Timestamp", "Model", "Steps", "MB", "Ran", "Works", "Perfect", ""]
+    print(tabulate(rows, headers, tablefmt="pipe"))
+
+
+if __name__ == "__main__":
+    app()
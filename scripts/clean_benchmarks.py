@@ -1,32 +1,171 @@
 # list all folders in benchmark folder
-# for each folder, run the benchmark
+# for each folder, remove everything the benchmark generated
 
+import contextlib
+import fnmatch
 import os
 import shutil
+import subprocess
+import sys
+import time
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterator, List, Union
 
-from typer import run
+import typer
 
+from tabulate import tabulate
 
-def main():
-    benchmarks = Path("benchmark")
+from gpt_engineer.archive_index import dir_size
 
-    for benchmark in benchmarks.iterdir():
-        if benchmark.is_dir():
-            print(f"Cleaning {benchmark}")
-            for path in benchmark.iterdir():
-                if path.name in ["prompt", "main_prompt"]:
-                    continue
+app = typer.Typer()
 
-                # Get filename of Path object
-                if path.is_dir():
-                    # delete the entire directory
-                    shutil.rmtree(path)
-                else:
-                    # delete the file
-                    os.remove(path)
+TRASH_NAME = ".trash"
+DEFAULT_PRESERVE = ["prompt", "main_prompt"]
+
+
+def preserved(relative: str, preserve: List[str]) -> bool:
+    return any(fnmatch.fnmatch(relative, pattern) for pattern in preserve)
+
+
+def contains_preserved(relative: str, preserve: List[str]) -> bool:
+    """Whether a glob may match something inside the directory"""
+    return any(
+        pattern.startswith(relative + "/") or pattern.startswith("*")
+        for pattern in preserve
+    )
+
+
+def newest_mtime(path: Path) -> float:
+    """The mtime of path, or of the most recently modified path inside it"""
+    newest = path.lstat().st_mtime
+    if path.is_dir() and not path.is_symlink():
+        for root, dirs, files in os.walk(path):
+            for name in dirs + files:
+                with contextlib.suppress(OSError):
+                    newest = max(newest, os.lstat(os.path.join(root, name)).st_mtime)
+    return newest
+
+
+def removable(
+    folder: Path, root: Path, preserve: List[str], cutoff: Union[float, None]
+) -> Iterator[Path]:
+    """The paths to remove in folder, without the preserved ones"""
+    for path in folder.iterdir():
+        relative = path.relative_to(root).as_posix()
+        if preserved(relative, preserve):
+            continue
+        if cutoff is not None and newest_mtime(path) > cutoff:
+            continue
+        if (
+            path.is_dir()
+            and not path.is_symlink()
+            and contains_preserved(relative, preserve)
+        ):
+            yield from removable(path, root, preserve, cutoff)
+        else:
+            yield path
+
+
+def size(path: Path) -> int:
+    if path.is_dir() and not path.is_symlink():
+        return dir_size(path)
+    return path.lstat().st_size
+
+
+def remove(path: Path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink()
+
+
+@app.command()
+def main(
+    path: str = typer.Argument("benchmark", help="folder with the benchmarks"),
+    preserve: List[str] = typer.Option(
+        [], help="glob of paths to keep, relative to a benchmark, e.g. memory/review"
+    ),
+    older_than_days: Union[float, None] = typer.Option(
+        None, help="only remove what was not modified for this many days"
+    ),
+    dry_run: bool = typer.Option(False, help="only report what would be removed"),
+    workers: int = typer.Option(8, help="threads removing files in parallel"),
+    background: bool = typer.Option(
+        False, help="move to a trash folder and delete it in a background process"
+    ),
+):
+    """
+    Remove the generated files of all benchmarks, keeping the prompts.
+    """
+    benchmarks = Path(path)
+    preserve = DEFAULT_PRESERVE + list(preserve)
+    cutoff = None
+    if older_than_days is not None:
+        cutoff = time.time() - older_than_days * 24 * 3600
+
+    folders = sorted(
+        folder
+        for folder in benchmarks.iterdir()
+        if folder.is_dir() and not folder.name.startswith(".")
+    )
+    paths = {
+        folder: list(removable(folder, folder, preserve, cutoff)) for folder in folders
+    }
+
+    if dry_run:
+        with ThreadPoolExecutor(workers) as executor:
+            sizes = {
+                folder: sum(executor.map(size, folder_paths))
+                for folder, folder_paths in paths.items()
+            }
+        rows = [
+            [folder.name, len(paths[folder]), round(sizes[folder] / 2**20, 2)]
+            for folder in folders
+        ]
+        rows.append(
+            [
+                "total",
+                sum(len(folder_paths) for folder_paths in paths.values()),
+                round(sum(sizes.values()) / 2**20, 2),
+            ]
+        )
+        print(tabulate(rows, ["Benchmark", "Paths", "MB"], tablefmt="pipe"))
+        return
+
+    # Renaming is instant, so the benchmarks are clean before the slow deletes
+    trash = benchmarks / TRASH_NAME / f"{int(time.time())}_{os.getpid()}"
+    trash.mkdir(parents=True)
+    moved = []
+    for folder in folders:
+        print(f"Cleaning {folder}")
+        for source in paths[folder]:
+            target = trash / source.relative_to(benchmarks).as_posix().replace("/", "__")
+            source.rename(target)
+            moved.append(target)
+
+    if background:
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "import shutil, sys; shutil.rmtree(sys.argv[1], ignore_errors=True)",
+                str(benchmarks / TRASH_NAME),
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        print(f"Deleting {len(moved)} paths in the background")
+        return
+
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(remove, moved))
+    shutil.rmtree(trash, ignore_errors=True)
+    with contextlib.suppress(OSError):
+        (benchmarks / TRASH_NAME).rmdir()
 
 
 if __name__ == "__main__":
-    run(main)
+    app()
@@ -0,0 +1,28 @@
+import pathlib
+
+from typing import Union
+
+import typer
+
+from gpt_engineer.chat_log import ChatLog
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    logs_path: str,
+    out_path: Union[str, None] = None,
+):
+    """Write every conversation of a chat log as a JSON step log"""
+    chat_log = ChatLog(logs_path)
+    out = pathlib.Path(out_path or logs_path)
+    out.mkdir(parents=True, exist_ok=True)
+
+    for step_id in chat_log.steps():
+        (out / step_id).write_text(chat_log.to_json(step_id), encoding="utf-8")
+        print(f"Wrote {out / step_id}")
+
+
+if __name__ == "__main__":
+    app()
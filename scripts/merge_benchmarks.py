@@ -0,0 +1,58 @@
+import glob
+import json
+
+from pathlib import Path
+from typing import List
+
+import typer
+
+from tabulate import tabulate
+
+from gpt_engineer.benchmark_results import (
+    HEADERS,
+    history_record,
+    insert_markdown_section,
+    merge_bundles,
+    report_rows,
+)
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    bundles: List[str] = typer.Argument(
+        ..., help="result bundles written by benchmark.py --shard, or globs of them"
+    ),
+    results_path: str = typer.Option("benchmark/RESULTS.md", help="results file"),
+    history_path: str = typer.Option(
+        "benchmark/history.jsonl", help="append a record of the run to this file"
+    ),
+    append_results: bool = typer.Option(False, help="add the table to the results file"),
+):
+    """
+    Merge the result bundles of the shards of a benchmark run into one report.
+    """
+    paths = sorted({path for pattern in bundles for path in glob.glob(pattern)})
+    if not paths:
+        raise typer.BadParameter("No result bundles found")
+
+    merged = merge_bundles(Path(path) for path in paths)
+    if merged["missing_shards"]:
+        print(f"Warning: no results for shards {', '.join(merged['missing_shards'])}")
+
+    table: str = tabulate(report_rows(merged["results"]), HEADERS, tablefmt="pipe")
+    print("\nBenchmark report:\n")
+    print(table)
+    print()
+
+    record = history_record(merged)
+    with open(history_path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+    if append_results:
+        insert_markdown_section(results_path, record["date"], table, 2)
+
+
+if __name__ == "__main__":
+    app()
@@ -1,52 +1,171 @@
 import json
+import pathlib
+import sys
+
+from typing import IO, Iterator, List, Tuple, Union
 
 import typer
 
 from termcolor import colored
 
+from gpt_engineer.chat_log import ChatLog
+
 app = typer.Typer()
 
+ROLE_TO_COLOR = {
+    "system": "red",
+    "user": "green",
+    "assistant": "blue",
+    "function": "magenta",
+}
+
+# Files in a logs folder that are not JSON step logs
+NOT_STEP_LOGS = {"token_usage", "index.json", "messages.jsonl", "conversations.jsonl"}
+
+
+def iter_json_array(f: IO[str], chunk_size=2**16) -> Iterator[dict]:
+    """Yield the items of a JSON array one at a time, without loading the file"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        separators = " \n\r\t," if started else " \n\r\t"
+        while pos < len(buffer) and buffer[pos] in separators:
+            pos += 1
+        if pos < len(buffer) and not started:
+            if buffer[pos] != "[":
+                raise ValueError("Expected a JSON array of messages")
+            pos += 1
+            started = True
+            continue
+        if started and buffer.startswith("]", pos):
+            return
+
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # The next item is not complete yet, or the buffer is empty
+            if eof:
+                raise
+            # Read at least as much as is buffered, so an item that spans many
+            # chunks is decoded a logarithmic number of times, not once per chunk
+            buffer = buffer[pos:]
+            pos = 0
+            chunk = f.read(max(chunk_size, len(buffer)))
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+
+
+def format_message(message: dict) -> str:
+    if message["role"] == "function":
+        return f"function ({message['name']}): {message['content']}\n"
+    if message["role"] == "assistant" and message.get("function_call"):
+        return f"assistant: {message['function_call']}\n"
+    return f"{message['role']}: {message['content']}\n"
+
+
+def message_text(message: dict) -> str:
+    """The text of a message, without the keys and hashes of how it is stored"""
+    if message.get("function_call"):
+        return str(message["function_call"])
+    return message.get("content") or ""
 
-def pretty_print_conversation(messages):
-    role_to_color = {
-        "system": "red",
-        "user": "green",
-        "assistant": "blue",
-        "function": "magenta",
-    }
-    formatted_messages = []
+
+def pretty_print_conversation(messages, role=None, page_size=0):
+    printed = 0
     for message in messages:
-        if message["role"] == "function":
-            formatted_messages.append(
-                f"function ({message['name']}): {message['content']}\n"
-            )
-        else:
-            assistant_content = (
-                message["function_call"]
-                if message.get("function_call")
-                else message["content"]
-            )
-            role_to_message = {
-                "system": f"system: {message['content']}\n",
-                "user": f"user: {message['content']}\n",
-                "assistant": f"assistant: {assistant_content}\n",
-            }
-            formatted_messages.append(role_to_message[message["role"]])
-
-    for formatted_message in formatted_messages:
-        role = messages[formatted_messages.index(formatted_message)]["role"]
-        color = role_to_color[role]
-        print(colored(formatted_message, color))
+        if role and message["role"] != role:
+            continue
+        print(colored(format_message(message), ROLE_TO_COLOR[message["role"]]))
+
+        printed += 1
+        if page_size and printed % page_size == 0 and sys.stdout.isatty():
+            if input("-- more (enter to continue, q to quit) --").strip() == "q":
+                return False
+    return True
+
+
+def logs_folders(path: pathlib.Path) -> List[pathlib.Path]:
+    """The logs folders of a project and of all its archived runs"""
+    if (path / "memory" / "logs").is_dir():
+        archived = sorted(path.glob("archive/*/memory/logs"))
+        return [path / "memory" / "logs"] + archived
+    return [path]
+
+
+def search_logs(path: pathlib.Path, term: str) -> Iterator[Tuple[str, str, int, dict]]:
+    """(logs folder, step, turn, message) of every message containing term"""
+    needle = term.lower()
+    for folder in logs_folders(path):
+        if (folder / "conversations.jsonl").exists():
+            chat_log = ChatLog(folder, read_only=True)
+            # Scan the deduplicated messages once, then find where they are used
+            matches = {}
+            with chat_log.messages_path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if needle in message_text(entry["message"]).lower():
+                        matches[entry["hash"]] = entry["message"]
+            for step in chat_log.steps():
+                for turn, digest in enumerate(chat_log.hashes(step) or []):
+                    if digest in matches:
+                        yield str(folder), step, turn, matches[digest]
+
+        for log_file in sorted(folder.iterdir()):
+            if not log_file.is_file() or log_file.name in NOT_STEP_LOGS:
+                continue
+            try:
+                with log_file.open("r", encoding="utf-8") as f:
+                    for turn, message in enumerate(iter_json_array(f)):
+                        if needle in message_text(message).lower():
+                            yield str(folder), log_file.name, turn, message
+            except ValueError:
+                continue
 
 
 @app.command()
 def main(
     messages_path: str,
+    step: Union[str, None] = typer.Option(None, help="only show this step"),
+    role: Union[str, None] = typer.Option(None, help="only show messages of this role"),
+    page_size: int = typer.Option(0, help="pause after this many messages"),
+    search: Union[str, None] = typer.Option(
+        None, help="search all logs of a project, including archived runs"
+    ),
 ):
-    with open(messages_path) as f:
-        messages = json.load(f)
+    """
+    Print a JSON step log, the conversations of a logs folder, or search the
+    logs of a project.
+    """
+    path = pathlib.Path(messages_path)
+    if not path.exists():
+        raise typer.BadParameter(f"{messages_path} does not exist")
+
+    if search:
+        for folder, step_id, turn, message in search_logs(path, search):
+            if (step and step_id != step) or (role and message["role"] != role):
+                continue
+            print(colored(f"{folder} {step_id} #{turn}", "yellow"))
+            print(colored(format_message(message), ROLE_TO_COLOR[message["role"]]))
+        return
+
+    if path.is_file():
+        with path.open("r", encoding="utf-8") as f:
+            pretty_print_conversation(iter_json_array(f), role, page_size)
+        return
 
-    pretty_print_conversation(messages)
+    chat_log = ChatLog(path, read_only=True)
+    for step_id in [step] if step else chat_log.steps():
+        print(colored(f"--- {step_id} ---", "yellow"))
+        hashes = chat_log.hashes(step_id) or []
+        # Messages are loaded one at a time, so paging stays instant
+        messages = (chat_log.get_messages([digest])[0] for digest in hashes)
+        if not pretty_print_conversation(messages, role, page_size):
+            return
 
 
 if __name__ == "__main__":
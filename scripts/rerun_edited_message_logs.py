@@ -1,37 +1,125 @@
+import glob
+import hashlib
 import json
 import pathlib
+import time
 
-from typing import Union
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Union
 
 import typer
 
+from tabulate import tabulate
+
 from gpt_engineer.ai import AI
 from gpt_engineer.chat_to_files import to_files
+from gpt_engineer.db import DB
 
 app = typer.Typer()
 
+# The AI of a worker process, so the model is loaded once per worker
+worker_ai = None
+
+
+def init_worker(model: str, temperature: float):
+    global worker_ai
+    worker_ai = AI(model=model, temperature=temperature)
+
+
+def replay(messages: List[dict]) -> dict:
+    start = time.time()
+    messages = worker_ai.next(messages, step_name="replay")  # type: ignore
+    usage = worker_ai.token_usage_log[-1]  # type: ignore
+    return {
+        "content": messages[-1]["content"],
+        "prompt_tokens": usage.in_step_prompt_tokens,
+        "completion_tokens": usage.in_step_completion_tokens,
+        "seconds": time.time() - start,
+    }
+
+
+def conversation_hash(messages: List[dict]) -> str:
+    return hashlib.sha256(
+        json.dumps(messages, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def output_dir(out_path: pathlib.Path, messages_path: str, n_inputs: int):
+    if n_inputs == 1:
+        return out_path
+    # Keep the folder structure of the inputs apart, e.g. for archived runs
+    name = str(pathlib.Path(messages_path).with_suffix("")).strip("/").replace("/", "__")
+    return out_path / name
+
 
 @app.command()
 def main(
-    messages_path: str,
+    messages_path: str = typer.Argument(..., help="message log file or glob of them"),
     out_path: Union[str, None] = None,
-    model: str = "gpt-4",
+    model: str = "ggml-v3-13b-hermes-q5_1.bin",
     temperature: float = 0.1,
+    workers: int = typer.Option(1, help="processes replaying in parallel"),
 ):
-    ai = AI(
-        model=model,
-        temperature=temperature,
-    )
+    """
+    Replay edited message logs and write the files of each answer. Identical
+    conversations are only replayed once.
+    """
+    paths = sorted(glob.glob(messages_path, recursive=True))
+    if not paths:
+        raise typer.BadParameter(f"No message logs match {messages_path}")
+
+    conversations: Dict[str, List[dict]] = {}
+    inputs: Dict[str, List[str]] = {}
+    for path in paths:
+        with open(path) as f:
+            messages = json.load(f)
+        digest = conversation_hash(messages)
+        conversations[digest] = messages
+        inputs.setdefault(digest, []).append(path)
+    print(f"Replaying {len(conversations)} conversations from {len(paths)} files")
 
-    with open(messages_path) as f:
-        messages = json.load(f)
+    digests = list(conversations)
+    if workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(model, temperature),
+        ) as executor:
+            results = list(executor.map(replay, [conversations[d] for d in digests]))
+    else:
+        init_worker(model, temperature)
+        results = [replay(conversations[digest]) for digest in digests]
 
-    messages = ai.next(messages)
+    rows = []
+    for digest, result in zip(digests, results):
+        for path in inputs[digest]:
+            if out_path:
+                out = output_dir(pathlib.Path(out_path), path, len(paths))
+                to_files(result["content"], DB(out))
+                with open(out / "all_output.txt", "w") as f:
+                    json.dump(result["content"], f)
+        rows.append(
+            [
+                inputs[digest][0],
+                len(inputs[digest]) - 1,
+                result["prompt_tokens"],
+                result["completion_tokens"],
+                round(result["seconds"], 1),
+            ]
+        )
 
-    if out_path:
-        to_files(messages[-1]["content"], out_path)
-        with open(pathlib.Path(out_path) / "all_output.txt", "w") as f:
-            json.dump(messages[-1]["content"], f)
+    rows.append(
+        [
+            "total",
+            len(paths) - len(digests),
+            sum(row[2] for row in rows),
+            sum(row[3] for row in rows),
+            round(sum(row[4] for row in rows), 1),
+        ]
+    )
+    headers = ["Log", "Duplicates", "Prompt tokens", "Completion tokens", "Seconds"]
+    print()
+    print(tabulate(rows, headers, tablefmt="pipe"))
 
 
 if __name__ == "__main__":
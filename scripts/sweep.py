@@ -0,0 +1,73 @@
+import json
+
+from itertools import islice
+from pathlib import Path
+from typing import List, Union
+
+import typer
+
+from tabulate import tabulate
+
+from gpt_engineer.steps import Config as StepsConfig
+from gpt_engineer.sweep import MATRIX_HEADERS, comparison_matrix, run_job, sweep_jobs
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    models: List[str] = typer.Option(
+        ["ggml-v3-13b-hermes-q5_1.bin"], "--model", help="model to compare"
+    ),
+    temperatures: List[float] = typer.Option(
+        [0.1], "--temperature", help="temperature to compare"
+    ),
+    configs: List[StepsConfig] = typer.Option(
+        [StepsConfig.BENCHMARK], "--steps", help="steps config to compare"
+    ),
+    n_benchmarks: Union[int, None] = None,
+    path: str = typer.Option("benchmark", help="folder with the benchmarks"),
+    out_path: str = typer.Option("sweep", help="folder for the runs and results"),
+    execute: bool = typer.Option(False, help="only count runs where run.sh succeeds"),
+    timeout: int = typer.Option(60, help="seconds run.sh may run with --execute"),
+    answers: str = typer.Option(
+        "auto",
+        help='answer clarifying questions with "auto" (none), "model" or an answer file',
+    ),
+):
+    """
+    Run every combination of models, temperatures and steps configs on the
+    benchmarks and compare them.
+    """
+    benchmarks: List[Path] = sorted(
+        folder
+        for folder in Path(path).iterdir()
+        if folder.is_dir() and not folder.name.startswith(".")
+    )
+    if n_benchmarks:
+        benchmarks = list(islice(benchmarks, n_benchmarks))
+
+    jobs = sweep_jobs(models, temperatures, configs, benchmarks)
+    out = Path(out_path)
+    out.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    with open(out / "results.jsonl", "a") as f:
+        for number, job in enumerate(jobs, 1):
+            print(
+                f"[{number}/{len(jobs)}] {job.model} t={job.temperature} "
+                f"{job.config.value} {job.benchmark.name}"
+            )
+            result = run_job(job, out, execute, timeout, answers)
+            results.append(result)
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+
+    table = tabulate(comparison_matrix(results), MATRIX_HEADERS, tablefmt="pipe")
+    (out / "matrix.md").write_text(table + "\n")
+    print()
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,59 @@
+import pytest
+
+from gpt_engineer import fingerprint
+from gpt_engineer.db import DB, DBs
+
+
+@pytest.fixture(autouse=True)
+def user_cache(tmp_path_factory, monkeypatch):
+    """
+    Keep the pipeline fingerprint, lock files and other caches out of the real
+    ~/.cache, and out of tmp_path, which tests use as a DB folder
+    """
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path_factory.mktemp("user_cache")))
+    monkeypatch.setattr(fingerprint, "_memo", None)
+
+
+@pytest.fixture
+def dbs(tmp_path):
+    """The DBs of a project in tmp_path, laid out like main lays them out"""
+    return DBs(
+        memory=DB(tmp_path / "memory"),
+        logs=DB(tmp_path / "memory" / "logs"),
+        preprompts=DB(tmp_path / "preprompts"),
+        input=DB(tmp_path),
+        workspace=DB(tmp_path / "workspace"),
+        archive=DB(tmp_path / "archive"),
+    )
+
+
+class FakeAI:
+    """An AI that answers with the given answers in turn"""
+
+    model = "test_model"
+    temperature = 0.1
+
+    def __init__(self, answers=()):
+        self.answers = list(answers)
+        # The prompts and the conversations sent with them, in order
+        self.prompts = []
+        self.conversations = []
+
+    def fsystem(self, msg):
+        return {"role": "system", "content": msg}
+
+    def fuser(self, msg):
+        return {"role": "user", "content": msg}
+
+    def fassistant(self, msg):
+        return {"role": "assistant", "content": msg}
+
+    def start(self, system, user, step_name):
+        return self.next([self.fsystem(system)], user, step_name=step_name)
+
+    def next(self, messages, prompt=None, *, step_name=None):
+        self.prompts.append(prompt)
+        if prompt:
+            messages = messages + [self.fuser(prompt)]
+        self.conversations.append(messages)
+        return messages + [self.fassistant(self.answers.pop(0))]
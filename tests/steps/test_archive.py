@@ -1,8 +1,10 @@
 import datetime
+import json
 import os
 
 from unittest.mock import MagicMock
 
+from gpt_engineer.archive_index import ArchiveIndex
 from gpt_engineer.db import DB, DBs, archive
 
 
@@ -41,3 +43,23 @@ def test_archive(tmp_path, monkeypatch):
     assert not os.path.exists(tmp_path / "workspace")
     assert os.path.isdir(tmp_path / "archive" / "20201225_170555")
     assert os.path.isdir(tmp_path / "archive" / "20220814_080512")
+
+
+def test_archive_index(tmp_path, monkeypatch):
+    dbs = setup_dbs(
+        tmp_path, ["memory", "logs", "preprompts", "input", "workspace", "archive"]
+    )
+    dbs.memory["run_info"] = json.dumps({"model": "model.bin", "steps": ["default"]})
+    dbs.memory["review"] = json.dumps(
+        {"ran": True, "perfect": False, "works": True, "comments": "", "raw": "y, n, y"}
+    )
+    dbs.workspace["main.py"] = "print('hello')"
+    freeze_at(monkeypatch, datetime.datetime(2020, 12, 25, 17, 5, 55))
+    archive(dbs)
+
+    (snapshot,) = ArchiveIndex(tmp_path / "archive").snapshots()
+    assert snapshot.timestamp == "20201225_170555"
+    assert snapshot.model == "model.bin"
+    assert json.loads(snapshot.steps) == ["default"]
+    assert snapshot.size > len("print('hello')")
+    assert (snapshot.ran, snapshot.works, snapshot.perfect) == (True, True, False)
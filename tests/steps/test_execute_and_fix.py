@@ -0,0 +1,77 @@
+import builtins
+
+from gpt_engineer.fork.steps import ExecuteEntrypointAndFix, failing_files, trim_output
+from tests.conftest import FakeAI
+
+
+def test_trim_output():
+    output = "\n".join(f"line {i}" for i in range(100))
+
+    trimmed = trim_output(output, max_lines=10)
+
+    assert trimmed.startswith("[...]\n")
+    assert trimmed.endswith("line 99")
+    assert "line 89" not in trimmed
+    assert trim_output("short") == "short"
+
+
+def test_failing_files(dbs):
+    dbs.workspace["all_output.txt"] = "a.py\n```\nx\n```\n\nsrc/b.py\n```\ny\n```\n"
+    dbs.workspace["a.py"] = "x\n"
+    dbs.workspace["src/b.py"] = "y\n"
+
+    assert failing_files('File "/tmp/workspace/src/b.py", line 1', dbs) == [
+        ("src/b.py", "y\n")
+    ]
+    # Only whole names count, "a.py" is not mentioned by "data.py"
+    assert failing_files('File "/usr/lib/data.py", line 1', dbs) == [
+        ("a.py", "x\n"),
+        ("src/b.py", "y\n"),
+    ]
+    assert failing_files("a.py:1: SyntaxError", dbs) == [("a.py", "x\n")]
+    assert failing_files("Segmentation fault", dbs) == [
+        ("a.py", "x\n"),
+        ("src/b.py", "y\n"),
+    ]
+
+
+def test_execute_and_fix(dbs, monkeypatch):
+    monkeypatch.setattr(builtins, "input", lambda *args: "")
+    dbs.preprompts["generate"] = "generate"
+    dbs.preprompts["philosophy"] = "philosophy"
+    dbs.preprompts["fix_runtime_error"] = "fix it"
+    dbs.preprompts["diff_format"] = "diff it"
+    dbs.input["main_prompt"] = "add numbers"
+    dbs.workspace["all_output.txt"] = "main.py\n```\nimport missing\n```\n"
+    dbs.workspace["main.py"] = "import missing\n"
+    dbs.workspace["run.sh"] = "python main.py\n"
+
+    ai = FakeAI(["main.py\n```python\nprint(1 + 1)\n```\n"])
+    ExecuteEntrypointAndFix(max_attempts=2).run(ai, dbs)
+
+    assert len(ai.prompts) == 1
+    assert "ModuleNotFoundError" in ai.prompts[0]
+    assert dbs.workspace["main.py"] == "print(1 + 1)\n"
+    assert "print(1 + 1)" in dbs.workspace["all_output.txt"]
+
+
+def test_execute_shows_output_while_running(dbs, capsys):
+    dbs.workspace["run.sh"] = "echo started\nsleep 30\n"
+
+    returncode, output = ExecuteEntrypointAndFix(timeout=1).execute(dbs, None)
+
+    # Stopped by the timeout, which does not verify that it works
+    assert returncode is None
+    assert output == "started\n"
+    assert capsys.readouterr().out == "started\n"
+
+
+def test_execute_and_fix_does_not_fix_timeouts(dbs, monkeypatch, capsys):
+    monkeypatch.setattr(builtins, "input", lambda *args: "")
+    dbs.workspace["run.sh"] = "sleep 30\n"
+
+    ai = FakeAI([])
+    ExecuteEntrypointAndFix(timeout=1).run(ai, dbs)
+
+    assert ai.prompts == []
+    assert "not known whether it works" in capsys.readouterr().out
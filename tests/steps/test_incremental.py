@@ -0,0 +1,160 @@
+import datetime
+import json
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from gpt_engineer.db import archive
+from gpt_engineer.fork.steps import GenerateEntrypoint, IncrementalGen, StepRunner, sha256
+from tests.conftest import FakeAI
+
+ANSWER = """main.py
+```python
+from weather import forecast
+print(forecast("Berlin"))
+```
+
+weather.py
+```python
+def forecast(city):
+    return f"Sunny in {city}"
+```
+
+units.py
+```python
+def celsius(fahrenheit):
+    return (fahrenheit - 32) * 5 / 9
+```
+"""
+
+DIFF = """```diff
+--- weather.py
++++ weather.py
+@@ -1,2 +1,2 @@
+ def forecast(city):
+-    return f"Sunny in {city}"
++    return f"Rainy in {city}"
+```
+"""
+
+
+@pytest.fixture
+def dbs(dbs):
+    dbs.preprompts["generate"] = "generate"
+    dbs.preprompts["philosophy"] = "philosophy"
+    dbs.preprompts["incremental"] = "update it"
+    dbs.preprompts["diff_format"] = "diff it"
+    return dbs
+
+
+def run(dbs, answers, monkeypatch, time, resume=False):
+    datetime_mock = MagicMock(wraps=datetime.datetime)
+    datetime_mock.now.return_value = time
+    monkeypatch.setattr(datetime, "datetime", datetime_mock)
+    if not resume:
+        archive(dbs)
+
+    ai = FakeAI(answers)
+    StepRunner(ai, dbs, [IncrementalGen()], resume=resume).run()
+    return ai
+
+
+def test_incremental_updates_affected_files(tmp_path, dbs, monkeypatch):
+    (tmp_path / "main_prompt").write_text("A weather app that shows the forecast.\n")
+    ai = run(dbs, [ANSWER], monkeypatch, datetime.datetime(2023, 1, 1))
+
+    # Without a previous run everything is generated
+    assert dbs.workspace["weather.py"].startswith("def forecast")
+    provenance = json.loads(dbs.memory["provenance"])
+    assert set(provenance["files"]) == {"main.py", "weather.py", "units.py"}
+
+    (tmp_path / "main_prompt").write_text(
+        "A weather app that shows the forecast.\nThe forecast is always rainy.\n"
+    )
+    ai = run(dbs, [DIFF], monkeypatch, datetime.datetime(2023, 1, 2))
+
+    assert dbs.workspace["weather.py"] == (
+        'def forecast(city):\n    return f"Rainy in {city}"\n'
+    )
+    assert dbs.workspace["units.py"].startswith("def celsius")
+    assert "Rainy" in dbs.workspace["all_output.txt"]
+
+    (conversation,) = ai.conversations
+    sent = "".join(message["content"] for message in conversation)
+    assert "+The forecast is always rainy." in sent
+    assert "units.py\n```" not in sent
+
+    provenance = json.loads(dbs.memory["provenance"])
+    assert provenance["main_prompt"].endswith("always rainy.\n")
+
+
+def test_incremental_keeps_files_when_prompt_is_unchanged(tmp_path, dbs, monkeypatch):
+    (tmp_path / "main_prompt").write_text("A weather app.\n")
+    run(dbs, [ANSWER], monkeypatch, datetime.datetime(2023, 1, 1))
+
+    ai = run(dbs, [], monkeypatch, datetime.datetime(2023, 1, 2))
+
+    assert ai.conversations == []
+    assert dbs.workspace["units.py"].startswith("def celsius")
+
+
+def test_incremental_records_edits_and_keeps_clarifications(tmp_path, dbs, monkeypatch):
+    (tmp_path / "main_prompt").write_text("A weather app.\n")
+    ai = run(dbs, [ANSWER], monkeypatch, datetime.datetime(2023, 1, 1))
+    dbs.logs["clarification"] = json.dumps(
+        [
+            {"role": "system", "content": "clarify"},
+            {"role": "user", "content": "Temperatures are in Celsius."},
+        ]
+    )
+
+    for day, prompt in enumerate(["Rainy.\n", "Rainy and cold.\n"], start=2):
+        (tmp_path / "main_prompt").write_text("A weather app.\n" + prompt)
+        answer = (
+            DIFF if day == 2 else DIFF.replace("Rainy", "Cold").replace("Sunny", "Rainy")
+        )
+        ai = run(dbs, [answer], monkeypatch, datetime.datetime(2023, 1, day))
+
+        (conversation,) = ai.conversations
+        assert "Temperatures are in Celsius." in conversation[2]["content"]
+        files = json.loads(dbs.memory["provenance"])["files"]
+        # Changed through a diff, which only names the file in its header
+        assert files["weather.py"]["prompt"] == sha256(dbs.input["main_prompt"])
+        assert files["units.py"]["prompt"] == sha256("A weather app.\n")
+
+
+def test_resumed_incremental_run_updates_the_last_run(tmp_path, dbs, monkeypatch):
+    (tmp_path / "main_prompt").write_text("A weather app.\n")
+    run(dbs, [ANSWER], monkeypatch, datetime.datetime(2023, 1, 1))
+    (tmp_path / "main_prompt").write_text("A weather app.\nRainy.\n")
+    run(dbs, [DIFF], monkeypatch, datetime.datetime(2023, 1, 2))
+
+    # Resuming does not archive, so the archive holds the run before the last
+    (tmp_path / "main_prompt").write_text("A weather app.\nRainy and cold.\n")
+    cold = DIFF.replace("Rainy", "Cold").replace("Sunny", "Rainy")
+    ai = run(dbs, [cold], monkeypatch, datetime.datetime(2023, 1, 3), True)
+
+    assert dbs.workspace["weather.py"] == (
+        'def forecast(city):\n    return f"Cold in {city}"\n'
+    )
+    (conversation,) = ai.conversations
+    sent = "".join(message["content"] for message in conversation)
+    assert "-Rainy.\n+Rainy and cold." in sent
+    assert 'return f"Rainy in {city}"' in sent
+
+
+def test_plan_reruns_steps_after_incremental_gen(tmp_path, dbs, monkeypatch):
+    (tmp_path / "main_prompt").write_text("A weather app.\n")
+    steps = [IncrementalGen(), GenerateEntrypoint()]
+    StepRunner(FakeAI([ANSWER, "```bash\npython main.py\n```"]), dbs, steps).run()
+
+    def plan():
+        runner = StepRunner(FakeAI([]), dbs, steps, resume=True)
+        return [reason for _, _, reason in runner.plan()]
+
+    assert plan() == ["unchanged", "unchanged"]
+
+    # Without its checkpoint the first step reruns, and may rewrite all files
+    (dbs.logs.path / "checkpoints" / "incremental_gen.json").unlink()
+    assert plan() == ["has not run yet", "workspace/all_output.txt may change"]
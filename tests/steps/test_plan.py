@@ -0,0 +1,125 @@
+from gpt_engineer.fork.steps import ExecuteEntrypoint, HumanReview, Step, StepRunner
+from tests.conftest import FakeAI
+
+
+class Spec(Step):
+    step_id = "spec"
+    inputs = ("input/prompt",)
+    outputs = ("memory/spec",)
+
+    def __init__(self):
+        Step.__init__(self, "Spec")
+        self.calls = 0
+
+    def run(self, ai, dbs):
+        self.calls += 1
+        dbs.memory["spec"] = "spec of " + dbs.input["prompt"]
+        return [{"role": "assistant", "content": dbs.memory["spec"]}]
+
+
+class Code(Step):
+    step_id = "code"
+    inputs = ("memory/spec", "input/style")
+    outputs = ("workspace/*",)
+
+    def __init__(self):
+        Step.__init__(self, "Code")
+        self.calls = 0
+
+    def run(self, ai, dbs):
+        self.calls += 1
+        dbs.workspace["main.py"] = dbs.memory["spec"] + dbs.input.get("style", "")
+        return [{"role": "assistant", "content": "main.py"}]
+
+
+class Review(Step):
+    step_id = "review"
+    inputs = ("workspace/main.py",)
+    outputs = ("memory/review",)
+    requires_model = False
+
+    def __init__(self):
+        Step.__init__(self, "Review")
+        self.calls = 0
+
+    def run(self, ai, dbs):
+        self.calls += 1
+        dbs.memory["review"] = "ok"
+        return []
+
+
+def runner(dbs, ai=None):
+    return StepRunner(ai or FakeAI(), dbs, [Spec(), Code(), Review()], resume=True)
+
+
+def run(dbs, ai=None):
+    steps = runner(dbs, ai)
+    steps.run()
+    return [step.calls for step in steps.steps]
+
+
+def test_declared_inputs_limit_reruns(dbs):
+    dbs.input["prompt"] = "hello"
+    assert run(dbs) == [1, 1, 1]
+
+    # Only the steps reading the changed input rerun
+    dbs.input["style"] = "pep8"
+    assert run(dbs) == [0, 1, 1]
+
+    # Other files of the project folder are not inputs of any step
+    dbs.input["notes"] = "unrelated"
+    assert run(dbs) == [0, 0, 0]
+
+    # Steps without the model do not depend on it
+    other = FakeAI()
+    other.model = "other_model"
+    assert run(dbs, other) == [1, 1, 0]
+
+
+def test_plan(dbs):
+    dbs.input["prompt"] = "hello"
+
+    assert [(runs, reason) for _, runs, reason in runner(dbs).plan()] == [
+        (True, "has not run yet"),
+        (True, "memory/spec may change"),
+        (True, "workspace/main.py may change"),
+    ]
+
+    run(dbs)
+    assert [runs for _, runs, _ in runner(dbs).plan()] == [False, False, False]
+
+    dbs.input["style"] = "pep8"
+    plan = runner(dbs).plan()
+    assert [(runs, reason) for _, runs, reason in plan] == [
+        (False, "unchanged"),
+        (True, "inputs or outputs changed"),
+        (True, "workspace/main.py may change"),
+    ]
+    # Planning does not run anything
+    assert run(dbs) == [0, 1, 1]
+
+
+def test_execution_and_review_always_run(dbs):
+    dbs.input["prompt"] = "hello"
+    run(dbs)
+
+    steps = [Spec(), Code(), ExecuteEntrypoint(), HumanReview()]
+    plan = StepRunner(FakeAI(), dbs, steps, resume=True).plan()
+    assert [(runs, reason) for _, runs, reason in plan] == [
+        (False, "unchanged"),
+        (False, "unchanged"),
+        (True, "always runs"),
+        (True, "always runs"),
+    ]
+
+    class Execute(Review):
+        step_id = "execute"
+        resumable = False
+
+    steps = runner(dbs)
+    steps.steps.append(Execute())
+    steps.run()
+    steps = runner(dbs)
+    steps.steps.append(Execute())
+    steps.run()
+    assert [step.calls for step in steps.steps] == [0, 0, 0, 1]
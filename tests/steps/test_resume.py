@@ -0,0 +1,87 @@
+import json
+
+from unittest.mock import MagicMock
+
+from gpt_engineer.db import DB
+from gpt_engineer.fork.steps import Step, StepRunner
+from tests.conftest import FakeAI
+
+
+class Write(Step):
+    def __init__(self, step_id, key):
+        Step.__init__(self, step_id)
+        self.step_id = step_id
+        self.key = key
+        self.calls = 0
+
+    def run(self, ai, dbs):
+        self.calls += 1
+        previous = self.prev.messages if self.prev else []
+        dbs.workspace[self.key] = dbs.input["prompt"] + str(len(previous))
+        return previous + [{"role": "assistant", "content": self.key}]
+
+
+def run(dbs, resume=True):
+    steps = [Write("first", "a.txt"), Write("second", "b.txt")]
+    StepRunner(FakeAI(), dbs, steps, resume=resume).run()
+    return [step.calls for step in steps], steps
+
+
+def test_resume_skips_completed_steps(dbs):
+    dbs.input["prompt"] = "hello"
+
+    assert run(dbs)[0] == [1, 1]
+
+    calls, steps = run(dbs)
+    assert calls == [0, 0]
+    # Messages are restored so later steps can still use them
+    assert steps[1].messages[-1]["content"] == "b.txt"
+
+    assert run(dbs, resume=False)[0] == [1, 1]
+
+
+def test_resume_reruns_changed_steps(dbs):
+    dbs.input["prompt"] = "hello"
+    run(dbs)
+
+    # A modified output invalidates the step, later steps only rerun if
+    # the regenerated output differs
+    dbs.workspace["a.txt"] = "edited"
+    assert run(dbs)[0] == [1, 0]
+    assert dbs.workspace["a.txt"] == "hello0"
+
+    # A changed input invalidates everything
+    dbs.input["prompt"] = "bye"
+    assert run(dbs)[0] == [1, 1]
+    assert dbs.workspace["b.txt"] == "bye1"
+
+    # A step without checkpoint, e.g. after a crash, runs again
+    (dbs.logs.path / "checkpoints" / "second.json").unlink()
+    assert run(dbs)[0] == [0, 1]
+
+
+def test_checkpoints_skip_dependency_dirs(dbs, monkeypatch):
+    dbs.input["prompt"] = "hello"
+    dbs.workspace["node_modules/left-pad/index.js"] = "module.exports = 1"
+
+    class Install(Write):
+        resumable = False
+
+        def run(self, ai, dbs):
+            dbs.workspace["venv/lib/site.py"] = "installed"
+            return Write.run(self, ai, dbs)
+
+    first, execute = Write("first", "a.txt"), Install("execute", "b.txt")
+    stamps = MagicMock(wraps=DB.stamps)
+    monkeypatch.setattr(
+        DB, "stamps", lambda db, *args, **kwargs: stamps(db, *args, **kwargs)
+    )
+    StepRunner(FakeAI(), dbs, [first, execute], resume=True).run()
+
+    checkpoint = json.loads(dbs.logs["checkpoints/first.json"])
+    assert list(checkpoint["outputs"]) == ["workspace/a.txt"]
+    # Steps that always run do not hash their outputs
+    assert json.loads(dbs.logs["checkpoints/execute.json"])["outputs"] == {}
+    # Before and after the first step, for memory and workspace
+    assert stamps.call_count == 4
+    assert all("node_modules" in call.kwargs["exclude"] for call in stamps.call_args_list)
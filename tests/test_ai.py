@@ -1,9 +1,111 @@
+import threading
+import time
+
+from types import SimpleNamespace
+from typing import List
+
 import pytest
 
-from gpt_engineer.ai import AI
+from gpt_engineer import ai as ai_module
+from gpt_engineer.ai import AI, ModelLoadError
 
 
 @pytest.mark.xfail(reason="Constructor assumes API access")
 def test_ai():
     AI()
     # TODO Assert that methods behave and not only constructor.
+
+
+class SlowGPT4All:
+    loads: List[str] = []
+
+    def __init__(self, model):
+        time.sleep(0.2)
+        SlowGPT4All.loads.append(model)
+
+    def chat_completion(self, messages, **kwargs):
+        return {"choices": [{"message": {"role": "assistant", "content": "no"}}]}
+
+
+def test_warmup_loads_model_once(monkeypatch):
+    encoder = SimpleNamespace(encode=str.split)
+    monkeypatch.setattr(ai_module, "GPT4All", SlowGPT4All)
+    monkeypatch.setattr(
+        ai_module, "tiktoken", SimpleNamespace(encoding_for_model=lambda model: encoder)
+    )
+    monkeypatch.setattr(AI, "model", None)
+    monkeypatch.setattr(AI, "loaded_model", None)
+
+    ai = AI("a.bin")
+    assert SlowGPT4All.loads == []
+
+    thread = ai.warmup()
+    # The completion waits for the model the warmup is loading
+    messages = ai.start("system", "user", "step")
+    thread.join()
+
+    assert messages[-1]["content"] == "no"
+    assert SlowGPT4All.loads == ["a.bin"]
+
+
+def test_warmup_overlaps_with_preparing_the_project(monkeypatch):
+    loading = threading.Event()
+    loaded = threading.Event()
+    tokenizer_loads = []
+
+    class BlockingGPT4All(SlowGPT4All):
+        def __init__(self, model):
+            loading.set()
+            # Only finishes once the caller did its own work in the meantime
+            assert loaded.wait(10)
+
+    def encoding_for_model(model):
+        # The tokenizer is loaded while the model loads, not before it starts
+        tokenizer_loads.append(loading.is_set())
+        return SimpleNamespace(encode=str.split)
+
+    monkeypatch.setattr(ai_module, "GPT4All", BlockingGPT4All)
+    monkeypatch.setattr(
+        ai_module, "tiktoken", SimpleNamespace(encoding_for_model=encoding_for_model)
+    )
+    monkeypatch.setattr(AI, "model", None)
+    monkeypatch.setattr(AI, "loaded_model", None)
+
+    ai = AI("a.bin")
+    thread = ai.warmup()
+    assert loading.wait(10)
+    assert ai.num_tokens("a b c") == 3
+    assert thread.is_alive()
+    loaded.set()
+    thread.join()
+
+    assert tokenizer_loads == [True]
+    assert AI.loaded_model == "a.bin"
+
+
+class BrokenGPT4All(SlowGPT4All):
+    def __init__(self, model):
+        if model == "corrupt.bin":
+            raise RuntimeError("Unable to load model")
+        SlowGPT4All.loads.append(model)
+
+
+def test_failed_load_falls_back_or_raises(monkeypatch):
+    encoder = SimpleNamespace(encode=str.split)
+    monkeypatch.setattr(ai_module, "GPT4All", BrokenGPT4All)
+    monkeypatch.setattr(
+        ai_module, "tiktoken", SimpleNamespace(encoding_for_model=lambda model: encoder)
+    )
+    monkeypatch.setattr(AI, "model", None)
+    monkeypatch.setattr(AI, "loaded_model", None)
+    SlowGPT4All.loads = []
+
+    ai = AI("corrupt.bin", fallback="small.bin")
+    ai.warmup().join()
+    assert ai.start("system", "user", "step")[-1]["content"] == "no"
+    assert ai.model == "small.bin"
+    assert SlowGPT4All.loads == ["small.bin"]
+
+    monkeypatch.setattr(AI, "model", None)
+    with pytest.raises(ModelLoadError, match="Unable to load model"):
+        AI("corrupt.bin").start("system", "user", "step")
@@ -0,0 +1,108 @@
+import builtins
+import json
+
+import pytest
+
+from gpt_engineer.answers import (
+    Answers,
+    AutoAnswers,
+    FileAnswers,
+    ModelAnswers,
+    TerminalAnswers,
+    answer_provider,
+)
+from gpt_engineer.fork.steps import ClarificationStep, StepRunner
+from gpt_engineer.learning import collect_consent, human_input
+from tests.conftest import FakeAI
+
+
+def test_terminal_answers_repeat_invalid_choices(monkeypatch):
+    typed = iter(["maybe", "Y"])
+    monkeypatch.setattr(builtins, "input", lambda *args: next(typed))
+
+    assert TerminalAnswers().ask("consent", "Ok? ", ("y", "n")) == "y"
+
+
+def test_file_answers(tmp_path, monkeypatch):
+    monkeypatch.setattr(builtins, "input", pytest.fail)
+    path = tmp_path / "answers.json"
+    path.write_text(json.dumps({"clarification": ["Use SQLite", "c"], "review_ran": "y"}))
+    answers = answer_provider(str(path))
+
+    assert isinstance(answers, FileAnswers)
+    assert answers.ask("clarification", "") == "Use SQLite"
+    assert answers.ask("clarification", "") == "c"
+    # Once used up, or when missing, the defaults are used
+    assert answers.ask("clarification", "") == "c"
+    assert answers.ask("execute", "") == "y"
+
+    path.write_text(json.dumps({"consent": "sure"}))
+    with pytest.raises(ValueError):
+        FileAnswers(path).ask("consent", "", ("y", "n"))
+
+
+def test_yaml_answer_file(tmp_path):
+    pytest.importorskip("yaml")
+    path = tmp_path / "answers.yaml"
+    path.write_text("execute: n\nclarification:\n  - Use SQLite\n")
+
+    answers = FileAnswers(path)
+    assert answers.ask("execute", "") == "n"
+    assert answers.ask("clarification", "") == "Use SQLite"
+
+
+def test_model_answers_only_clarifying_questions():
+    ai = FakeAI(["Use SQLite."])
+    answers = ModelAnswers(ai, max_answers=1)
+
+    assert answers.ask("clarification", "", context="Which database?") == "Use SQLite."
+    assert ai.prompts == ["Which database?"]
+    # Stops answering so the clarification ends
+    assert answers.ask("clarification", "", context="Which port?") == "c"
+    assert answers.ask("consent", "", ("y", "n")) == "n"
+
+
+def test_review_and_consent_without_terminal(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(builtins, "input", pytest.fail)
+
+    review = human_input(AutoAnswers())
+    assert (review.ran, review.perfect, review.works) == (None, None, None)
+    assert not collect_consent(AutoAnswers())
+    assert not (tmp_path / ".gpte_consent").exists()
+
+
+class QuestionAI:
+    def __init__(self, questions):
+        self.questions = list(questions)
+
+    def fsystem(self, msg):
+        return {"role": "system", "content": msg}
+
+    def next(self, messages, prompt=None, *, step_name=None):
+        question = {"role": "assistant", "content": self.questions.pop(0)}
+        return messages + [{"role": "user", "content": prompt}, question]
+
+
+def test_model_answers_see_prompt_and_earlier_answers(dbs):
+    dbs.preprompts["qa"] = "Ask clarifying questions"
+    dbs.input["main_prompt"] = "A todo app"
+    answer_ai = FakeAI(["Use SQLite.", "Use SQLite."])
+    ai = QuestionAI(["Which database?", "Which port?", "no"])
+    step = ClarificationStep()
+    step.runner = StepRunner(ai, dbs, [step], answers=ModelAnswers(answer_ai))
+
+    step.run(ai, dbs)
+
+    first, second = answer_ai.prompts
+    assert "A todo app" in first and first.endswith(
+        "Question: Which database?\nAnswer of the author:"
+    )
+    assert "A todo app" in second
+    assert "Question: Which database?\nAnswer of the author: Use SQLite." in second
+    assert second.endswith("Question: Which port?\nAnswer of the author:")
+
+
+def test_answers_is_abstract():
+    with pytest.raises(TypeError):
+        Answers()  # type: ignore
@@ -0,0 +1,81 @@
+import json
+
+from gpt_engineer.archive_index import ArchiveIndex
+from gpt_engineer.db import DB, DBs, archive
+
+
+def add_snapshot(index, timestamp, size, review=None):
+    (index.path / timestamp / "workspace").mkdir(parents=True)
+    (index.path / timestamp / "workspace" / "main.py").write_text("x" * size)
+    index.add(timestamp, {"model": "model.bin", "steps": ["default"]}, review)
+
+
+def timestamps(snapshots):
+    return [snapshot.timestamp for snapshot in snapshots]
+
+
+def test_keep_last_and_best(tmp_path):
+    index = ArchiveIndex(tmp_path)
+    add_snapshot(index, "20230101_000000", 10, {"ran": True, "works": True})
+    add_snapshot(index, "20230102_000000", 10, {"ran": True, "works": False})
+    add_snapshot(index, "20230103_000000", 10)
+    add_snapshot(index, "20230104_000000", 10)
+
+    removed = index.gc(keep_last=1, keep_best=1)
+
+    assert timestamps(removed) == ["20230103_000000", "20230102_000000"]
+    assert timestamps(index.snapshots()) == ["20230104_000000", "20230101_000000"]
+    assert not (tmp_path / "20230102_000000").exists()
+    assert (tmp_path / "20230101_000000").exists()
+
+
+def test_max_size_removes_oldest(tmp_path):
+    index = ArchiveIndex(tmp_path)
+    for day in range(1, 5):
+        add_snapshot(index, f"2023010{day}_000000", 100)
+
+    removed = index.gc(max_size=250, dry_run=True)
+    assert timestamps(removed) == ["20230101_000000", "20230102_000000"]
+    assert len(index.snapshots()) == 4
+
+    index.gc(max_size=250)
+    assert timestamps(index.snapshots()) == ["20230104_000000", "20230103_000000"]
+
+
+def test_sync(tmp_path):
+    memory = tmp_path / "20230101_000000" / "memory"
+    memory.mkdir(parents=True)
+    (memory / "run_info").write_text(json.dumps({"model": "old.bin"}))
+    index = ArchiveIndex(tmp_path)
+    add_snapshot(index, "20230102_000000", 10)
+    (tmp_path / "20230102_000000" / "workspace" / "main.py").unlink()
+    (tmp_path / "20230102_000000" / "workspace").rmdir()
+    (tmp_path / "20230102_000000").rmdir()
+
+    index.sync()
+
+    (snapshot,) = index.snapshots()
+    assert snapshot.timestamp == "20230101_000000"
+    assert snapshot.model == "old.bin"
+
+
+def test_sync_skips_lock_dir(tmp_path):
+    project = tmp_path / "project"
+    dbs = DBs(
+        memory=DB(project / "memory"),
+        logs=DB(project / "memory" / "logs"),
+        preprompts=DB(project / "preprompts"),
+        input=DB(project),
+        workspace=DB(project / "workspace"),
+        archive=DB(project / "archive"),
+    )
+    dbs.workspace["main.py"] = "print(1)"
+    archive(dbs)
+    # Left behind by older versions, which kept lock files inside the DB
+    (project / "archive" / ".db-locks").mkdir()
+
+    index = ArchiveIndex(project / "archive")
+    index.sync()
+
+    assert len(index.snapshots()) == 1
+    assert ".db-locks" not in timestamps(index.gc(keep_last=0, dry_run=True))
@@ -0,0 +1,73 @@
+import json
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from gpt_engineer.benchmark_results import (
+    merge_bundles,
+    parse_shard,
+    report_rows,
+    shard_folders,
+    write_bundle,
+)
+
+NAMES = [f"benchmark_{i}" for i in range(20)]
+
+
+def make_benchmarks(path):
+    for i, name in enumerate(NAMES):
+        memory = path / name / "memory"
+        memory.mkdir(parents=True)
+        review = {"ran": True, "works": i % 2 == 0, "perfect": False, "comments": name}
+        (memory / "review").write_text(json.dumps(review))
+    return sorted(path.iterdir())
+
+
+def run_shard(path, shard):
+    folders = shard_folders(sorted(path.iterdir()), shard)
+    bundle = path.parent / "bundles" / f"{shard.replace('/', '_of_')}.json"
+    write_bundle(bundle, folders, shard)
+    return bundle
+
+
+def test_parse_shard():
+    assert parse_shard("2/4") == (2, 4)
+    with pytest.raises(ValueError):
+        parse_shard("0/4")
+    with pytest.raises(ValueError):
+        parse_shard("2")
+
+
+def test_shards_partition_benchmarks(tmp_path):
+    folders = make_benchmarks(tmp_path)
+    shards = [shard_folders(folders, f"{i}/3") for i in range(1, 4)]
+
+    assert sorted(folder.name for shard in shards for folder in shard) == sorted(NAMES)
+    assert shard_folders(reversed(folders), "1/3") == list(reversed(shards[0]))
+
+
+def test_merge_bundles_of_processes(tmp_path):
+    path = tmp_path / "benchmark"
+    path.mkdir()
+    make_benchmarks(path)
+    shards = [f"{i}/4" for i in range(1, 5)]
+
+    with ProcessPoolExecutor(4) as executor:
+        bundles = list(executor.map(run_shard, [path] * 4, shards))
+
+    merged = merge_bundles(bundles)
+    assert merged["shards"] == shards
+    assert merged["missing_shards"] == []
+    assert [result["benchmark"] for result in merged["results"]] == sorted(NAMES)
+    rows = report_rows(merged["results"])
+    assert rows[0] == [
+        "benchmark_0",
+        "\U00002705",
+        "\U00002705",
+        "\U0000274C",
+        "benchmark_0",
+    ]
+
+    merged = merge_bundles(bundles[1:])
+    assert merged["missing_shards"] == ["1/4"]
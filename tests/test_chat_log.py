@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from gpt_engineer.chat_log import ChatLog, load_messages
+from gpt_engineer.db import DB
+
+SYSTEM = {"role": "system", "content": "You are a developer" * 100}
+PROMPT = {"role": "user", "content": "Make a snake game"}
+
+
+def test_messages_are_stored_once(tmp_path):
+    chat_log = ChatLog(tmp_path)
+    spec = [SYSTEM, PROMPT, {"role": "assistant", "content": "spec"}]
+    code = [SYSTEM, PROMPT, {"role": "assistant", "content": "code"}]
+
+    chat_log.append("gen_spec", spec)
+    chat_log.append("gen_code", code)
+
+    assert len((tmp_path / "messages.jsonl").read_text().splitlines()) == 4
+    assert chat_log.steps() == ["gen_spec", "gen_code"]
+    assert chat_log.messages("gen_spec") == spec
+    assert chat_log.messages("gen_code") == code
+    assert chat_log.message("gen_code", -1) == code[-1]
+    assert chat_log.messages("unknown") is None
+    assert json.loads(chat_log.to_json("gen_code")) == code
+
+
+def test_latest_conversation_of_a_step_wins(tmp_path):
+    chat_log = ChatLog(tmp_path)
+    chat_log.append("gen_code", [PROMPT])
+    chat_log.append("gen_code", [SYSTEM, PROMPT])
+
+    assert ChatLog(tmp_path).messages("gen_code") == [SYSTEM, PROMPT]
+
+
+def test_index_is_rebuilt(tmp_path):
+    ChatLog(tmp_path).append("gen_spec", [SYSTEM, PROMPT])
+
+    (tmp_path / "index.json").unlink()
+    assert ChatLog(tmp_path).messages("gen_spec") == [SYSTEM, PROMPT]
+
+    # Written by a process that crashed before updating the index
+    stale = (tmp_path / "index.json").read_text()
+    ChatLog(tmp_path).append("gen_code", [PROMPT])
+    (tmp_path / "index.json").write_text(stale)
+    assert ChatLog(tmp_path).messages("gen_code") == [PROMPT]
+
+
+def test_read_only_log_writes_nothing(tmp_path):
+    missing = ChatLog(tmp_path / "typo", read_only=True)
+    assert missing.steps() == []
+    assert not (tmp_path / "typo").exists()
+
+    ChatLog(tmp_path).append("gen_spec", [SYSTEM, PROMPT])
+    (tmp_path / "index.json").unlink()
+    chat_log = ChatLog(tmp_path, read_only=True)
+    assert chat_log.messages("gen_spec") == [SYSTEM, PROMPT]
+    assert not (tmp_path / "index.json").exists()
+    with pytest.raises(ValueError):
+        chat_log.append("gen_code", [PROMPT])
+
+
+def test_load_messages(tmp_path):
+    logs = DB(tmp_path)
+    logs["legacy"] = json.dumps([PROMPT])
+
+    assert load_messages(logs, "legacy") == [PROMPT]
+
+    ChatLog(tmp_path).append("gen_spec", [SYSTEM])
+    assert load_messages(logs, "gen_spec") == [SYSTEM]
+    assert load_messages(logs, "legacy") == [PROMPT]
+    assert load_messages({"legacy": json.dumps([PROMPT])}, "legacy") == [PROMPT]
+
+    with pytest.raises(KeyError):
+        load_messages(logs, "unknown")
@@ -1,6 +1,6 @@
 import textwrap
 
-from gpt_engineer.chat_to_files import to_files
+from gpt_engineer.chat_to_files import apply_edits, overwrite_files, parse_chat, to_files
 
 
 def test_to_files():
@@ -198,3 +198,140 @@ def test_files_with_newline_between_header():
 
     for file_name, file_content in expected_files.items():
         assert workspace[file_name] == file_content
+
+
+def test_overwrite_files_updates_all_output():
+    all_output = textwrap.dedent(
+        """
+    This is a sample program.
+
+    file1.py
+    ```python
+    print("Hello, World!")
+    ```
+
+    file2.py
+    ```python
+    def add(a, b):
+        return a + b
+    ```
+    """
+    )
+    fix = textwrap.dedent(
+        """
+    file2.py
+    ```python
+    def add(a, b):
+        return a + b + 0
+    ```
+
+    file3.py
+    ```python
+    print(3)
+    ```
+    """
+    )
+
+    workspace = {"all_output.txt": all_output}
+    overwrite_files(fix, workspace)
+
+    assert "README.md" not in workspace
+    assert workspace["file2.py"] == "def add(a, b):\n    return a + b + 0\n"
+    assert workspace["file3.py"] == "print(3)\n"
+
+    all_files = dict(parse_chat(workspace["all_output.txt"]))
+    assert all_files["file1.py"] == 'print("Hello, World!")\n'
+    assert all_files["file2.py"] == workspace["file2.py"]
+    assert all_files["file3.py"] == workspace["file3.py"]
+
+
+def test_apply_edits():
+    workspace = {
+        "all_output.txt": "main.py\n```python\ndef add(a, b):\n    return a + b\n```\n",
+        "main.py": (
+            "import sys\n\n\ndef add(a, b):\n    return a + b\n\n\nprint(add(1, 2))\n"
+        ),
+    }
+    chat = textwrap.dedent(
+        """
+    Fix the return value.
+
+    ```diff
+    --- a/main.py
+    +++ b/main.py
+    @@ -40,3 +40,3 @@
+     def add(a, b):
+    -  return a + b
+    +  return a + b + 1
+
+    ```
+
+    util.py
+    ```python
+    X = 1
+    ```
+    """
+    )
+
+    written, failed = apply_edits(chat, workspace)
+
+    assert failed == []
+    assert written == ["main.py", "util.py"]
+    # Matched despite wrong line numbers and indentation, and indented like the file
+    assert workspace["main.py"] == (
+        "import sys\n\n\ndef add(a, b):\n    return a + b + 1\n\n\nprint(add(1, 2))\n"
+    )
+    assert workspace["util.py"] == "X = 1\n"
+    assert "return a + b + 1" in workspace["all_output.txt"]
+
+
+def test_apply_edits_reindents_added_lines():
+    workspace = {"main.py": "def add(a, b):\n\treturn a + b\n"}
+    chat = textwrap.dedent(
+        """
+    ```diff
+    --- main.py
+    +++ main.py
+    @@ -1,2 +1,4 @@
+     def add(a, b):
+    -    return a + b
+    +    if a is None:
+    +        return b
+    +
+    +    return a + b
+    ```
+    """
+    )
+
+    apply_edits(chat, workspace)
+
+    assert workspace["main.py"] == (
+        "def add(a, b):\n\tif a is None:\n\t\treturn b\n\n\treturn a + b\n"
+    )
+
+
+def test_apply_edits_new_file_and_failure():
+    workspace = {"main.py": "print(1)\n"}
+    chat = textwrap.dedent(
+        """
+    ```diff
+    --- /dev/null
+    +++ b/new.py
+    @@ -0,0 +1,2 @@
+    +a = 1
+    +b = 2
+    --- a/main.py
+    +++ b/main.py
+    @@ -1 +1 @@
+    -print(2)
+    +print(3)
+    ```
+    """
+    )
+
+    written, failed = apply_edits(chat, workspace)
+
+    assert written == ["new.py"]
+    assert failed == ["main.py"]
+    assert workspace["new.py"] == "a = 1\nb = 2\n"
+    assert workspace["main.py"] == "print(1)\n"
@@ -1,20 +1,45 @@
+import gzip
 import json
 import os
+import threading
 
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from unittest.mock import MagicMock
 
 import pytest
-import rudderstack.analytics as rudder_analytics
 
-from gpt_engineer.collect import collect_learnings, steps_file_hash
+from gpt_engineer import collect
+from gpt_engineer.collect import collect_learnings, flush, steps_file_hash
 from gpt_engineer.db import DB, DBs
 from gpt_engineer.fork.steps import GenerateCode
 from gpt_engineer.learning import extract_learning
 
 
-def test_collect_learnings(monkeypatch):
-    monkeypatch.setattr(os, "environ", {"COLLECT_LEARNINGS_OPT_IN": "true"})
-    monkeypatch.setattr(rudder_analytics, "track", MagicMock())
+@pytest.fixture
+def stub_endpoint():
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.append(json.loads(gzip.decompress(body)))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", received
+    server.shutdown()
+
+
+def test_collect_learnings(monkeypatch, tmp_path, stub_endpoint):
+    endpoint, received = stub_endpoint
+    monkeypatch.setattr(os, "environ", {"XDG_CACHE_HOME": str(tmp_path)})
+    monkeypatch.setattr(collect, "start_flusher", MagicMock())
 
     model = "test_model"
     temperature = 0.5
@@ -30,22 +55,141 @@ def test_collect_learnings(monkeypatch):
 
     collect_learnings(model, temperature, steps, dbs)
 
+    # Nothing is sent before the flusher runs
+    assert collect.start_flusher.call_count == 1
+    assert received == []
+
+    assert flush(endpoint) == 1
+
     learnings = extract_learning(
         model, temperature, steps, dbs, steps_file_hash=steps_file_hash()
     )
-    assert rudder_analytics.track.call_count == 1
-    assert rudder_analytics.track.call_args[1]["event"] == "learning"
-    a = {
-        k: v
-        for k, v in rudder_analytics.track.call_args[1]["properties"].items()
-        if k != "timestamp"
-    }
+    assert len(received) == 1
+    event = received[0]["batch"][0]
+    assert event["event"] == "learning"
+    a = {k: v for k, v in event["properties"].items() if k != "timestamp"}
     b = {k: v for k, v in learnings.to_dict().items() if k != "timestamp"}
     assert a == b
 
     assert code in learnings.logs
     assert code in learnings.workspace
 
+    assert flush(endpoint) == 0
+
+
+def test_flush_keeps_learnings_when_offline(tmp_path, stub_endpoint):
+    endpoint, received = stub_endpoint
+    spool = tmp_path / "spool.jsonl"
+    spool.write_text("".join(json.dumps({"event": str(i)}) + "\n" for i in range(5)))
+
+    assert flush("http://127.0.0.1:1", path=spool) == 0
+    assert not spool.exists()
+    assert len(list(tmp_path.glob("*.batch"))) == 1
+
+    spool.write_text(json.dumps({"event": "5"}) + "\n")
+    assert flush(endpoint, path=spool, batch_size=2) == 6
+    assert [len(request["batch"]) for request in received] == [2, 2, 1, 1]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_flush_puts_batches_back_on_any_error(tmp_path, stub_endpoint, monkeypatch):
+    endpoint, received = stub_endpoint
+    spool = tmp_path / "spool.jsonl"
+    spool.write_text("".join(json.dumps({"event": str(i)}) + "\n" for i in range(4)))
+    post_batch = collect.post_batch
+    calls = []
+
+    def fail_second_batch(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise ValueError("Broken batch")
+        post_batch(*args)
+
+    monkeypatch.setattr(collect, "post_batch", fail_second_batch)
+    with pytest.raises(ValueError):
+        flush(endpoint, path=spool, batch_size=2)
+    assert [path.name.endswith(".batch") for path in tmp_path.iterdir()] == [True]
+
+    # Only the batch that was not sent is sent again
+    assert flush(endpoint, path=spool, batch_size=2) == 2
+    assert [len(request["batch"]) for request in received] == [2, 2]
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.fixture
+def status_endpoint():
+    """An endpoint that answers with the given statuses, then with 200"""
+    statuses = []
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            status = statuses.pop(0) if statuses else 200
+            if status == 200:
+                received.append(json.loads(gzip.decompress(body)))
+            self.send_response(status)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", statuses, received
+    server.shutdown()
+
+
+def test_flush_drops_rejected_batches(tmp_path, status_endpoint):
+    endpoint, statuses, received = status_endpoint
+    spool = tmp_path / "spool.jsonl"
+    spool.write_text("".join(json.dumps({"event": str(i)}) + "\n" for i in range(6)))
+
+    # A rejected batch would be rejected on every flush, so it must not block the rest
+    statuses.append(400)
+    assert flush(endpoint, path=spool, batch_size=2) == 4
+    assert [event["event"] for r in received for event in r["batch"]] == [
+        "2",
+        "3",
+        "4",
+        "5",
+    ]
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("status", [500, 503, 429])
+def test_flush_keeps_batches_on_server_errors(tmp_path, status_endpoint, status):
+    endpoint, statuses, received = status_endpoint
+    spool = tmp_path / "spool.jsonl"
+    spool.write_text("".join(json.dumps({"event": str(i)}) + "\n" for i in range(4)))
+
+    statuses.extend([200, status])
+    assert flush(endpoint, path=spool, batch_size=2) == 2
+    assert len(list(tmp_path.glob("*.batch"))) == 1
+
+    assert flush(endpoint, path=spool, batch_size=2) == 2
+    assert [event["event"] for r in received for event in r["batch"]] == [
+        "0",
+        "1",
+        "2",
+        "3",
+    ]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spool_learning_writes_whole_lines(tmp_path, monkeypatch):
+    spool = tmp_path / "spool.jsonl"
+
+    def fail(f, *args, **kwargs):
+        f.write('{"prompt": "cut')
+        raise OSError("disk error")
+
+    monkeypatch.setattr(collect, "write_learning", fail)
+    with pytest.raises(OSError):
+        collect.spool_learning("model", 0.1, [], None, path=spool)
+    assert not spool.exists() or spool.read_text() == ""
+
 
 if __name__ == "__main__":
     pytest.main(["-v"])
@@ -125,3 +125,61 @@ def test_DBs_dataclass_attributes(tmp_path):
     assert dbs_instance.preprompts == dbs[2]
     assert dbs_instance.input == dbs[3]
     assert dbs_instance.workspace == dbs[4]
+
+
+def test_repeated_reads_share_content(tmp_path):
+    db = DB(tmp_path)
+    db["large_file"] = "a" * (2 * DB.mmap_threshold)
+
+    assert DB(tmp_path)["large_file"] == "a" * (2 * DB.mmap_threshold)
+    assert db["large_file"] is db["large_file"]
+
+    db["large_file"] = "b"
+    assert db["large_file"] == "b"
+
+    # Changes made by others are noticed
+    (tmp_path / "large_file").write_text("changed by another process")
+    assert db["large_file"] == "changed by another process"
+
+
+def test_mmap_read_translates_newlines(tmp_path, monkeypatch):
+    monkeypatch.setattr(DB, "mmap_threshold", 0)
+    (tmp_path / "crlf").write_bytes("line\r\nnext é\r\n".encode("utf-8"))
+
+    assert DB(tmp_path)["crlf"] == "line\nnext é\n"
+
+
+def test_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(DB, "cache_bytes", 10)
+    db = DB(tmp_path)
+    for i in range(5):
+        db[f"file{i}"] = "abcd"
+
+    assert db._cached_bytes <= 10
+    assert [db[f"file{i}"] for i in range(5)] == ["abcd"] * 5
+
+
+def test_bulk_operations(tmp_path):
+    db = DB(tmp_path)
+    db.set_many({"main.py": "main", "src/a.py": "a", "src/lib/b.py": "b"})
+    (tmp_path / "venv" / "bin").mkdir(parents=True)
+    (tmp_path / "venv" / "bin" / "python").write_text("")
+
+    assert db.keys(exclude={"venv"}) == ["main.py", "src/a.py", "src/lib/b.py"]
+    assert db.keys("src/") == ["src/a.py", "src/lib/b.py"]
+    assert db.keys("src/l") == ["src/lib/b.py"]
+    assert db.keys("ma") == ["main.py"]
+    assert db.items("src/lib") == [("src/lib/b.py", "b")]
+    assert db.get_many(["main.py", "src/a.py"]) == {"main.py": "main", "src/a.py": "a"}
+    assert set(db.stamps(exclude={"venv"})) == {"main.py", "src/a.py", "src/lib/b.py"}
+    with pytest.raises(KeyError):
+        db.get_many(["main.py", "missing.py"])
+
+
+def test_set_many_writes_nothing_on_invalid_value(tmp_path):
+    db = DB(tmp_path)
+
+    with pytest.raises(TypeError):
+        db.set_many([("a.py", "a"), ("b.py", ["invalid"])])  # type: ignore
+
+    assert db.keys() == []
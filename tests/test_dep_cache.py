@@ -0,0 +1,131 @@
+import os
+
+import pytest
+
+from gpt_engineer.dep_cache import DepCache, site_packages, venv_bin
+
+
+def fake_build(builds):
+    def _build(self, kind, manifests, layer_path):
+        builds.append(kind)
+        if kind == "python":
+            venv_bin(layer_path / "venv").mkdir(parents=True)
+            (venv_bin(layer_path / "venv") / "pip").write_text(
+                "#!/build/venv/bin/python\nimport pip\n"
+            )
+        else:
+            (layer_path / "node_modules" / ".bin").mkdir(parents=True)
+
+    return _build
+
+
+def test_manifests(tmp_path):
+    cache = DepCache(tmp_path / "cache")
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+
+    assert cache.manifests(workspace) == {}
+
+    (workspace / "requirements.txt").write_text("requests\n")
+    (workspace / "package-lock.json").write_text("{}")
+    assert list(cache.manifests(workspace)) == ["python"]
+
+    (workspace / "package.json").write_text("{}")
+    assert cache.manifests(workspace)["node"] == [
+        workspace / "package.json",
+        workspace / "package-lock.json",
+    ]
+
+
+def test_key_depends_on_manifest_content(tmp_path):
+    cache = DepCache(tmp_path / "cache")
+    manifest = tmp_path / "requirements.txt"
+
+    manifest.write_text("requests\n")
+    key = cache.key("python", [manifest])
+    assert cache.key("python", [manifest]) == key
+
+    manifest.write_text("requests\nnumpy\n")
+    assert cache.key("python", [manifest]) != key
+
+
+def test_prepare_reuses_layers(tmp_path, monkeypatch):
+    builds = []
+    monkeypatch.setattr(DepCache, "_build", fake_build(builds))
+    cache = DepCache(tmp_path / "cache")
+
+    for name in ["first", "second"]:
+        workspace = tmp_path / name
+        workspace.mkdir()
+        (workspace / "requirements.txt").write_text("requests\n")
+        (workspace / "package.json").write_text("{}")
+
+        env = cache.prepare(workspace)
+
+        assert (site_packages(workspace / "venv") / "_dep_cache_layer.pth").is_file()
+        pip = venv_bin(workspace / "venv") / "pip"
+        assert pip.read_text().startswith(f"#!{venv_bin(workspace / 'venv')}")
+        assert (workspace / "node_modules" / ".bin").is_dir()
+        assert env["VIRTUAL_ENV"] == str(workspace / "venv")
+        assert env["PATH"].split(os.pathsep)[0] == str(
+            workspace / "node_modules" / ".bin"
+        )
+
+    assert sorted(builds) == ["node", "python"]
+
+
+def test_prepare_keeps_existing_directories(tmp_path, monkeypatch):
+    monkeypatch.setattr(DepCache, "_build", fake_build([]))
+    cache = DepCache(tmp_path / "cache")
+    workspace = tmp_path / "workspace"
+    (workspace / "venv").mkdir(parents=True)
+    (workspace / "requirements.txt").write_text("requests\n")
+
+    env = cache.prepare(workspace)
+
+    assert not (workspace / "venv").is_symlink()
+    assert env.get("VIRTUAL_ENV") == os.environ.get("VIRTUAL_ENV")
+
+
+def test_workspaces_do_not_modify_layers(tmp_path, monkeypatch):
+    monkeypatch.setattr(DepCache, "_build", fake_build([]))
+    cache = DepCache(tmp_path / "cache")
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+    (workspace / "package.json").write_text("{}")
+
+    cache.prepare(workspace)
+    (workspace / "node_modules" / "installed").write_text("")
+    cache.prepare(workspace)
+
+    assert (workspace / "node_modules" / "installed").is_file()
+    assert [path.name for path in (tmp_path / "cache" / "node").iterdir()] == [
+        cache.key("node", [workspace / "package.json"])
+    ]
+    assert not list((tmp_path / "cache").rglob("installed"))
+
+
+def test_offline_needs_local_mirror(tmp_path):
+    with pytest.raises(ValueError):
+        DepCache(tmp_path / "cache", offline=True)
+    with pytest.raises(ValueError):
+        DepCache(tmp_path / "cache", mirror="https://pypi.org/simple", offline=True)
+    assert DepCache(tmp_path / "cache", mirror=str(tmp_path), offline=True).offline
+
+
+def test_concurrent_builds_keep_the_first_layer(tmp_path, monkeypatch):
+    cache = DepCache(tmp_path / "cache")
+    manifest = tmp_path / "package.json"
+    manifest.write_text("{}")
+    layer_path = tmp_path / "cache" / "node" / cache.key("node", [manifest])
+
+    def racing_build(self, kind, manifests, build_path):
+        # Another run completes the same layer while this one builds
+        (layer_path / "node_modules").mkdir(parents=True)
+        (layer_path / ".complete").write_text("")
+        (build_path / "node_modules").mkdir()
+
+    monkeypatch.setattr(DepCache, "_build", racing_build)
+
+    assert cache.layer("node", [manifest]) == layer_path
+    assert [path.name for path in layer_path.parent.iterdir()] == [layer_path.name]
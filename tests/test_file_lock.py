@@ -0,0 +1,136 @@
+import contextlib
+import multiprocessing
+import threading
+
+import pytest
+
+from gpt_engineer.db import DB, KEY_LOCK_STRIPES, lock_dir
+from gpt_engineer.file_lock import DBLockedError, FileLock
+
+
+def hold_lock(path, locked, release):
+    with FileLock(path):
+        locked.set()
+        release.wait(10)
+
+
+def test_lock_fails_or_waits_while_another_process_holds_it(tmp_path):
+    path = tmp_path / "project.lock"
+    locked = multiprocessing.Event()
+    release = multiprocessing.Event()
+    process = multiprocessing.Process(target=hold_lock, args=(path, locked, release))
+    process.start()
+    try:
+        assert locked.wait(10)
+        with pytest.raises(DBLockedError):
+            FileLock(path, timeout=0).acquire()
+        with pytest.raises(DBLockedError):
+            FileLock(path, timeout=0.1).acquire()
+
+        threading.Timer(0.2, release.set).start()
+        with FileLock(path, timeout=10):
+            pass
+    finally:
+        release.set()
+        process.join()
+
+
+def test_lock_is_reentrant_within_a_thread(tmp_path):
+    path = tmp_path / "db.lock"
+    with FileLock(path, timeout=0):
+        with FileLock(path, shared=True, timeout=0):
+            pass
+
+        errors = []
+
+        def other_thread():
+            try:
+                FileLock(path, timeout=0).acquire()
+            except DBLockedError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+        assert len(errors) == 1
+
+
+def test_db_lock_blocks_writers(tmp_path, monkeypatch):
+    monkeypatch.setattr(DB, "lock_timeout", 0)
+    db = DB(tmp_path / "db")
+    db["a.txt"] = "a"
+    assert db.keys() == ["a.txt"]
+
+    errors = []
+
+    def write():
+        try:
+            DB(tmp_path / "db")["b.txt"] = "b"
+        except DBLockedError as e:
+            errors.append(e)
+
+    with db.lock():
+        # The lock holder can still write
+        db["c.txt"] = "c"
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join()
+
+    assert len(errors) == 1
+    write()
+    assert db.keys() == ["a.txt", "b.txt", "c.txt"]
+    # Lock files are kept out of the DB folder
+    assert sorted(p.name for p in db.path.iterdir()) == ["a.txt", "b.txt", "c.txt"]
+
+
+def test_shared_lock_is_not_silently_kept_for_exclusive_requests(tmp_path):
+    path = tmp_path / "db.lock"
+    with FileLock(path, shared=True, timeout=0):
+        with pytest.raises(DBLockedError):
+            FileLock(path, timeout=0).acquire()
+        # Shared requests are still reentrant
+        with FileLock(path, shared=True, timeout=0):
+            pass
+    with FileLock(path, timeout=0):
+        pass
+
+
+def test_failed_key_lock_releases_db_lock(tmp_path, monkeypatch):
+    monkeypatch.setattr(DB, "lock_timeout", 0)
+    db = DB(tmp_path)
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold_key_locks():
+        # Holds every key stripe, so any key lock of the main thread fails
+        with contextlib.ExitStack() as stack:
+            for stripe in range(KEY_LOCK_STRIPES):
+                stack.enter_context(
+                    FileLock(lock_dir(tmp_path) / f"key{stripe}.lock", timeout=0)
+                )
+            held.set()
+            release.wait(10)
+
+    thread = threading.Thread(target=hold_key_locks)
+    thread.start()
+    try:
+        assert held.wait(10)
+        with pytest.raises(DBLockedError):
+            db.lock("a.txt")
+    finally:
+        release.set()
+        thread.join()
+
+    errors = []
+
+    def lock_db():
+        try:
+            with db.lock():
+                pass
+        except DBLockedError as e:
+            errors.append(e)
+
+    other = threading.Thread(target=lock_db)
+    other.start()
+    other.join()
+    assert errors == []
@@ -0,0 +1,41 @@
+import os
+
+from unittest.mock import MagicMock
+
+from gpt_engineer import fingerprint
+from gpt_engineer.fingerprint import compute_fingerprint, pipeline_fingerprint
+
+
+def test_pipeline_fingerprint_is_cached(tmp_path, monkeypatch):
+    source = tmp_path / "steps.py"
+    source.write_text("STEPS = {}")
+    monkeypatch.setattr(fingerprint, "pipeline_files", lambda: [source])
+    monkeypatch.setattr(fingerprint, "PACKAGE_PATH", tmp_path)
+    monkeypatch.setattr(fingerprint, "_memo", None)
+    monkeypatch.setattr(os, "environ", {"XDG_CACHE_HOME": str(tmp_path / "cache")})
+    compute = MagicMock(wraps=compute_fingerprint)
+    monkeypatch.setattr(fingerprint, "compute_fingerprint", compute)
+
+    first = pipeline_fingerprint()
+    assert pipeline_fingerprint() == first
+    assert compute.call_count == 1
+
+    # A new process finds the fingerprint in the cache dir
+    monkeypatch.setattr(fingerprint, "_memo", None)
+    assert pipeline_fingerprint() == first
+    assert compute.call_count == 1
+
+    source.write_text("STEPS = {1: 2}")
+    assert pipeline_fingerprint() != first
+    assert compute.call_count == 2
+
+
+def test_pipeline_files_include_fork_steps_and_preprompts(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(fingerprint, "_memo", None)
+    names = [path.name for path in fingerprint.pipeline_files()]
+
+    assert names[:2] == ["steps.py", "steps.py"]
+    assert "generate" in names
+    assert len(pipeline_fingerprint()) == 64
+    assert (tmp_path / "gpt_engineer" / "pipeline_fingerprint.json").is_file()
@@ -0,0 +1,185 @@
+import os
+
+import pytest
+
+from gpt_engineer import hardware
+from gpt_engineer.hardware import (
+    FALLBACK_MODEL,
+    Hardware,
+    ModelFile,
+    core_sets,
+    format_cpus,
+    isa_warnings,
+    numa_nodes,
+    parse_cpus,
+    physical_cores,
+    pinned,
+    probe,
+    select_model,
+)
+
+GiB = 2**30
+
+
+def model_dir(tmp_path, sizes):
+    for name, size in sizes.items():
+        with open(tmp_path / name, "wb") as f:
+            f.truncate(size)
+    return tmp_path
+
+
+def unavailable(model, model_path=None):
+    raise ValueError("Failed to retrieve model")
+
+
+def test_model_file():
+    model = ModelFile("ggml-v3-13b-hermes-q5_1.bin", 10)
+    assert model.quantization == "q5_1"
+    assert model.base == "ggml-v3-13b-hermes"
+    assert ModelFile("llama-7b.q4_k_m.bin", 10).quantization == "q4_k_m"
+    assert ModelFile("ggml-v3-13b-hermes-q4_0.bin", 10).speed_rank < model.speed_rank
+
+
+def offline():
+    raise OSError("offline")
+
+
+def test_select_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(hardware.GPT4All, "retrieve_model", unavailable)
+    monkeypatch.setattr(hardware.GPT4All, "list_models", offline)
+    path = model_dir(
+        tmp_path,
+        {
+            "ggml-v3-13b-hermes-q5_1.bin": 9 * GiB,
+            "ggml-v3-13b-hermes-q4_0.bin": 7 * GiB,
+            "ggml-gpt4all-j-v1.3-groovy.bin": 4 * GiB,
+        },
+    )
+    requested = "ggml-v3-13b-hermes-q5_1.bin"
+
+    assert select_model(requested, Hardware(64 * GiB, 8), path) == requested
+    assert select_model(requested, Hardware(None, 8), path) == requested
+    # The variant of the same model that fits is preferred over larger models
+    assert (
+        select_model(requested, Hardware(9 * GiB, 8), path)
+        == "ggml-v3-13b-hermes-q4_0.bin"
+    )
+    assert select_model(requested, Hardware(6 * GiB, 8), path) == (
+        "ggml-gpt4all-j-v1.3-groovy.bin"
+    )
+    assert select_model(requested, Hardware(1 * GiB, 8), path) == FALLBACK_MODEL
+    assert select_model("missing.bin", Hardware(64 * GiB, 8), path) == requested
+
+
+def test_select_model_checks_size_before_download(tmp_path, monkeypatch):
+    downloads = []
+
+    def retrieve_model(model, model_path=None):
+        downloads.append(model)
+        model_dir(tmp_path, {model: 4 * GiB})
+        return str(tmp_path / model)
+
+    monkeypatch.setattr(hardware.GPT4All, "retrieve_model", retrieve_model)
+    monkeypatch.setattr(
+        hardware.GPT4All,
+        "list_models",
+        lambda: [
+            {"filename": "huge.bin", "filesize": str(40 * GiB)},
+            {"filename": "small.bin", "filesize": str(4 * GiB)},
+        ],
+    )
+
+    assert select_model("huge.bin", Hardware(16 * GiB, 8), tmp_path) == FALLBACK_MODEL
+    assert downloads == []
+    assert select_model("small.bin", Hardware(16 * GiB, 8), tmp_path) == "small.bin"
+    assert downloads == ["small.bin"]
+
+
+def test_physical_cores():
+    processors = [
+        {"processor": "0", "physical id": "0", "core id": "0"},
+        {"processor": "1", "physical id": "0", "core id": "0"},
+        {"processor": "2", "physical id": "0", "core id": "1"},
+        {"processor": "3", "physical id": "1", "core id": "0"},
+    ]
+    assert physical_cores(processors, [0, 1, 2, 3]) == 3
+    assert physical_cores(processors, [0, 1]) == 1
+    assert physical_cores([], [0, 1]) == 2
+
+
+def test_probe():
+    found = probe()
+    assert found.cores >= 1
+    assert found.memory is None or found.memory > 0
+    assert isa_warnings(Hardware(None, 1, frozenset({"sse2"}), "x86_64"))
+    assert not isa_warnings(Hardware(None, 1, frozenset({"avx", "avx2"}), "x86_64"))
+
+
+def test_cpu_lists():
+    assert parse_cpus("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+    assert format_cpus([11, 0, 1, 2, 3, 8, 10]) == "0-3,8,10-11"
+
+
+def test_numa_nodes(tmp_path, monkeypatch):
+    monkeypatch.setattr(hardware, "usable_cpus", lambda: list(range(8)))
+    for node, cpus in [("node0", "0-3"), ("node1", "4-7,12-15")]:
+        (tmp_path / node).mkdir()
+        (tmp_path / node / "cpulist").write_text(cpus)
+
+    assert numa_nodes(tmp_path) == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert numa_nodes(tmp_path / "missing") == [list(range(8))]
+
+
+def test_core_sets_are_disjoint():
+    nodes = [list(range(0, 16)), list(range(16, 32))]
+
+    sets = core_sets(4, nodes, [])
+    assert sets == [
+        list(range(0, 8)),
+        list(range(8, 16)),
+        list(range(16, 24)),
+        list(range(24, 32)),
+    ]
+    # Sets only cross nodes when there are fewer workers than nodes
+    assert core_sets(1, nodes, []) == [list(range(32))]
+    sets = core_sets(3, nodes, [])
+    assert sum(len(cpus) for cpus in sets) == 32
+    assert all(set(cpus) <= set(nodes[0]) or set(cpus) <= set(nodes[1]) for cpus in sets)
+    assert len(core_sets(5, [[0, 1]], [])) == 5
+
+
+def test_core_sets_keep_hyperthread_siblings_together():
+    # Two sockets of 32 cores, cpu n and n + 64 are siblings of the same core
+    processors = [
+        {
+            "processor": str(cpu),
+            "physical id": str(cpu % 64 // 32),
+            "core id": str(cpu % 32),
+        }
+        for cpu in range(128)
+    ]
+    nodes = [
+        list(range(0, 32)) + list(range(64, 96)),
+        list(range(32, 64)) + list(range(96, 128)),
+    ]
+
+    sets = core_sets(4, nodes, processors)
+    assert sets == [
+        list(range(0, 16)) + list(range(64, 80)),
+        list(range(16, 32)) + list(range(80, 96)),
+        list(range(32, 48)) + list(range(96, 112)),
+        list(range(48, 64)) + list(range(112, 128)),
+    ]
+    # Every worker gets its own 16 physical cores
+    assert [physical_cores(processors, cpus) for cpus in sets] == [16] * 4
+
+
+def test_pinned():
+    if not hasattr(os, "sched_setaffinity"):
+        pytest.skip("cpu affinity is not supported")
+    before = os.sched_getaffinity(0)
+    cpu = min(before)
+
+    with pinned([cpu]):
+        assert os.sched_getaffinity(0) == {cpu}
+    assert os.sched_getaffinity(0) == before
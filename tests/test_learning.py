@@ -0,0 +1,62 @@
+import io
+import json
+
+import pytest
+
+from gpt_engineer.fork.steps import GenerateCode, GenerateSpec
+from gpt_engineer.learning import (
+    TRUNCATION_MARKER,
+    extract_learning,
+    log_chunks,
+    logs_to_string,
+    write_learning,
+)
+
+
+@pytest.fixture
+def dbs(dbs):
+    dbs.input["prompt"] = 'make a "snake" game\n'
+    dbs.logs[GenerateSpec.step_id] = json.dumps(
+        [{"role": "system", "content": "spec"}, {"role": "user", "content": "ok"}]
+    )
+    dbs.logs[GenerateCode.step_id] = json.dumps(
+        [{"role": "assistant", "content": "code"}]
+    )
+    dbs.workspace["all_output.txt"] = "main.py\n```\nprint('snake')\n```\n" * 1000
+    return dbs
+
+
+def test_write_learning_matches_extract_learning(dbs):
+    steps = [GenerateSpec(), GenerateCode()]
+
+    f = io.StringIO()
+    write_learning(f, "model", 0.1, steps, dbs, steps_file_hash="hash")
+
+    written = json.loads(f.getvalue())
+    expected = extract_learning("model", 0.1, steps, dbs, "hash").to_dict()
+    assert written.pop("timestamp")
+    expected.pop("timestamp")
+    assert written == expected
+
+
+def test_write_learning_truncates_fields(dbs):
+    # The log of the second step is past the cut, so it must never be read
+    (dbs.logs.path / GenerateCode.step_id).unlink()
+    dbs.logs[GenerateSpec.step_id] = json.dumps([{"role": "user", "content": "x" * 100}])
+    steps = [GenerateSpec(), GenerateCode()]
+
+    f = io.StringIO()
+    write_learning(f, "model", 0.1, steps, dbs, "hash", max_field_chars=50)
+
+    written = json.loads(f.getvalue())
+    for field in ["logs", "workspace"]:
+        assert written[field].endswith(TRUNCATION_MARKER)
+        assert len(written[field]) == 50 + len(TRUNCATION_MARKER)
+    assert written["prompt"] == dbs.input["prompt"]
+    assert written["feedback"] is None
+
+
+def test_log_chunks_matches_logs_to_string(dbs):
+    steps = [GenerateSpec(), GenerateCode()]
+
+    assert "".join(log_chunks(steps, dbs.logs)) == logs_to_string(steps, dbs.logs)
@@ -0,0 +1,51 @@
+import pytest
+
+from gpt_engineer.db import DB
+from gpt_engineer.prompt_registry import PromptRegistry, render
+
+
+def write_preprompts(path):
+    db = DB(path)
+    db["generate"] = "You write code."
+    db["philosophy"] = "Keep it simple."
+    db["fix_code"] = "Fix the code."
+    db["diff_format"] = "Answer with diffs."
+    return db
+
+
+def test_registry_reads_preprompts_once(tmp_path):
+    write_preprompts(tmp_path)
+    registry = PromptRegistry(tmp_path, num_tokens=lambda text: len(text.split()))
+
+    (tmp_path / "generate").write_text("changed")
+    assert registry["generate"] == "You write code."
+    assert "philosophy" in registry
+    with pytest.raises(KeyError):
+        registry["missing"]
+    with pytest.raises(TypeError):
+        registry["generate"] = "changed"  # type: ignore
+
+
+def test_templates_and_token_counts(tmp_path):
+    write_preprompts(tmp_path)
+    registry = PromptRegistry(tmp_path, num_tokens=lambda text: len(text.split()))
+
+    assert registry.render("system") == (
+        "You write code.\nUseful to know:\nKeep it simple."
+    )
+    assert registry.render("instructions", main_prompt="a game") == (
+        "Instructions: a game"
+    )
+    assert registry.template("instructions").fields == ("main_prompt",)
+    assert registry.tokens("generate") == 3
+    assert registry.tokens("system") == 9
+    assert registry.tokens("instructions") == 1
+
+
+def test_render_with_db_matches_registry(tmp_path):
+    db = write_preprompts(tmp_path)
+    registry = PromptRegistry(tmp_path)
+
+    for name in ["system", "edit_fix_code"]:
+        assert render(db, name) == render(registry, name)
+    assert render(db, "given_unit_tests", unit_tests="test") == "Unit tests:\n\ntest"
@@ -0,0 +1,68 @@
+import os
+
+from gpt_engineer.db import DB
+from gpt_engineer.retrieval import FileIndex, tokenize
+
+
+def num_tokens(text):
+    return len(text.split())
+
+
+def test_tokenize():
+    assert tokenize("def parseHTTPResponse(raw_body):") == [
+        "def",
+        "parse",
+        "http",
+        "response",
+        "raw",
+        "body",
+    ]
+
+
+def test_search_ranks_relevant_files(tmp_path):
+    db = DB(tmp_path)
+    db["game.py"] = "class Snake:\n    def move(self):\n        pass\n"
+    db["score.py"] = "def draw_score(screen, score):\n    screen.blit(score)\n"
+    db["all_output.txt"] = "snake snake snake"
+    db["venv/lib/snake.py"] = "snake"
+
+    index = FileIndex(db)
+    index.refresh()
+
+    assert set(index.docs) == {"game.py", "score.py"}
+    assert [path for path, _ in index.search("the snake does not move")] == ["game.py"]
+    assert index.search("unrelated words") == []
+
+
+def test_select_fits_budget(tmp_path):
+    db = DB(tmp_path)
+    db["small.py"] = "score = 0"
+    db["large.py"] = "score " * 100
+
+    files = FileIndex(db).select("score", 50, num_tokens)
+
+    assert files == [("small.py", "score = 0")]
+
+
+def test_refresh_is_incremental(tmp_path):
+    db = DB(tmp_path)
+    db["a.py"] = "apple"
+    db["b.py"] = "banana"
+    index = FileIndex(db)
+    index.refresh()
+
+    # Unchanged stamps are trusted, changed files are read again
+    stamp = index.docs["a.py"][0]
+    (tmp_path / "a.py").write_text("lemon")
+    os.utime(tmp_path / "a.py", ns=(stamp[0], stamp[0]))
+    db["b.py"] = "cherry cherry"
+    (tmp_path / "c.py").write_text("date")
+    index.refresh()
+
+    assert index.search("lemon") == []
+    assert [path for path, _ in index.search("cherry")] == ["b.py"]
+    assert [path for path, _ in index.search("date")] == ["c.py"]
+
+    (tmp_path / "c.py").unlink()
+    index.refresh()
+    assert "c.py" not in index.docs
@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from gpt_engineer import ai as ai_module
+from gpt_engineer.ai import AI
+from gpt_engineer.steps import STEPS, Config
+from gpt_engineer.sweep import comparison_matrix, run_job, sweep_jobs, sweep_steps
+
+ANSWER = "main.py\n```python\nprint('hello')\n```\n\n```bash\npython main.py\n```\n"
+
+
+class FakeGPT4All:
+    loads: List[str] = []
+    # The temperature each completion was sampled with
+    temperatures: List[float] = []
+
+    def __init__(self, model):
+        FakeGPT4All.loads.append(model)
+        self.model = SimpleNamespace(context=None)
+
+    def chat_completion(self, messages, temp, **kwargs):
+        # Like gpt4all, the context of the first prompt is kept
+        if self.model.context is None:
+            self.model.context = SimpleNamespace(temp=temp)
+        FakeGPT4All.temperatures.append(self.model.context.temp)
+        return {"choices": [{"message": {"role": "assistant", "content": ANSWER}}]}
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    FakeGPT4All.loads = []
+    FakeGPT4All.temperatures = []
+    encoder = SimpleNamespace(encode=str.split)
+    monkeypatch.setattr(ai_module, "GPT4All", FakeGPT4All)
+    monkeypatch.setattr(
+        ai_module,
+        "tiktoken",
+        SimpleNamespace(encoding_for_model=lambda model: encoder),
+    )
+    monkeypatch.setattr(AI, "model", None)
+    monkeypatch.setattr(AI, "loaded_model", None)
+
+
+def make_benchmarks(path, names):
+    benchmarks = []
+    for name in names:
+        (path / name).mkdir(parents=True)
+        (path / name / "prompt").write_text(f"Write {name}")
+        (path / name / "main_prompt").write_text(f"Write {name}")
+        benchmarks.append(path / name)
+    return benchmarks
+
+
+def test_sweep_jobs_are_grouped_by_model(tmp_path):
+    jobs = sweep_jobs(
+        ["a.bin", "b.bin"],
+        [0.1, 0.5],
+        [Config.BENCHMARK, Config.SIMPLE],
+        make_benchmarks(tmp_path, ["x", "y"]),
+    )
+    models = [job.model for job in jobs]
+    assert len(jobs) == 16
+    assert models == ["a.bin"] * 8 + ["b.bin"] * 8
+
+
+def test_sweep_steps():
+    assert all(not step.interactive for step in sweep_steps(Config.SIMPLE))
+    # Clarifying questions are answered by the answer provider
+    assert [step.step_id for step in sweep_steps(Config.CLARIFY)] == [
+        step.step_id
+        for step in STEPS[Config.CLARIFY].steps
+        if not step.interactive or step.step_id == "clarification"
+    ]
+
+
+def test_run_job_answers_clarifying_questions(tmp_path, fake_model):
+    benchmarks = make_benchmarks(tmp_path / "benchmark", ["x"])
+    (job,) = sweep_jobs(["a.bin"], [0.1], [Config.CLARIFY], benchmarks)
+
+    assert run_job(job, tmp_path / "sweep")["passed"]
+
+
+def test_run_jobs_reuse_loaded_model(tmp_path, fake_model):
+    benchmarks = make_benchmarks(tmp_path / "benchmark", ["x", "y"])
+    jobs = sweep_jobs(["a.bin", "b.bin"], [0.1, 0.5], [Config.BENCHMARK], benchmarks)
+
+    results = [run_job(job, tmp_path / "sweep") for job in jobs]
+
+    assert FakeGPT4All.loads == ["a.bin", "b.bin"]
+    assert all(result["passed"] for result in results)
+    # Each step of a benchmark config calls the model once
+    steps = len(sweep_steps(Config.BENCHMARK))
+    assert FakeGPT4All.temperatures == [
+        job.temperature for job in jobs for _ in range(steps)
+    ]
+    workspace = jobs[0].path(tmp_path / "sweep") / "workspace"
+    assert "python main.py" in (workspace / "run.sh").read_text()
+
+    rows = comparison_matrix(results)
+    assert [row[:4] for row in rows] == [
+        ["a.bin", 0.1, "benchmark", "2/2"],
+        ["a.bin", 0.5, "benchmark", "2/2"],
+        ["b.bin", 0.1, "benchmark", "2/2"],
+        ["b.bin", 0.5, "benchmark", "2/2"],
+    ]
@@ -0,0 +1,66 @@
+import time
+
+from types import SimpleNamespace
+
+from gpt_engineer import ai as ai_module
+from gpt_engineer.ai import AI
+from gpt_engineer.thread_tuning import cached_threads, thread_counts, tune
+
+
+class FakeBackend:
+    def __init__(self):
+        self.threads = 1
+        self.context = None
+
+    def thread_count(self):
+        return self.threads
+
+    def set_thread_count(self, threads):
+        self.threads = threads
+
+
+class FakeGPT4All:
+    def __init__(self, model):
+        self.model = FakeBackend()
+
+    def generator(self, prompt, n_predict, **kwargs):
+        # Like gpt4all, the context of the first prompt is kept
+        if self.model.context is None:
+            self.model.context = SimpleNamespace(n_predict=n_predict, **kwargs)
+        # Fastest with 4 threads
+        for _ in range(n_predict):
+            time.sleep(0.001 * (1 + abs(self.model.threads - 4)))
+            yield "token"
+
+
+def test_thread_counts():
+    assert thread_counts(1) == [1]
+    assert thread_counts(6) == [1, 2, 4, 6]
+    assert thread_counts(8) == [1, 2, 4, 8]
+
+
+def test_tune_stores_fastest_thread_count(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(ai_module, "GPT4All", FakeGPT4All)
+    monkeypatch.setattr(
+        ai_module,
+        "tiktoken",
+        SimpleNamespace(encoding_for_model=lambda model: None),
+    )
+    monkeypatch.setattr(AI, "model", None)
+    monkeypatch.setattr(AI, "loaded_model", None)
+
+    ai = AI("a.bin")
+    assert cached_threads("a.bin", 8) is None
+    assert tune(ai, 8, n_predict=8) == 4
+    assert cached_threads("a.bin", 8) == 4
+    # Later completions do not inherit the prompt context of tuning
+    assert AI.model.model.context is None
+    # Tuned per number of cores
+    assert cached_threads("a.bin", 16) is None
+
+    # The tuned count is set on the backend when the model is used
+    ai.threads = 4
+    AI.model.model.set_thread_count(1)
+    ai.ensure_loaded()
+    assert AI.model.model.thread_count() == 4